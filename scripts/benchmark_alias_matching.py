@@ -0,0 +1,99 @@
+"""
+Benchmarks per-description latency of the LIKE alias matchers
+
+Usage:
+
+    PYTHONPATH=. python scripts/benchmark_alias_matching.py
+"""
+import argparse
+import random
+import string
+import timeit
+
+from taxes.receipts.util.like import AutomatonLikeMatcher, RegexLikeMatcher
+
+
+PATTERN_SHAPES = ["{0}%", "%{0}%", "{0} {1}%", "%{0} _{1}%"]
+
+
+def _random_word(rng, min_length=4, max_length=10):
+    return "".join(
+        rng.choice(string.ascii_uppercase)
+        for _ in range(rng.randint(min_length, max_length))
+    )
+
+
+def _make_patterns(rng, count):
+    return [
+        rng.choice(PATTERN_SHAPES).format(_random_word(rng), _random_word(rng))
+        for _ in range(count)
+    ]
+
+
+def _make_descriptions(rng, patterns, count, match_ratio=0.5):
+    descriptions = []
+    for _ in range(count):
+        if rng.random() < match_ratio:
+            # fill in the wildcards of an existing pattern so that it matches
+            description = rng.choice(patterns).replace("%", " #123 ").replace("_", "X")
+        else:
+            description = " ".join(_random_word(rng) for _ in range(4))
+        descriptions.append(description.strip())
+    return descriptions
+
+
+def _time_per_row(matcher, descriptions, repeat):
+    elapsed = min(
+        timeit.repeat(
+            lambda: [matcher.match(description) for description in descriptions],
+            number=1,
+            repeat=repeat,
+        )
+    )
+    return elapsed / len(descriptions) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Alias matching benchmark")
+    parser.add_argument(
+        "--alias-counts",
+        type=int,
+        nargs="+",
+        default=[100, 1000, 10000, 100000],
+        help="Number of LIKE alias patterns to benchmark",
+    )
+    parser.add_argument("--rows", type=int, default=2000, help="Descriptions to match")
+    parser.add_argument(
+        "--max-regex-aliases",
+        type=int,
+        default=10000,
+        help="Skip the linear regex matcher above this many aliases",
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'aliases':>10} {'automaton us/row':>18} {'regex us/row':>14}")
+    for alias_count in args.alias_counts:
+        rng = random.Random(args.seed)
+        patterns = _make_patterns(rng, alias_count)
+        descriptions = _make_descriptions(rng, patterns, args.rows)
+
+        automaton_matcher = AutomatonLikeMatcher()
+        for pattern in patterns:
+            automaton_matcher.add(pattern, pattern)
+        automaton_us = _time_per_row(automaton_matcher, descriptions, args.repeat)
+
+        regex_column = "-"
+        if alias_count <= args.max_regex_aliases:
+            regex_matcher = RegexLikeMatcher()
+            for pattern in patterns:
+                regex_matcher.add(pattern, pattern)
+            regex_us = _time_per_row(regex_matcher, descriptions, args.repeat)
+            regex_column = f"{regex_us:.1f}"
+
+        print(f"{alias_count:>10} {automaton_us:>18.1f} {regex_column:>14}")
+
+
+if __name__ == "__main__":
+    main()
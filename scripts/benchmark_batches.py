@@ -0,0 +1,232 @@
+"""
+Benchmarks the batch backends (pure Python and NumPy) on columnar batches, and the
+itemization of a generated file row by row against columnar batches
+
+Usage:
+
+    RECEIPTS_ENV=dev PYTHONPATH=. python scripts/benchmark_batches.py
+"""
+import argparse
+from array import array
+import logging
+import os
+import tempfile
+import timeit
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "taxes.settings")
+django.setup()
+
+# pylint: disable=wrong-import-position
+from taxes.receipts.batch import DEFAULT_TRANSACTION_BATCH_SIZE  # noqa: E402
+from taxes.receipts.itemize import ItemizationSession, Itemizer  # noqa: E402
+from taxes.receipts.matching import (  # noqa: E402
+    AliasIndex,
+    AliasMatcherType,
+    ExclusionIndex,
+    MatchingIndex,
+    PeriodicPaymentIndex,
+)
+from taxes.receipts.models import (  # noqa: E402
+    PaymentMethod,
+    PeriodicPayment,
+    Vendor,
+    VendorAliasPattern,
+)
+from taxes.receipts.parsers import BMOCSVBankAccountParser  # noqa: E402
+from taxes.receipts.types import (  # noqa: E402
+    AliasMatchOperation,
+    Currency,
+    TaxType,
+    TransactionType,
+)
+from taxes.receipts.writers import BaseTransactionWriter  # noqa: E402
+from taxes.receipts.vectorized import (  # noqa: E402
+    BatchBackendType,
+    make_batch_backend,
+    numpy,
+)
+
+# pylint: enable=wrong-import-position
+
+
+FIRST_DATE_ORDINAL = 735964  # 2016-01-01
+
+
+def _make_columns(num_rows):
+    amounts = array("q", (-(row % 100000) for row in range(num_rows)))
+    date_ordinals = array(
+        "q", (FIRST_DATE_ORDINAL + row % 366 for row in range(num_rows))
+    )
+    # a few fixed amounts, periodic payments and dated amount exclusions
+    fixed_amounts = array(
+        "q", (50000 if row % 50 == 0 else 0 for row in range(num_rows))
+    )
+    periodic_amounts = [-amount for amount in range(30000, 31000, 10)]
+    dated_amounts = {
+        (FIRST_DATE_ORDINAL + day, -amount)
+        for day in range(0, 366, 7)
+        for amount in range(1000, 1100)
+    }
+    return amounts, date_ordinals, fixed_amounts, periodic_amounts, dated_amounts
+
+
+def _run_batches(backend, columns, batch_size):
+    amounts, date_ordinals, fixed_amounts, periodic_amounts, dated_amounts = columns
+    for start in range(0, len(amounts), batch_size):
+        end = start + batch_size
+        batch_amounts = amounts[start:end]
+        backend.isin(batch_amounts, periodic_amounts)
+        backend.pairs_isin(date_ordinals[start:end], batch_amounts, dated_amounts)
+        total_amounts = backend.override_amounts(
+            batch_amounts, fixed_amounts[start:end]
+        )
+        backend.tax_adjustment_amounts(total_amounts, TaxType.HST)
+
+
+NUM_VENDORS = 500
+NUM_PERIODIC_PAYMENTS = 50
+
+BMO_SAVINGS_HEADER = (
+    "Following data is valid as of 20160907020047 (Year/Month/Day/Hour/Minute/Second)"
+    "\n\n\nFirst Bank Card,Transaction Type,Date Posted, Transaction Amount,"
+    "Description\n\n\n"
+)
+
+
+class _DiscardingWriter(BaseTransactionWriter):
+    def add(self, receipt, tax_adjustment):
+        self.inserted += 1
+
+
+def _make_matching_index():
+    vendors = [
+        Vendor(
+            name=f"Vendor {vendor:03d}",
+            default_expense_type=TransactionType.ADMINISTRATIVE,
+            tax_adjustment_type=TaxType.HST if vendor % 10 == 0 else None,
+        )
+        for vendor in range(NUM_VENDORS + NUM_PERIODIC_PAYMENTS)
+    ]
+    aliases = [
+        VendorAliasPattern(
+            vendor=vendor,
+            pattern=f"POS PURCHASE VENDOR {index:03d} %",
+            match_operation=AliasMatchOperation.LIKE,
+        )
+        for index, vendor in enumerate(vendors[:NUM_VENDORS])
+    ]
+    periodic_payments = [
+        PeriodicPayment(vendor=vendor, currency=Currency.CAD, amount=100000 + index)
+        for index, vendor in enumerate(vendors[NUM_VENDORS:])
+    ]
+    return MatchingIndex(
+        AliasIndex(aliases), PeriodicPaymentIndex(periodic_payments), ExclusionIndex([])
+    )
+
+
+def _write_bmo_savings_file(fileobj, num_rows):
+    # mostly purchases of known vendors, a few deposits (periodic payments),
+    # excluded transfers and unknown vendors
+    fileobj.write(BMO_SAVINGS_HEADER)
+    for row in range(num_rows):
+        date_string = f"2016{1 + row % 12:02d}{1 + row % 28:02d}"
+        if row % 20 == 0:
+            amount = f"1000.{row % NUM_PERIODIC_PAYMENTS:02d}"
+            description = "[CD]"
+        elif row % 20 == 1:
+            amount, description = f"-{row % 1000}.00", "[CW]INTERAC ETRNSFR SENT"
+        elif row % 20 == 2:
+            amount, description = f"-{row % 1000}.00", f"[DS]UNKNOWN {row % 100}"
+        else:
+            amount = f"-{row % 100}.{row % 97:02d}"
+            description = f"[DS]POS PURCHASE VENDOR {row % NUM_VENDORS:03d} TORONTO"
+        fileobj.write(
+            f"'500766**********',DEBIT,{date_string},{amount},'{description}'\n"
+        )
+
+
+def _itemize(filename, payment_method, matching_index, batch_size, backend=None):
+    parser = BMOCSVBankAccountParser(payment_method)
+    itemizer = Itemizer(
+        filename,
+        session=ItemizationSession(
+            matching_index, alias_matcher_type=AliasMatcherType.MEMORY
+        ),
+        writer=_DiscardingWriter(),
+        batch_backend=backend,
+    )
+    if backend is None:
+        itemizer.process_transactions(parser.parse(filename))
+    else:
+        itemizer.process_batches(parser.parse_batches(filename, batch_size))
+
+
+def _benchmark_itemizer(args, backend_types):
+    # unmatched vendors and periodic payments are expected
+    logging.disable(logging.WARNING)
+    payment_method = PaymentMethod(
+        name="BMO Savings", currency=Currency.CAD, allow_periodic_payments=True
+    )
+    matching_index = _make_matching_index()
+    modes = [("rows", None)] + [
+        (f"batches ({backend_type.value})", make_batch_backend(backend_type))
+        for backend_type in backend_types
+    ]
+    with tempfile.NamedTemporaryFile("w", suffix=".csv") as transaction_file:
+        _write_bmo_savings_file(transaction_file, args.rows)
+        transaction_file.flush()
+
+        print(f"{'itemizer':>18} {'seconds':>9} {'rows/s':>12}")
+        for name, backend in modes:
+            elapsed = min(
+                timeit.repeat(
+                    lambda: _itemize(
+                        transaction_file.name,
+                        payment_method,
+                        matching_index,
+                        args.batch_size,
+                        backend,
+                    ),
+                    number=1,
+                    repeat=args.repeat,
+                )
+            )
+            print(f"{name:>18} {elapsed:>9.2f} {args.rows / elapsed:>12.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch backend benchmark")
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument(
+        "--batch-size", type=int, default=DEFAULT_TRANSACTION_BATCH_SIZE
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    backend_types = [BatchBackendType.PYTHON]
+    if numpy is not None:
+        backend_types.append(BatchBackendType.NUMPY)
+    else:
+        print("NumPy is not installed")
+
+    columns = _make_columns(args.rows)
+    print(f"{'backend':>10} {'seconds':>9} {'rows/s':>12}")
+    for backend_type in backend_types:
+        backend = make_batch_backend(backend_type)
+        elapsed = min(
+            timeit.repeat(
+                lambda: _run_batches(backend, columns, args.batch_size),
+                number=1,
+                repeat=args.repeat,
+            )
+        )
+        print(f"{backend_type.value:>10} {elapsed:>9.2f} {args.rows / elapsed:>12.0f}")
+
+    print()
+    _benchmark_itemizer(args, backend_types)
+
+
+if __name__ == "__main__":
+    main()
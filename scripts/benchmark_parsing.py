@@ -0,0 +1,178 @@
+"""
+Benchmarks the line filters, date and amount parsing and parsing of transaction
+files
+
+Usage:
+
+    RECEIPTS_ENV=dev PYTHONPATH=. python scripts/benchmark_parsing.py
+"""
+import argparse
+import datetime
+import decimal
+import os
+import tempfile
+import timeit
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "taxes.settings")
+django.setup()
+
+# pylint: disable=wrong-import-position
+from taxes.receipts.models import PaymentMethod  # noqa: E402
+from taxes.receipts.parsers import (  # noqa: E402
+    BMOCSVBankAccountParser,
+    TextFileIterator,
+)
+from taxes.receipts.types import Currency  # noqa: E402
+from taxes.receipts.util.currency import parse_amount  # noqa: E402
+from taxes.receipts.util.datetime import parse_date  # noqa: E402
+
+# pylint: enable=wrong-import-position
+
+
+BMO_SAVINGS_HEADER = (
+    "Following data is valid as of 20160907020047 (Year/Month/Day/Hour/Minute/Second)"
+    "\n\n\nFirst Bank Card,Transaction Type,Date Posted, Transaction Amount,"
+    "Description\n\n\n"
+)
+
+
+def _make_date_string(line):
+    # a few hundred distinct dates
+    return f"20{15 + line % 3}{1 + line % 12:02d}{1 + line % 28:02d}"
+
+
+def _make_amount_string(line):
+    return f"-{line % 1000}.{line % 100:02d}"
+
+
+def _write_bmo_savings_file(fileobj, num_lines):
+    fileobj.write(BMO_SAVINGS_HEADER)
+    for line in range(num_lines):
+        if line % 10 == 9:
+            fileobj.write("\n")
+        else:
+            fileobj.write(
+                f"'500766**********',DEBIT,{_make_date_string(line)},"
+                f"{_make_amount_string(line)},'[CW]INTERAC ETRNSFR SENT {line:08d}'\n"
+            )
+
+
+def _parse_dates_with_strptime(date_strings, date_format):
+    for date_string in date_strings:
+        datetime.datetime.strptime(date_string, date_format).date()
+
+
+def _parse_dates(date_strings, date_format):
+    parse_date.cache_clear()
+    for date_string in date_strings:
+        parse_date(date_string, date_format)
+
+
+def _filter_lines_with_generators(parser_class, filename):
+    # line by line, as before the filters were compiled
+    with open(filename, "r") as transaction_file:
+        lines = filter(
+            lambda line: all((f.is_accepted(line) for f in parser_class.LINE_FILTERS)),
+            TextFileIterator(transaction_file),
+        )
+        for _ in lines:
+            pass
+
+
+def _filter_lines_compiled(parser_class, filename):
+    with open(filename, "r") as transaction_file:
+        for _ in parser_class.get_line_filter()(TextFileIterator(transaction_file)):
+            pass
+
+
+def _parse(parser, filename):
+    for _ in parser.parse(filename):
+        pass
+
+
+def _parse_amounts_with_decimal(amount_strings):
+    for amount_string in amount_strings:
+        round(decimal.Decimal(amount_string) * 100)
+
+
+def _parse_amounts(amount_strings):
+    parse_amount.cache_clear()
+    for amount_string in amount_strings:
+        parse_amount(amount_string)
+
+
+def _time(function, repeat):
+    return min(timeit.repeat(function, number=1, repeat=repeat))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parsing benchmark")
+    parser.add_argument(
+        "--lines", type=int, default=1000000, help="Lines of the generated file"
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    parser_class = BMOCSVBankAccountParser
+    transaction_parser = parser_class(
+        PaymentMethod(name="BMO Savings", currency=Currency.CAD)
+    )
+    with tempfile.NamedTemporaryFile("w", suffix=".csv") as transaction_file:
+        _write_bmo_savings_file(transaction_file, args.lines)
+        transaction_file.flush()
+        filename = transaction_file.name
+
+        timings = [
+            (
+                "line filters (generator per line)",
+                _time(
+                    lambda: _filter_lines_with_generators(parser_class, filename),
+                    args.repeat,
+                ),
+            ),
+            (
+                "line filters (compiled)",
+                _time(
+                    lambda: _filter_lines_compiled(parser_class, filename), args.repeat
+                ),
+            ),
+            ("parse", _time(lambda: _parse(transaction_parser, filename), args.repeat)),
+        ]
+
+    date_strings = [_make_date_string(line) for line in range(args.lines)]
+    date_format = parser_class.TRANSACTION_DATE_FORMAT
+    timings += [
+        (
+            "dates (strptime)",
+            _time(
+                lambda: _parse_dates_with_strptime(date_strings, date_format),
+                args.repeat,
+            ),
+        ),
+        (
+            "dates (parse_date)",
+            _time(lambda: _parse_dates(date_strings, date_format), args.repeat),
+        ),
+    ]
+
+    amount_strings = [_make_amount_string(line) for line in range(args.lines)]
+    timings += [
+        (
+            "amounts (Decimal)",
+            _time(lambda: _parse_amounts_with_decimal(amount_strings), args.repeat),
+        ),
+        (
+            "amounts (parse_amount)",
+            _time(lambda: _parse_amounts(amount_strings), args.repeat),
+        ),
+    ]
+
+    print(f"{'stage':>36} {'seconds':>9} {'lines/s':>12}")
+    for name, elapsed in timings:
+        print(f"{name:>36} {elapsed:>9.2f} {args.lines / elapsed:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -125,3 +125,9 @@ class TaxAdjustmentAdmin(admin.ModelAdmin):
 
     receipt_vendor_name.short_description = "Receipt Vendor Name"
     # pylint: enable=no-self-use
+
+
+@admin.register(models.ImportedFile)
+class ImportedFileAdmin(admin.ModelAdmin):
+    list_display = ("path", "payment_method", "row_count", "imported_at")
+    ordering = ("-imported_at",)
@@ -0,0 +1,162 @@
+"""
+Columnar batches of parsed transactions
+
+Instead of an object per transaction, a batch holds the transactions of a single
+payment method (and currency) in columns: amounts, dates (as day ordinals) and
+line numbers in arrays of integers and (interned) descriptions and extras in
+lists. This reduces the memory per buffered transaction and lets the itemizer,
+exclusion filters and tax computation process a whole batch at once.
+"""
+from array import array
+import datetime
+import sys
+import typing
+
+from taxes.receipts.models import PaymentMethod
+from taxes.receipts.types import Currency, RawTransaction, RawTransactionIterable
+
+
+DEFAULT_TRANSACTION_BATCH_SIZE = 4096
+
+# columns of the extras of each transaction (the unknown extras are dictionaries)
+MISC_COLUMNS = RawTransaction.MISC_FIELDS + ("extras",)
+
+
+class TransactionBatch:
+    """
+    Consecutive transactions of a single payment method stored in columns
+    """
+
+    __slots__ = (
+        "payment_method",
+        "currency",
+        "line_numbers",
+        "date_ordinals",
+        "amounts",
+        "descriptions",
+        "misc_columns",
+    )
+
+    def __init__(self, payment_method: PaymentMethod, currency: Currency):
+        self.payment_method = payment_method
+        self.currency = currency
+        self.line_numbers = array("q")
+        self.date_ordinals = array("q")
+        self.amounts = array("q")
+        self.descriptions: typing.List[str] = []
+        # only the columns of extras which are set in any row
+        self.misc_columns: typing.Dict[str, list] = {}
+
+    def __len__(self):
+        return len(self.amounts)
+
+    def accepts(self, raw_transaction: RawTransaction) -> bool:
+        return (
+            raw_transaction.payment_method is self.payment_method
+            and raw_transaction.currency == self.currency
+        )
+
+    def append(self, raw_transaction: RawTransaction):
+        if not self.accepts(raw_transaction):
+            raise ValueError("Transaction of another payment method or currency")
+
+        self.append_values(
+            raw_transaction.line_number,
+            raw_transaction.transaction_date.toordinal(),
+            raw_transaction.amount,
+            raw_transaction.description,
+            **{field: getattr(raw_transaction, field) for field in MISC_COLUMNS},
+        )
+
+    def append_values(
+        self,
+        line_number: int,
+        date_ordinal: int,
+        amount: int,
+        description: str,
+        **misc_values,
+    ):
+        """
+        Appends the parsed fields of a transaction without a RawTransaction
+
+        :param misc_values: values of MISC_COLUMNS (None if not set)
+        """
+        num_rows = len(self)
+        self.line_numbers.append(line_number)
+        self.date_ordinals.append(date_ordinal)
+        self.amounts.append(amount)
+        self.descriptions.append(sys.intern(description))
+
+        misc_columns = self.misc_columns
+        for field, value in misc_values.items():
+            if value is None:
+                continue
+            column = misc_columns.get(field)
+            if column is None:
+                if field not in MISC_COLUMNS:
+                    raise ValueError(f"Unknown column of extras: {field}")
+                column = misc_columns[field] = [None] * num_rows
+            column.append(sys.intern(value) if value.__class__ is str else value)
+        # columns which are not set in this row
+        for column in misc_columns.values():
+            if len(column) == num_rows:
+                column.append(None)
+
+    def get_column(self, field: str) -> list:
+        """
+        Returns a column of extras (e.g. "transaction_code")
+        """
+        column = self.misc_columns.get(field)
+        if column is None:
+            return [None] * len(self)
+        return column
+
+    def transaction_dates(self) -> typing.List[datetime.date]:
+        # a batch usually spans only a few distinct dates
+        dates = {}
+        for ordinal in self.date_ordinals:
+            if ordinal not in dates:
+                dates[ordinal] = datetime.date.fromordinal(ordinal)
+        return [dates[ordinal] for ordinal in self.date_ordinals]
+
+    def __getitem__(self, index: int) -> RawTransaction:
+        raw_transaction = RawTransaction(
+            line_number=self.line_numbers[index],
+            transaction_date=datetime.date.fromordinal(self.date_ordinals[index]),
+            amount=self.amounts[index],
+            currency=self.currency,
+            description=self.descriptions[index],
+            payment_method=self.payment_method,
+        )
+        for field, column in self.misc_columns.items():
+            setattr(raw_transaction, field, column[index])
+        return raw_transaction
+
+    def __iter__(self) -> typing.Iterator[RawTransaction]:
+        return (self[index] for index in range(len(self)))
+
+
+def batch_transactions(
+    raw_transactions: RawTransactionIterable,
+    batch_size: int = DEFAULT_TRANSACTION_BATCH_SIZE,
+) -> typing.Iterator[TransactionBatch]:
+    """
+    Groups transactions into batches of at most batch_size rows
+
+    A new batch is started whenever the payment method or currency changes.
+    """
+    batch = None
+    for raw_transaction in raw_transactions:
+        if (
+            batch is None
+            or len(batch) >= batch_size
+            or not batch.accepts(raw_transaction)
+        ):
+            if batch:
+                yield batch
+            batch = TransactionBatch(
+                raw_transaction.payment_method, raw_transaction.currency
+            )
+        batch.append(raw_transaction)
+    if batch:
+        yield batch
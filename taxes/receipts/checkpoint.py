@@ -0,0 +1,135 @@
+"""
+Itemization of transaction files with intermediate commits
+
+Every file (and optionally every N rows) is committed along with its progress in
+the import ledger, so a failure only discards the work since the last checkpoint.
+Importing the same file again resumes after its last committed line: the lines
+before it are still parsed and fingerprinted (so that the fingerprints of the
+remaining transactions are unchanged) but not itemized again, and the receipts
+are the same as those of an uninterrupted import.
+"""
+import itertools
+import logging
+import typing
+
+from django.db import transaction
+
+from taxes.receipts.itemize import (
+    ItemizationSession,
+    Itemizer,
+    TransactionFingerprinter,
+)
+from taxes.receipts.ledger import ImportLedger
+from taxes.receipts.parsers_factory import ParserFactory
+from taxes.receipts.staging import ItemizerType, StagingItemizer
+from taxes.receipts.types import RawTransaction, RawTransactionIterable
+from taxes.receipts.writers import BaseTransactionWriter
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+def skip_imported_transactions(
+    raw_transactions: RawTransactionIterable,
+    fingerprinter: TransactionFingerprinter,
+    last_line_number: int,
+) -> typing.Iterator[RawTransaction]:
+    """
+    Omits the transactions up to (and including) a line which were already
+    imported
+    """
+    for raw_transaction in raw_transactions:
+        if raw_transaction.line_number <= last_line_number:
+            # occurrences must be counted as in the original import
+            fingerprinter.fingerprint(raw_transaction)
+        else:
+            yield raw_transaction
+
+
+def _chunks(
+    raw_transactions: RawTransactionIterable, chunk_size: typing.Optional[int]
+) -> typing.Iterator[RawTransactionIterable]:
+    if not chunk_size:
+        yield raw_transactions
+        return
+
+    raw_transactions = iter(raw_transactions)
+    while True:
+        chunk = list(itertools.islice(raw_transactions, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class CheckpointedImport:
+    """
+    Itemizes files one by one, committing after every file (and every
+    checkpoint_rows rows)
+
+    Must run with autocommit disabled.
+    """
+
+    def __init__(
+        self,
+        parser_factory: ParserFactory,
+        ledger: ImportLedger,
+        writer: BaseTransactionWriter,
+        itemizer_type: ItemizerType = ItemizerType.PYTHON,
+        session: ItemizationSession = None,
+        checkpoint_rows: int = None,
+    ):
+        self.parser_factory = parser_factory
+        self.ledger = ledger
+        self.writer = writer
+        self.itemizer_type = itemizer_type
+        self.session = session or ItemizationSession()
+        self.checkpoint_rows = checkpoint_rows
+        # receipts of the staging itemizer (the writer counts all others)
+        self.staging_inserted = 0
+        self.staging_skipped = 0
+
+    def run(self, filenames: typing.List[str]) -> int:
+        """
+        Itemizes all files (returned by ImportLedger.filter_new())
+
+        :return: total number of parser failures
+        """
+        return sum(self._import_file(filename) for filename in filenames)
+
+    def _import_file(self, filename: str) -> int:
+        LOGGER.info("Starting to process: %s...", filename)
+        parser = self.parser_factory.get_parser(filename)
+        if self.itemizer_type == ItemizerType.STAGING:
+            itemizer = StagingItemizer(filename)
+        else:
+            itemizer = Itemizer(filename, session=self.session, writer=self.writer)
+
+        raw_transactions = skip_imported_transactions(
+            parser.parse(filename),
+            itemizer.fingerprinter,
+            self.ledger.resume_line_number(filename),
+        )
+        for chunk in _chunks(raw_transactions, self.checkpoint_rows):
+            itemizer.process_transactions(chunk)
+            if self.checkpoint_rows:
+                last_line_number = chunk[-1].line_number
+                self.ledger.checkpoint(
+                    filename, parser.payment_method, parser.rows, last_line_number
+                )
+                transaction.commit()
+                LOGGER.info("Committed %s up to line %d", filename, last_line_number)
+
+        if self.itemizer_type == ItemizerType.STAGING:
+            self.staging_inserted += itemizer.inserted
+            self.staging_skipped += itemizer.skipped
+        self.ledger.record(filename, parser.payment_method, parser.rows, parser.sha256)
+        transaction.commit()
+
+        error_summary = (
+            f"({parser.failures} parser errors, {itemizer.failures} itemization "
+            "errors)"
+            if parser.failures + itemizer.failures
+            else ""
+        )
+        LOGGER.info("Finished processing: %s, %s", filename, error_summary)
+        return parser.failures
@@ -10,10 +10,13 @@ from importlib import import_module
 from django.db.models import Q
 
 from taxes.receipts import models
+from taxes.receipts.batch import TransactionBatch
 from taxes.receipts.types import RawTransaction
+from taxes.receipts.vectorized import BaseBatchBackend
 
 
 class BaseVendorExclusionFilter(metaclass=abc.ABCMeta):
+    @abc.abstractmethod
     def is_exclusion(self, transaction: RawTransaction) -> bool:
         """
         Determine if a transaction should be excluded
@@ -25,16 +28,46 @@ class BaseVendorExclusionFilter(metaclass=abc.ABCMeta):
         :return: true to exclude, false otherwise
         """
 
+    def exclusion_mask(
+        self, batch: TransactionBatch, backend: BaseBatchBackend
+    ) -> typing.List[bool]:
+        """
+        Determines which transactions of a batch should be excluded
+
+        Calls is_exclusion() for every transaction unless overridden.
+
+        :param backend: computes the membership tests of the batch
+        """
+        return [self.is_exclusion(transaction) for transaction in batch]
+
+    def use_exclusion_index(self, exclusion_index):
+        """
+        Provides the in-memory index of exclusion conditions (if required)
+
+        :param exclusion_index: matching.ExclusionIndex instance
+        """
+
 
 class ExclusionConditionFilter(BaseVendorExclusionFilter):
     """
     Filters based on loaded exclusions in the database
     """
 
+    def __init__(self):
+        self.exclusion_index = None
+
+    def use_exclusion_index(self, exclusion_index):
+        self.exclusion_index = exclusion_index
+
     def is_exclusion(self, transaction: RawTransaction) -> bool:
         # TODO future support to filter on payment_method
         q_pattern = transaction.description.upper()
         for_date = transaction.transaction_date
+        if self.exclusion_index is not None:
+            return self.exclusion_index.is_excluded(
+                q_pattern, for_date, transaction.amount
+            )
+
         return models.ExclusionCondition.objects.filter(
             Q(
                 Q(prefix__isnull=False, prefix__is_prefix_match=q_pattern)
@@ -43,6 +76,24 @@ class ExclusionConditionFilter(BaseVendorExclusionFilter):
             | Q(prefix__isnull=True, on_date=for_date, amount=transaction.amount)
         ).exists()
 
+    def exclusion_mask(
+        self, batch: TransactionBatch, backend: BaseBatchBackend
+    ) -> typing.List[bool]:
+        if self.exclusion_index is None:
+            return super().exclusion_mask(batch, backend)
+
+        dated_amount_mask = backend.pairs_isin(
+            batch.date_ordinals, batch.amounts, self.exclusion_index.dated_amounts()
+        )
+        is_prefix_excluded = self.exclusion_index.is_prefix_excluded
+        return [
+            is_dated_amount_excluded
+            or is_prefix_excluded(description.upper(), for_date)
+            for is_dated_amount_excluded, description, for_date in zip(
+                dated_amount_mask, batch.descriptions, batch.transaction_dates()
+            )
+        ]
+
 
 class BMOTransactionCodeFilter(BaseVendorExclusionFilter):
     """
@@ -52,9 +103,15 @@ class BMOTransactionCodeFilter(BaseVendorExclusionFilter):
     EXCLUDED_TRANSACTION_CODES = {"SO", "SC", "CW"}
 
     def is_exclusion(self, transaction: RawTransaction) -> bool:
-        transaction_code = transaction.misc.get("transaction_code")
+        transaction_code = transaction.transaction_code
         return transaction_code and transaction_code in self.EXCLUDED_TRANSACTION_CODES
 
+    def exclusion_mask(
+        self, batch: TransactionBatch, backend: BaseBatchBackend
+    ) -> typing.List[bool]:
+        excluded_codes = self.EXCLUDED_TRANSACTION_CODES
+        return [code in excluded_codes for code in batch.get_column("transaction_code")]
+
 
 class CreditPaymentFilter(BaseVendorExclusionFilter):
     """
@@ -71,38 +128,80 @@ class CreditPaymentFilter(BaseVendorExclusionFilter):
 
     def is_exclusion(self, transaction: RawTransaction) -> bool:
         return (
-            transaction.misc.get("category") == "Payment"
-            or transaction.misc.get("type") == "Payment"
+            transaction.category == "Payment"
+            or transaction.type == "Payment"
             or transaction.description.upper() in self.PAYMENT_DESCRIPTIONS
         )
 
+    def exclusion_mask(
+        self, batch: TransactionBatch, backend: BaseBatchBackend
+    ) -> typing.List[bool]:
+        payment_descriptions = self.PAYMENT_DESCRIPTIONS
+        return [
+            category == "Payment"
+            or transaction_type == "Payment"
+            or description.upper() in payment_descriptions
+            for category, transaction_type, description in zip(
+                batch.get_column("category"),
+                batch.get_column("type"),
+                batch.descriptions,
+            )
+        ]
+
 
 class CRAPaymentFilter(BaseVendorExclusionFilter):
     """
     Filtesr out CRA withholding tax payments
     """
 
+    PAYMENT_METHOD_NAME = "BMO Savings"
+    DESCRIPTION_PATTERN = re.compile(r"^ONLINE PURCHASE\s.*PAY\s+TO\s+CRA")
+
     def is_exclusion(self, transaction: RawTransaction) -> bool:
         return (
-            transaction.payment_method.name == "BMO Savings"
-            and re.search(
-                r"^ONLINE PURCHASE\s.*PAY\s+TO\s+CRA", transaction.description.upper()
-            )
+            transaction.payment_method.name == self.PAYMENT_METHOD_NAME
+            and self.DESCRIPTION_PATTERN.search(transaction.description.upper())
             is not None
         )
 
+    def exclusion_mask(
+        self, batch: TransactionBatch, backend: BaseBatchBackend
+    ) -> typing.List[bool]:
+        return _payment_method_exclusion_mask(
+            batch, self.PAYMENT_METHOD_NAME, self.DESCRIPTION_PATTERN
+        )
+
 
 class WellsFargoOnlinePaymentFilter(BaseVendorExclusionFilter):
+    PAYMENT_METHOD_NAME = "Wells Fargo Checking"
+    DESCRIPTION_PATTERN = re.compile(r"^(ONLINE TRANSFER REF|BILL PAY)\s.+ON\s.+$")
+
     def is_exclusion(self, transaction: RawTransaction) -> bool:
         return (
-            transaction.payment_method.name == "Wells Fargo Checking"
-            and re.search(
-                r"^(ONLINE TRANSFER REF|BILL PAY)\s.+ON\s.+$",
-                transaction.description.upper(),
-            )
+            transaction.payment_method.name == self.PAYMENT_METHOD_NAME
+            and self.DESCRIPTION_PATTERN.search(transaction.description.upper())
             is not None
         )
 
+    def exclusion_mask(
+        self, batch: TransactionBatch, backend: BaseBatchBackend
+    ) -> typing.List[bool]:
+        return _payment_method_exclusion_mask(
+            batch, self.PAYMENT_METHOD_NAME, self.DESCRIPTION_PATTERN
+        )
+
+
+def _payment_method_exclusion_mask(
+    batch: TransactionBatch, payment_method_name: str, description_pattern: re.Pattern
+) -> typing.List[bool]:
+    # all transactions of a batch have the same payment method
+    if batch.payment_method.name != payment_method_name:
+        return [False] * len(batch)
+    search = description_pattern.search
+    return [
+        search(description.upper()) is not None for description in batch.descriptions
+    ]
+
 
 def load_filters_from_modules(
     module_paths: typing.Iterable[str],
@@ -1,103 +1,389 @@
 """
 Itemization logic
 """
+import collections
+import datetime
+import hashlib
+import itertools
 import logging
 import typing
+import uuid
 
-from dataclasses import dataclass
 from django.conf import settings
-from django.db.models.query import Q
-import django.core.exceptions as django_exc
 
-from taxes.receipts.filters import load_filters_from_modules
+from taxes.receipts.batch import TransactionBatch
+from taxes.receipts.filters import (
+    BaseVendorExclusionFilter,
+    load_filters_from_modules,
+)
 from taxes.receipts import models
+from taxes.receipts.matching import (
+    AliasMatcherType,
+    BaseAliasMatcher,
+    MatchingIndex,
+    PeriodicPaymentIndex,
+    SQLAliasMatcher,
+    VendorMatch,
+)
 from taxes.receipts.types import (
-    AliasMatchOperation,
     Currency,
-    TransactionType,
     RawTransaction,
     RawTransactionIterable,
+    TaxType,
 )
-from taxes.receipts.tax import add_tax_adjustment
+from taxes.receipts.tax import compute_tax_adjustment_amount
 from taxes.receipts.util.currency import cents_to_dollars
+from taxes.receipts.vectorized import BaseBatchBackend, make_batch_backend
+from taxes.receipts.writers import (
+    BaseTransactionWriter,
+    ReceiptRow,
+    TaxAdjustmentRow,
+    TransactionWriter,
+)
 
 
 LOGGER = logging.getLogger(__name__)
 
+DEFAULT_VENDOR_MATCH_MEMO_SIZE = 10000
+
+# receipt (and tax adjustment) of an itemized transaction
+ItemizedRows = typing.Tuple[ReceiptRow, typing.Optional[TaxAdjustmentRow]]
+
+PERIODIC_PAYMENT_TRANSACTION_CODES = {"CD", "IB"}
+
+
+def allows_periodic_payments(
+    payment_method: models.PaymentMethod, currency: Currency
+) -> bool:
+    return payment_method.allow_periodic_payments and currency == Currency.CAD
+
+
+def is_periodic_payment(transaction: RawTransaction) -> bool:
+    return (
+        allows_periodic_payments(transaction.payment_method, transaction.currency)
+        and transaction.transaction_code in PERIODIC_PAYMENT_TRANSACTION_CODES
+    )
+
+
+# TODO: Remove once astroid is upgraded past v2.4.2 (and pylint is upgraded too)
+# pylint:disable=unsubscriptable-object
+def _get_fixed_amount(vendor_match: typing.Optional[VendorMatch]) -> int:
+    # 0 unless the matched vendor has a fixed amount
+    if vendor_match and vendor_match.vendor.fixed_amount:
+        return vendor_match.vendor.fixed_amount
+    return 0
 
-@dataclass
-class VendorMatch:
-    vendor: models.Vendor
-    asset: models.FinancialAsset
-    expense_type: TransactionType
+
+def _get_tax_adjustment_type(
+    vendor_match: typing.Optional[VendorMatch],
+) -> typing.Optional[TaxType]:
+    if vendor_match and vendor_match.vendor.tax_adjustment_type:
+        return vendor_match.vendor.tax_adjustment_type
+    return None
+
+
+# pylint:enable=unsubscriptable-object
+
+
+def memo_hit_rate(hits: int, misses: int) -> float:
+    """
+    Percentage of vendor match memo lookups which were hits
+    """
+    lookups = hits + misses
+    return 100.0 * hits / lookups if lookups else 0.0
+
+
+class TransactionFingerprinter:
+    """
+    Fingerprints the raw transactions of a single file
+
+    Identical transactions within a file (e.g. two equal purchases on the same
+    day) are told apart by their order of occurrence.
+    """
+
+    def __init__(self):
+        self._occurrences = collections.Counter()
+
+    def fingerprint(self, transaction: RawTransaction) -> str:
+        return self.fingerprint_key(
+            (
+                str(transaction.payment_method.id),
+                transaction.transaction_date.isoformat(),
+                transaction.amount,
+                transaction.description,
+            )
+        )
+
+    def fingerprint_key(self, key: tuple) -> str:
+        """
+        Fingerprints a transaction by its (payment method ID, ISO date, amount,
+        description)
+        """
+        occurrence = self._occurrences[key]
+        self._occurrences[key] += 1
+        return hashlib.sha256(repr(key + (occurrence,)).encode()).hexdigest()
+
+    def fingerprint_batch(self, batch: TransactionBatch) -> typing.List[str]:
+        """
+        Fingerprints the transactions of a batch (same as fingerprint())
+        """
+        payment_method_id = str(batch.payment_method.id)
+        # a batch usually spans only a few distinct dates
+        iso_dates = {}
+        fingerprints = []
+        rows = zip(batch.date_ordinals, batch.amounts, batch.descriptions)
+        for date_ordinal, amount, description in rows:
+            iso_date = iso_dates.get(date_ordinal)
+            if iso_date is None:
+                iso_date = iso_dates[date_ordinal] = datetime.date.fromordinal(
+                    date_ordinal
+                ).isoformat()
+            fingerprints.append(
+                self.fingerprint_key((payment_method_id, iso_date, amount, description))
+            )
+        return fingerprints
+
+
+class ItemizationSession:
+    """
+    State shared by the itemization of all files in a single run
+
+    Holds the loaded exclusion filters, the matching indexes, a memo of recently
+    matched descriptions and an identity map of matched vendors and assets.
+    """
+
+    def __init__(
+        self,
+        matching_index: MatchingIndex = None,
+        memo_size: int = DEFAULT_VENDOR_MATCH_MEMO_SIZE,
+        alias_matcher_type: AliasMatcherType = None,
+    ):
+        self._exclusion_filters = load_filters_from_modules(
+            settings.EXCLUSION_FILTER_MODULES
+        )
+        self._exclusion_filters_bound = False
+        self._matching_index = matching_index
+        self._alias_matcher_type = alias_matcher_type
+        self._alias_matcher = None
+
+        # LRU memo of upper-cased descriptions to vendor matches (None if unmatched)
+        self._memo = collections.OrderedDict()
+        self._memo_size = memo_size
+        self.memo_hits = 0
+        self.memo_misses = 0
+
+        self._vendors = {}
+        self._assets = {}
+
+    @property
+    def alias_matcher_type(self) -> AliasMatcherType:
+        # configured in the settings unless specified
+        return self._alias_matcher_type or AliasMatcherType(settings.ALIAS_MATCHER)
+
+    @property
+    def matching_index(self) -> MatchingIndex:
+        # loaded lazily so that all aliases are in place at processing time
+        if self._matching_index is None:
+            with_aliases = self.alias_matcher_type == AliasMatcherType.MEMORY
+            if settings.MATCHING_INDEX_CACHE_PATH:
+                self._matching_index = MatchingIndex.load_snapshot(
+                    settings.MATCHING_INDEX_CACHE_PATH, with_aliases=with_aliases
+                )
+            else:
+                self._matching_index = MatchingIndex.load(with_aliases=with_aliases)
+        return self._matching_index
+
+    @property
+    def alias_matcher(self) -> BaseAliasMatcher:
+        if self._alias_matcher is None:
+            if self.alias_matcher_type == AliasMatcherType.SQL:
+                self._alias_matcher = SQLAliasMatcher()
+            else:
+                self._alias_matcher = self.matching_index.aliases
+        return self._alias_matcher
+
+    @property
+    def periodic_payments(self) -> PeriodicPaymentIndex:
+        return self.matching_index.periodic_payments
+
+    @property
+    def exclusion_filters(self) -> typing.List[BaseVendorExclusionFilter]:
+        if not self._exclusion_filters_bound:
+            for exclusion_filter in self._exclusion_filters:
+                exclusion_filter.use_exclusion_index(self.matching_index.exclusions)
+            self._exclusion_filters_bound = True
+        return self._exclusion_filters
+
+    def prepare(self, descriptions: typing.Iterable[str]):
+        """
+        Prepares the alias matcher for a batch of (upper-cased) descriptions
+        """
+        if self.alias_matcher.requires_prepare:
+            self.alias_matcher.prepare(
+                description
+                for description in descriptions
+                if description not in self._memo
+            )
+
+    @staticmethod
+    def _get_identity(identity_map: dict, instance):
+        if instance is None:
+            return None
+        return identity_map.setdefault(instance.id, instance)
+
+    def get_vendor(self, vendor: models.Vendor) -> models.Vendor:
+        return self._get_identity(self._vendors, vendor)
+
+    def get_asset(self, asset: models.FinancialAsset) -> models.FinancialAsset:
+        return self._get_identity(self._assets, asset)
+
+    def get_matched_vendor(self, vendor_id: uuid.UUID) -> models.Vendor:
+        return self._vendors[vendor_id]
+
+    def get_matched_asset(self, asset_id: uuid.UUID) -> models.FinancialAsset:
+        return self._assets[asset_id]
+
+    # TODO: Remove once astroid is upgraded past v2.4.2 (and pylint is upgraded too)
+    # pylint:disable=unsubscriptable-object
+    def find_vendor_match(
+        self, description: str, occurrences: int = 1
+    ) -> typing.Optional[VendorMatch]:
+        """
+        Returns the vendor match for an (upper-cased) description if one exists
+
+        :param occurrences: number of transactions with the description (all but
+            the first one are memo hits)
+        """
+        try:
+            vendor_match = self._memo[description]
+        except KeyError:
+            pass
+        else:
+            self.memo_hits += occurrences
+            self._memo.move_to_end(description)
+            return vendor_match
+
+        self.memo_misses += 1
+        self.memo_hits += occurrences - 1
+        vendor_match = self._get_match_identity(self.alias_matcher.find(description))
+
+        self._memo[description] = vendor_match
+        if len(self._memo) > self._memo_size:
+            self._memo.popitem(last=False)
+        return vendor_match
+
+    def find_periodic_payment_match(
+        self, currency: Currency, amount: int
+    ) -> typing.Optional[VendorMatch]:
+        """
+        Returns the vendor match for a periodic payment if one exists
+        """
+        return self._get_match_identity(self.periodic_payments.find(currency, amount))
+
+    def _get_match_identity(
+        self, vendor_match: typing.Optional[VendorMatch]
+    ) -> typing.Optional[VendorMatch]:
+        if not vendor_match:
+            return None
+        return VendorMatch(
+            vendor=self.get_vendor(vendor_match.vendor),
+            asset=self.get_asset(vendor_match.asset),
+            expense_type=vendor_match.expense_type,
+        )
+
+    # pylint:enable=unsubscriptable-object
+
+    def log_statistics(self, logger: logging.Logger = None):
+        logger = logger or LOGGER
+        logger.info(
+            "Vendor match memo: %d hits, %d misses (%.1f%% hit rate), "
+            "%d vendors, %d assets",
+            self.memo_hits,
+            self.memo_misses,
+            memo_hit_rate(self.memo_hits, self.memo_misses),
+            len(self._vendors),
+            len(self._assets),
+        )
 
 
 class Itemizer:
-    def __init__(self, filename: str):
+    def __init__(
+        self,
+        filename: str,
+        session: ItemizationSession = None,
+        writer: BaseTransactionWriter = None,
+        batch_backend: BaseBatchBackend = None,
+    ):
         # TODO rename to "_pattern_mismatches"
         self._failures = 0
         self.filename = filename
-        self.exclusion_filters = load_filters_from_modules(
-            settings.EXCLUSION_FILTER_MODULES
-        )
+        self.session = session or ItemizationSession()
+        self.writer = writer or TransactionWriter()
+        self.fingerprinter = TransactionFingerprinter()
+        self._batch_backend = batch_backend
+
+    @property
+    def batch_backend(self) -> BaseBatchBackend:
+        # only required by columnar batches
+        if self._batch_backend is None:
+            self._batch_backend = make_batch_backend()
+        return self._batch_backend
+
+    @property
+    def exclusion_filters(self):
+        return self.session.exclusion_filters
 
     def _is_excluded(self, transaction: RawTransaction) -> bool:
         return any(f.is_exclusion(transaction) for f in self.exclusion_filters)
 
-    @staticmethod
-    def _is_periodic_payment(transaction: RawTransaction):
-        return (
-            transaction.payment_method.allow_periodic_payments
-            and transaction.misc.get("transaction_code") in ["CD", "IB"]
-            and transaction.currency == Currency.CAD
-        )
-
     # TODO: Remove once astroid is upgraded past v2.4.2 (and pylint is upgraded too)
     # pylint:disable=unsubscriptable-object
     def _find_vendor(self, transaction: RawTransaction) -> typing.Optional[VendorMatch]:
-        amount = transaction.amount
-        if self._is_periodic_payment(transaction):
-            # TODO determine how to handle regular payments with the same amount and
-            # currency
-            try:
-                periodic_payment = models.PeriodicPayment.objects.get(
-                    currency=transaction.currency, amount=amount
-                )
-            except django_exc.ObjectDoesNotExist:
-                self._failures += 1
-                LOGGER.warning(
-                    "Pattern not found for amount: %.2f", cents_to_dollars(amount)
-                )
-                return None
-            vendor = periodic_payment.vendor
-            return VendorMatch(
-                vendor=periodic_payment.vendor,
-                asset=vendor.default_asset if vendor else None,
-                expense_type=periodic_payment.vendor.default_expense_type,
+        return self._find_vendor_match(
+            is_periodic_payment(transaction),
+            transaction.currency,
+            transaction.amount,
+            transaction.description,
+        )
+
+    def _find_vendor_match(
+        self,
+        is_periodic: bool,
+        currency: Currency,
+        amount: int,
+        pattern: str,
+        is_periodic_amount: bool = True,
+        occurrences: int = 1,
+    ) -> typing.Optional[VendorMatch]:
+        """
+        :param is_periodic_amount: False if known not to be the amount of any
+            periodic payment
+        :param occurrences: number of (identical) transactions matched at once
+        """
+        if is_periodic:
+            vendor_match = (
+                self.session.find_periodic_payment_match(currency, amount)
+                if is_periodic_amount
+                else None
             )
+            if not vendor_match:
+                self._failures += occurrences
+                for _ in range(occurrences):
+                    LOGGER.warning(
+                        "Pattern not found for amount: %s", cents_to_dollars(amount)
+                    )
+                return None
+            return vendor_match
 
         # locate the vendor by alias
-        pattern = transaction.description
-        q_pattern = pattern.upper()
-        q_ops = AliasMatchOperation
-        try:
-            vendor_alias = models.VendorAliasPattern.objects.get(
-                Q(match_operation=q_ops.EQUAL, pattern=q_pattern)
-                | Q(match_operation=q_ops.LIKE, pattern__is_alias_match=q_pattern)
-            )
-        except django_exc.ObjectDoesNotExist:
-            self._failures += 1
-            LOGGER.warning("Pattern not found in %s: %s", self.filename, pattern)
+        vendor_match = self.session.find_vendor_match(pattern.upper(), occurrences)
+        if not vendor_match:
+            self._failures += occurrences
+            for _ in range(occurrences):
+                LOGGER.warning("Pattern not found in %s: %s", self.filename, pattern)
             return None
 
-        # prioritize vendor alias's expense type over the vendor's expense type
-        vendor = vendor_alias.vendor
-        return VendorMatch(
-            vendor=vendor,
-            asset=vendor_alias.default_asset or vendor.default_asset,
-            expense_type=vendor_alias.default_expense_type
-            or vendor.default_expense_type,
-        )
+        return vendor_match
 
     # pylint:enable=unsubscriptable-object
 
@@ -105,46 +391,277 @@ class Itemizer:
         """
         Itemizes an iterable of transactions
         """
+        if self.session.alias_matcher.requires_prepare:
+            raw_transactions = list(raw_transactions)
+            self.session.prepare(
+                raw_transaction.description.upper()
+                for raw_transaction in raw_transactions
+            )
+
         for raw_transaction in raw_transactions:
-            if self._is_excluded(raw_transaction):
-                LOGGER.info(
-                    "Skipping transaction: %s %d",
-                    raw_transaction.description,
-                    raw_transaction.amount,
+            itemized_rows = self.itemize_transaction(raw_transaction)
+            if itemized_rows:
+                self.writer.add(*itemized_rows)
+
+        self.writer.flush()
+
+    def process_batches(self, batches: typing.Iterable[TransactionBatch]):
+        """
+        Itemizes an iterable of columnar batches of transactions
+        """
+        for batch in batches:
+            if self.session.alias_matcher.requires_prepare:
+                self.session.prepare(
+                    {description.upper() for description in set(batch.descriptions)}
                 )
+            for itemized_rows in self.itemize_batch(batch):
+                if itemized_rows:
+                    self.writer.add(*itemized_rows)
+
+        self.writer.flush()
+
+    # TODO: Remove once astroid is upgraded past v2.4.2 (and pylint is upgraded too)
+    # pylint:disable=unsubscriptable-object
+    def itemize_transaction(
+        self, raw_transaction: RawTransaction
+    ) -> typing.Optional[ItemizedRows]:
+        """
+        Returns the receipt (and any tax adjustment) for a transaction
+
+        :return: None if the transaction is excluded
+        """
+        # excluded transactions are counted too so that occurrences are stable
+        fingerprint = self.fingerprinter.fingerprint(raw_transaction)
+        if self._is_excluded(raw_transaction):
+            self._log_exclusion(raw_transaction.description, raw_transaction.amount)
+            return None
+
+        vendor_match = self._find_vendor(raw_transaction)
+        total_amount = raw_transaction.amount
+        fixed_amount = _get_fixed_amount(vendor_match)
+        if fixed_amount:
+            total_amount = fixed_amount
+            self._log_fixed_amount(vendor_match.vendor)
+        receipt = self._make_receipt(
+            fingerprint,
+            vendor_match,
+            raw_transaction.transaction_date,
+            raw_transaction.payment_method,
+            total_amount,
+            raw_transaction.currency,
+            raw_transaction.description,
+        )
+
+        # add a tax adjustment if required
+        tax_adjustment = None
+        tax_type = _get_tax_adjustment_type(vendor_match)
+        if tax_type:
+            tax_adjustment = self._make_tax_adjustment(
+                receipt,
+                tax_type,
+                compute_tax_adjustment_amount(receipt.total_amount, tax_type),
+            )
+        return receipt, tax_adjustment
+
+    # pylint: disable=too-many-locals
+    def itemize_batch(
+        self, batch: TransactionBatch
+    ) -> typing.List[typing.Optional[ItemizedRows]]:
+        """
+        Returns the receipts (and any tax adjustments) for a batch of transactions
+
+        The exclusion checks, fixed amounts and taxes are computed for the whole
+        batch (by the batch backend).
+
+        :return: itemized rows of every transaction (None if excluded)
+        """
+        backend = self.batch_backend
+        payment_method = batch.payment_method
+        currency = batch.currency
+        transaction_dates = batch.transaction_dates()
+        exclusion_mask = self._get_exclusion_mask(batch)
+        fingerprints = self.fingerprinter.fingerprint_batch(batch)
+        vendor_matches = self._match_batch(batch, exclusion_mask)
+
+        fixed_amounts = [
+            _get_fixed_amount(vendor_match) for vendor_match in vendor_matches
+        ]
+        for vendor_match, fixed_amount in zip(vendor_matches, fixed_amounts):
+            if fixed_amount:
+                self._log_fixed_amount(vendor_match.vendor)
+        total_amounts = backend.override_amounts(batch.amounts, fixed_amounts)
+
+        receipts = []
+        # receipts which require tax adjustments (by tax type)
+        taxed_receipts = collections.defaultdict(list)
+        rows = zip(
+            exclusion_mask,
+            fingerprints,
+            vendor_matches,
+            transaction_dates,
+            total_amounts,
+            batch.descriptions,
+        )
+        for (
+            is_excluded,
+            fingerprint,
+            vendor_match,
+            transaction_date,
+            total_amount,
+            description,
+        ) in rows:
+            if is_excluded:
+                receipts.append(None)
                 continue
+            receipt = self._make_receipt(
+                fingerprint,
+                vendor_match,
+                transaction_date,
+                payment_method,
+                total_amount,
+                currency,
+                description,
+            )
+            tax_type = _get_tax_adjustment_type(vendor_match)
+            if tax_type:
+                taxed_receipts[tax_type].append(receipt)
+            receipts.append(receipt)
 
-            # attempt to match the vendor
-            total_amount = raw_transaction.amount
-            vendor_match = self._find_vendor(raw_transaction)
-            if vendor_match:
-                vendor = vendor_match.vendor
-                asset = vendor_match.asset
-                if vendor.fixed_amount:
-                    total_amount = vendor.fixed_amount
-                    LOGGER.info(
-                        "Using fixed amount %d for vendor %s",
-                        vendor.fixed_amount,
-                        vendor.name,
-                    )
+        tax_adjustments = {}
+        for tax_type, tax_receipts in taxed_receipts.items():
+            tax_amounts = backend.tax_adjustment_amounts(
+                [receipt.total_amount for receipt in tax_receipts], tax_type
+            )
+            for receipt, tax_amount in zip(tax_receipts, tax_amounts):
+                tax_adjustments[receipt.id] = self._make_tax_adjustment(
+                    receipt, tax_type, tax_amount
+                )
+
+        return [
+            (receipt, tax_adjustments.get(receipt.id)) if receipt else None
+            for receipt in receipts
+        ]
+
+    def _match_batch(
+        self, batch: TransactionBatch, exclusion_mask: typing.List[bool]
+    ) -> typing.List[typing.Optional[VendorMatch]]:
+        """
+        Matches the vendors of all transactions of a batch which are not excluded
+
+        Transactions are grouped by description (or by amount if periodic
+        payments) so that each group is matched once.
+        """
+        currency = batch.currency
+        if allows_periodic_payments(batch.payment_method, currency):
+            periodic_mask = [
+                transaction_code in PERIODIC_PAYMENT_TRANSACTION_CODES
+                for transaction_code in batch.get_column("transaction_code")
+            ]
+            periodic_amount_mask = self.batch_backend.isin(
+                batch.amounts, self.session.periodic_payments.amounts(currency)
+            )
+        else:
+            periodic_mask = periodic_amount_mask = itertools.repeat(False)
+
+        # row indexes by description or by (periodic) amount
+        description_rows = collections.defaultdict(list)
+        periodic_rows = collections.defaultdict(list)
+        rows = zip(
+            batch.amounts,
+            batch.descriptions,
+            exclusion_mask,
+            periodic_mask,
+            periodic_amount_mask,
+        )
+        for index, row in enumerate(rows):
+            amount, description, is_excluded, is_periodic, is_periodic_amount = row
+            if is_excluded:
+                self._log_exclusion(description, amount)
+            elif is_periodic:
+                periodic_rows[(amount, bool(is_periodic_amount))].append(index)
             else:
-                vendor = None
-                asset = None
-
-            transaction = models.Transaction.objects.create(
-                vendor=vendor,
-                asset=asset,
-                transaction_date=raw_transaction.transaction_date,
-                transaction_type=vendor_match.expense_type if vendor_match else None,
-                payment_method=raw_transaction.payment_method,
-                total_amount=total_amount,
-                currency=raw_transaction.currency,
-                description=vendor.name if vendor else raw_transaction.description,
+                description_rows[description].append(index)
+
+        vendor_matches = [None] * len(batch)
+        for (amount, is_periodic_amount), indexes in periodic_rows.items():
+            vendor_match = self._find_vendor_match(
+                True, currency, amount, None, is_periodic_amount, len(indexes)
+            )
+            for index in indexes:
+                vendor_matches[index] = vendor_match
+        for description, indexes in description_rows.items():
+            vendor_match = self._find_vendor_match(
+                False, currency, None, description, occurrences=len(indexes)
             )
+            for index in indexes:
+                vendor_matches[index] = vendor_match
+        return vendor_matches
+
+    # pylint: enable=too-many-locals
+
+    def _get_exclusion_mask(self, batch: TransactionBatch) -> typing.List[bool]:
+        excluded = [False] * len(batch)
+        for exclusion_filter in self.exclusion_filters:
+            excluded = [
+                is_excluded or is_filter_excluded
+                for is_excluded, is_filter_excluded in zip(
+                    excluded, exclusion_filter.exclusion_mask(batch, self.batch_backend)
+                )
+            ]
+        return excluded
+
+    @staticmethod
+    def _log_exclusion(description: str, amount: int):
+        LOGGER.info("Skipping transaction: %s %d", description, amount)
+
+    @staticmethod
+    def _log_fixed_amount(vendor: models.Vendor):
+        LOGGER.info(
+            "Using fixed amount %d for vendor %s", vendor.fixed_amount, vendor.name,
+        )
+
+    # pylint:disable=too-many-arguments
+    @staticmethod
+    def _make_receipt(
+        fingerprint: str,
+        vendor_match: typing.Optional[VendorMatch],
+        transaction_date: datetime.date,
+        payment_method: models.PaymentMethod,
+        total_amount: int,
+        currency: Currency,
+        description: str,
+    ) -> ReceiptRow:
+        if vendor_match:
+            vendor = vendor_match.vendor
+            asset = vendor_match.asset
+        else:
+            vendor = None
+            asset = None
+
+        return ReceiptRow(
+            id=uuid.uuid4(),
+            vendor_id=vendor.id if vendor else None,
+            asset_id=asset.id if asset else None,
+            transaction_type=vendor_match.expense_type if vendor_match else None,
+            transaction_date=transaction_date,
+            payment_method_id=payment_method.id,
+            total_amount=total_amount,
+            currency=currency,
+            description=vendor.name if vendor else description,
+            fingerprint=fingerprint,
+        )
 
-            # add a tax adjustment if required
-            if vendor_match and vendor_match.vendor.tax_adjustment_type:
-                add_tax_adjustment(transaction)
+    # pylint:enable=too-many-arguments
+
+    @staticmethod
+    def _make_tax_adjustment(
+        receipt: ReceiptRow, tax_type: TaxType, amount: int
+    ) -> TaxAdjustmentRow:
+        return TaxAdjustmentRow(
+            id=uuid.uuid4(), receipt_id=receipt.id, tax_type=tax_type, amount=amount,
+        )
+
+    # pylint:enable=unsubscriptable-object
 
     @property
     def failures(self) -> int:
@@ -0,0 +1,215 @@
+"""
+Ledger of imported transaction files
+
+Files are recognized by their content (SHA-256), so a file which was already
+imported is skipped even if it was renamed or copied. Unchanged files (same path,
+size and modification time) are recognized without reading them at all, and
+files are only hashed up front if they may be copies of another file (i.e. have
+the same size). Otherwise their digest is computed while they are parsed.
+Compressed files are hashed as they are stored, while the members of zip archives
+are hashed by their (uncompressed) content.
+"""
+import collections
+import dataclasses
+import datetime
+import hashlib
+import logging
+import os
+import typing
+
+from django.utils import timezone
+
+from taxes.receipts.models import ImportedFile, PaymentMethod
+from taxes.receipts.util.compression import (
+    get_archive_member_size,
+    make_archive_member_name,
+    open_stored_file,
+    split_archive_member,
+)
+
+
+LOGGER = logging.getLogger(__name__)
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+_EPOCH = datetime.datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def hash_file(path: str, chunk_size: int = HASH_CHUNK_SIZE) -> str:
+    """
+    Returns the SHA-256 (hex) digest of a file (or archive member) as it is stored,
+    reading it in chunks
+    """
+    digest = hashlib.sha256()
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    with open_stored_file(path) as hashed_file:
+        while True:
+            size = hashed_file.readinto(buffer)
+            if not size:
+                break
+            digest.update(view[:size])
+    return digest.hexdigest()
+
+
+@dataclasses.dataclass
+class FileSignature:
+    path: str
+    size: int
+    modified_at: datetime.datetime
+    sha256: typing.Optional[str] = None
+
+    @classmethod
+    def from_path(cls, filename: str) -> "FileSignature":
+        path, member = split_archive_member(filename)
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        # truncated to the precision of the database
+        modified_at = _EPOCH + datetime.timedelta(microseconds=stat.st_mtime_ns // 1000)
+        if member is not None:
+            # members are modified along with their archive
+            path = make_archive_member_name(path, member)
+            return cls(path, get_archive_member_size(path), modified_at)
+        return cls(path, stat.st_size, modified_at)
+
+
+class ImportLedger:
+    """
+    Filters out files which were already imported and records new imports
+
+    Files may also be recorded as partially imported (up to a line number), in
+    which case they are resumed rather than skipped.
+    """
+
+    def __init__(self):
+        self.skipped = 0
+        self._signatures = {}
+        self._partial_imports = {}
+
+    @staticmethod
+    def _find_imported(
+        signature: FileSignature, may_be_copy: bool
+    ) -> typing.Optional[ImportedFile]:
+        imported_file = ImportedFile.objects.filter(
+            path=signature.path, size=signature.size, modified_at=signature.modified_at,
+        ).first()
+        if imported_file:
+            signature.sha256 = imported_file.sha256
+            return imported_file
+        if not may_be_copy:
+            return None
+
+        signature.sha256 = hash_file(signature.path)
+        return ImportedFile.objects.filter(sha256=signature.sha256).first()
+
+    def filter_new(self, filenames: typing.List[str]) -> typing.List[str]:
+        """
+        Returns the files which were neither (completely) imported before nor are
+        duplicates of a previous file in the list
+        """
+        signatures = [FileSignature.from_path(filename) for filename in filenames]
+        # copies (of imported files or each other) have the same size
+        sizes = collections.Counter(signature.size for signature in signatures)
+        imported_sizes = set(
+            ImportedFile.objects.filter(size__in=list(sizes)).values_list(
+                "size", flat=True
+            )
+        )
+
+        new_filenames = []
+        new_hashes = set()
+        for filename, signature in zip(filenames, signatures):
+            imported_file = self._find_imported(
+                signature,
+                may_be_copy=sizes[signature.size] > 1
+                or signature.size in imported_sizes,
+            )
+            if imported_file and imported_file.completed:
+                LOGGER.info(
+                    "Skipping already imported file: %s (imported from %s on %s)",
+                    filename,
+                    imported_file.path,
+                    imported_file.imported_at.date(),
+                )
+            elif signature.sha256 and signature.sha256 in new_hashes:
+                LOGGER.info("Skipping duplicate file: %s", filename)
+            else:
+                if imported_file:
+                    LOGGER.info(
+                        "Resuming partially imported file: %s after line %d",
+                        filename,
+                        imported_file.last_line_number,
+                    )
+                    self._partial_imports[filename] = imported_file
+                if signature.sha256:
+                    new_hashes.add(signature.sha256)
+                new_filenames.append(filename)
+                self._signatures[filename] = signature
+                continue
+            self.skipped += 1
+        return new_filenames
+
+    def resume_line_number(self, filename: str) -> int:
+        """
+        Returns the last line of a file (returned by filter_new()) which was
+        already imported (0 if none)
+        """
+        imported_file = self._partial_imports.get(filename)
+        return imported_file.last_line_number if imported_file else 0
+
+    def _save(
+        self,
+        filename: str,
+        payment_method: PaymentMethod,
+        row_count: int,
+        completed: bool,
+        last_line_number: int = 0,
+        sha256: str = None,
+    ):
+        signature = self._signatures[filename]
+        if not signature.sha256:
+            signature.sha256 = sha256 or hash_file(signature.path)
+        imported_file = self._partial_imports.get(filename) or ImportedFile(
+            sha256=signature.sha256
+        )
+        imported_file.path = signature.path
+        imported_file.size = signature.size
+        imported_file.modified_at = signature.modified_at
+        imported_file.payment_method = payment_method
+        imported_file.row_count = row_count
+        imported_file.completed = completed
+        imported_file.last_line_number = last_line_number
+        imported_file.save()
+        self._partial_imports[filename] = imported_file
+
+    def checkpoint(
+        self,
+        filename: str,
+        payment_method: PaymentMethod,
+        row_count: int,
+        last_line_number: int,
+    ):
+        """
+        Records the partial import of a file (returned by filter_new()) up to and
+        including a line
+
+        Hashes the file first unless it was already hashed.
+        """
+        self._save(filename, payment_method, row_count, False, last_line_number)
+
+    def record(
+        self,
+        filename: str,
+        payment_method: PaymentMethod,
+        row_count: int,
+        sha256: str = None,
+    ):
+        """
+        Records the import of a file (returned by filter_new())
+
+        :param sha256: digest computed while parsing the file (see
+            BaseTransactionParser.sha256), otherwise the file is hashed if needed
+        """
+        self._save(filename, payment_method, row_count, True, sha256=sha256)
+        del self._signatures[filename]
+        del self._partial_imports[filename]
@@ -6,7 +6,7 @@ from django.db.models import Min
 
 from taxes.receipts.management.shared import DBTransactionMixin
 from taxes.receipts.util.datetime import parse_iso_datestring
-from taxes.receipts.util.currency import parse_amount
+from taxes.receipts.util.currency import parse_accounting_amount
 from taxes.receipts import models, types
 
 LOGGER = logging.getLogger(__name__)
@@ -29,11 +29,7 @@ class Command(DBTransactionMixin, BaseCommand):
 
     @staticmethod
     def parse_accounting_str_amount(amount_str):
-        amount_str = amount_str.replace(",", "")
-        if amount_str[0] == "(":
-            return -1 * parse_amount(amount_str[1:-1])
-
-        return parse_amount(amount_str)
+        return parse_accounting_amount(amount_str)
 
     def _backfill_hst(self, csv_filename):
         min_receipt_date = models.Transaction.objects.aggregate(
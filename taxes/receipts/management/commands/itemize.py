@@ -3,11 +3,29 @@ import sys
 import typing
 
 from django.core.management.base import BaseCommand
-from django.db import transaction
+from django.db import connection, transaction
 
-from taxes.receipts.management.shared import DBTransactionMixin
+from taxes.receipts.management.shared import DBTransactionMixin, open_output
 from taxes.receipts.parsers_factory import ParserFactory
-from taxes.receipts.itemize import Itemizer
+from taxes.receipts.checkpoint import CheckpointedImport
+from taxes.receipts.itemize import ItemizationSession, Itemizer
+from taxes.receipts.ledger import ImportLedger
+from taxes.receipts.matching import AliasMatcherType
+from taxes.receipts.parallel import ParallelItemizer
+from taxes.receipts.pipeline import ItemizationPipeline
+from taxes.receipts.simulate import (
+    ItemizationSimulator,
+    MatchReportFormat,
+    make_match_report_writer,
+)
+from taxes.receipts.staging import ItemizerType, StagingItemizer
+from taxes.receipts.util.compression import expand_archives
+from taxes.receipts.writers import (
+    DEFAULT_BULK_BATCH_SIZE,
+    BaseTransactionWriter,
+    TransactionWriterType,
+    make_transaction_writer,
+)
 
 LOGGER = logging.getLogger(__name__)
 
@@ -17,6 +35,27 @@ SELECTABLE_LOGGING_LEVELS = {
 }
 
 
+def _log_import_summary(inserted: int, skipped: int, skipped_files: int):
+    LOGGER.info(
+        "Inserted %d receipts, skipped %d already imported transactions "
+        "and %d already imported files",
+        inserted,
+        skipped,
+        skipped_files,
+    )
+
+
+def _record_imports(
+    ledger: ImportLedger,
+    parser_factory: ParserFactory,
+    row_counts: typing.Dict[str, int],
+    digests: typing.Dict[str, str],
+):
+    for filename, row_count in row_counts.items():
+        payment_method = parser_factory.get_parser(filename).payment_method
+        ledger.record(filename, payment_method, row_count, digests.get(filename))
+
+
 class Command(DBTransactionMixin, BaseCommand):
     help = "Parses and itemizes transactions"
 
@@ -25,13 +64,84 @@ class Command(DBTransactionMixin, BaseCommand):
         parser.add_argument(
             "--csv-output", action="store_true", help="CSV only output (include errors)"
         )
+        parser.add_argument(
+            "--itemizer",
+            choices=[e.value for e in ItemizerType],
+            default=ItemizerType.PYTHON.value,
+            help="Itemize row by row or set-based in a staging table (PostgreSQL)",
+        )
+        parser.add_argument(
+            "--writer",
+            choices=[e.value for e in TransactionWriterType],
+            default=TransactionWriterType.INSERT.value,
+            help="How receipts are written (copy requires PostgreSQL)",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=DEFAULT_BULK_BATCH_SIZE,
+            help="Number of receipts to write at once (bulk and copy writers, "
+            "0 inserts each immediately)",
+        )
+        parser.add_argument(
+            "--pipeline",
+            action="store_true",
+            help="Parse and itemize the next transactions while writing receipts "
+            "(python itemizer)",
+        )
+        parser.add_argument(
+            "--jobs",
+            type=int,
+            default=1,
+            help="Number of processes itemizing files in parallel (python itemizer)",
+        )
+        parser.add_argument(
+            "--columnar",
+            action="store_true",
+            help="Itemize transactions in columnar batches (python itemizer)",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            action="store_true",
+            help="Commit after every file and resume partially imported files",
+        )
+        parser.add_argument(
+            "--checkpoint-rows",
+            type=int,
+            help="Also commit every CHECKPOINT_ROWS rows (implies --checkpoint)",
+        )
+        parser.add_argument(
+            "--simulate",
+            action="store_true",
+            help="Report the match of every transaction without writing anything",
+        )
+        parser.add_argument(
+            "--report-format",
+            choices=[e.value for e in MatchReportFormat],
+            default=MatchReportFormat.CSV.value,
+            help="Format of the simulation's match report",
+        )
+        parser.add_argument(
+            "--report-output",
+            help="Filename of the simulation's match report (standard output if "
+            "not specified)",
+        )
         super().add_arguments(parser)
         parser.add_argument("transaction_filenames", nargs="+")
 
     def handle(self, *args, **options):
         dry_run = options["dry_run"]
         log_level = options["log_level"]
-        transaction_filenames = options["transaction_filenames"]
+        # the members of zip archives are imported as separate files
+        transaction_filenames = expand_archives(options["transaction_filenames"])
+        itemizer_type = ItemizerType(options["itemizer"])
+        writer_type = TransactionWriterType(options["writer"])
+        batch_size = options["batch_size"]
+        use_pipeline = options["pipeline"]
+        jobs = options["jobs"]
+        use_columnar = options["columnar"]
+        checkpoint_rows = options["checkpoint_rows"]
+        use_checkpoints = options["checkpoint"] or bool(checkpoint_rows)
 
         if log_level:
             try:
@@ -42,24 +152,147 @@ class Command(DBTransactionMixin, BaseCommand):
                 root_logger = logging.getLogger("taxes.receipts")
                 root_logger.setLevel(level)
 
+        if options["simulate"]:
+            with open_output(options["report_output"]) as report_file:
+                total_failures = ItemizationSimulator(
+                    ParserFactory(),
+                    make_match_report_writer(
+                        MatchReportFormat(options["report_format"]), report_file
+                    ),
+                ).run(transaction_filenames)
+            if total_failures > 0:
+                sys.exit(1)
+            return
+
+        if use_checkpoints and dry_run:
+            LOGGER.info("Checkpoints are disabled in dry runs")
+            use_checkpoints = False
+
         with self.ensure_atomic(dry_run, logger=LOGGER):
-            total_failures = self._import_files(transaction_filenames)
+            total_failures = self._import_files(
+                transaction_filenames,
+                itemizer_type,
+                make_transaction_writer(writer_type, batch_size),
+                use_pipeline,
+                jobs,
+                use_checkpoints,
+                checkpoint_rows,
+                use_columnar,
+            )
             if total_failures > 0:
                 LOGGER.info("Rolling back...")
                 transaction.rollback()
                 sys.exit(1)
 
+    # pylint:disable=too-many-arguments
     @staticmethod
-    def _import_files(transaction_filenames: typing.List[str]):
+    def _import_files(
+        transaction_filenames: typing.List[str],
+        itemizer_type: ItemizerType,
+        writer: BaseTransactionWriter,
+        use_pipeline: bool = False,
+        jobs: int = 1,
+        use_checkpoints: bool = False,
+        checkpoint_rows: int = None,
+        use_columnar: bool = False,
+    ):
         total_failures = 0
         parser_factory = ParserFactory()
+        session = ItemizationSession()
+        ledger = ImportLedger()
+        transaction_filenames = ledger.filter_new(transaction_filenames)
 
+        if itemizer_type == ItemizerType.STAGING and connection.vendor != "postgresql":
+            LOGGER.info("Staging is not supported by %s", connection.vendor)
+            itemizer_type = ItemizerType.PYTHON
+
+        if use_checkpoints:
+            if use_pipeline or jobs > 1:
+                LOGGER.info("Pipeline and jobs are not supported with checkpoints")
+            if use_columnar:
+                LOGGER.info("Columnar batches are not supported with checkpoints")
+            checkpointed_import = CheckpointedImport(
+                parser_factory,
+                ledger,
+                writer,
+                itemizer_type,
+                session=session,
+                checkpoint_rows=checkpoint_rows,
+            )
+            total_failures = checkpointed_import.run(transaction_filenames)
+            session.log_statistics(LOGGER)
+            if itemizer_type == ItemizerType.STAGING:
+                _log_import_summary(
+                    checkpointed_import.staging_inserted,
+                    checkpointed_import.staging_skipped,
+                    ledger.skipped,
+                )
+            else:
+                _log_import_summary(writer.inserted, writer.skipped, ledger.skipped)
+            return total_failures
+        if jobs > 1 and itemizer_type == ItemizerType.PYTHON:
+            if use_columnar:
+                LOGGER.info("Columnar batches are not supported with jobs")
+            # workers always match aliases in memory
+            matching_index = ItemizationSession(
+                alias_matcher_type=AliasMatcherType.MEMORY
+            ).matching_index
+            parallel_itemizer = ParallelItemizer(
+                parser_factory, matching_index, writer, jobs
+            )
+            total_failures = parallel_itemizer.run(transaction_filenames)
+            parallel_itemizer.log_statistics(LOGGER)
+            _record_imports(
+                ledger,
+                parser_factory,
+                parallel_itemizer.row_counts,
+                parallel_itemizer.digests,
+            )
+            _log_import_summary(writer.inserted, writer.skipped, ledger.skipped)
+            return total_failures
+        if use_pipeline and itemizer_type == ItemizerType.PYTHON:
+            if use_columnar:
+                LOGGER.info("Columnar batches are not supported by the pipeline")
+            pipeline = ItemizationPipeline(parser_factory, session, writer)
+            total_failures = pipeline.run(transaction_filenames)
+            session.log_statistics(LOGGER)
+            pipeline.log_statistics(LOGGER)
+            _record_imports(
+                ledger, parser_factory, pipeline.row_counts, pipeline.digests
+            )
+            _log_import_summary(writer.inserted, writer.skipped, ledger.skipped)
+            return total_failures
+        if use_pipeline or jobs > 1:
+            LOGGER.info(
+                "Pipeline and jobs are not supported by the %s itemizer",
+                itemizer_type.value,
+            )
+        if use_columnar and itemizer_type != ItemizerType.PYTHON:
+            LOGGER.info(
+                "Columnar batches are not supported by the %s itemizer",
+                itemizer_type.value,
+            )
+            use_columnar = False
+
+        staging_inserted = staging_skipped = 0
         for tx_filename in transaction_filenames:
             LOGGER.info("Starting to process: %s...", tx_filename)
 
             parser = parser_factory.get_parser(tx_filename)
-            itemizer = Itemizer(tx_filename)
-            itemizer.process_transactions(parser.parse(tx_filename))
+            if itemizer_type == ItemizerType.STAGING:
+                itemizer = StagingItemizer(tx_filename)
+            else:
+                itemizer = Itemizer(tx_filename, session=session, writer=writer)
+            if use_columnar:
+                itemizer.process_batches(parser.parse_batches(tx_filename))
+            else:
+                itemizer.process_transactions(parser.parse(tx_filename))
+            if itemizer_type == ItemizerType.STAGING:
+                staging_inserted += itemizer.inserted
+                staging_skipped += itemizer.skipped
+            ledger.record(
+                tx_filename, parser.payment_method, parser.rows, parser.sha256
+            )
 
             total_failures += parser.failures
             error_summary = (
@@ -70,4 +303,9 @@ class Command(DBTransactionMixin, BaseCommand):
             )
             LOGGER.info("Finished processing: %s, %s", tx_filename, error_summary)
 
+        session.log_statistics(LOGGER)
+        if itemizer_type == ItemizerType.STAGING:
+            _log_import_summary(staging_inserted, staging_skipped, ledger.skipped)
+        else:
+            _log_import_summary(writer.inserted, writer.skipped, ledger.skipped)
         return total_failures
@@ -24,6 +24,15 @@ class ParseDateAction(argparse.Action):
         setattr(namespace, self.dest, date_str)
 
 
+@contextlib.contextmanager
+def open_output(output_filename: str) -> typing.ContextManager[typing.io]:
+    if not output_filename:
+        yield sys.stdout
+    else:
+        with open(output_filename, "w") as output_file:
+            yield output_file
+
+
 class DateRangeMixin:
     def add_arguments(self, parser):  # pylint: disable=no-self-use
         parser.add_argument(
@@ -50,14 +59,7 @@ class DateRangeOutputMixin(DateRangeMixin):
             "output_filename", nargs="?", default=None, help="Output filename"
         )
 
-    @staticmethod
-    @contextlib.contextmanager
-    def open_output(output_filename: str) -> typing.ContextManager[typing.io]:
-        if not output_filename:
-            yield sys.stdout
-        else:
-            with open(output_filename, "w") as output_file:
-                yield output_file
+    open_output = staticmethod(open_output)
 
 
 class DBTransactionMixin:
@@ -0,0 +1,901 @@
+"""
+In-memory indexes for matching transactions to vendors
+"""
+import abc
+import collections
+import datetime
+import enum
+import hashlib
+import io
+import logging
+import os
+import pickle
+import sys
+import tempfile
+import typing
+
+from dataclasses import dataclass
+import django
+from django.db import connection
+
+from taxes.receipts import models
+from taxes.receipts.types import AliasMatchOperation, Currency, TransactionType
+from taxes.receipts.util.flat import FlatArrays, FlatArraysBuilder
+from taxes.receipts.util.like import (
+    AutomatonLikeMatcher,
+    BaseLikeMatcher,
+    FlatLikeMatcher,
+    build_flat_like_matcher,
+)
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+@dataclass
+class VendorMatch:
+    vendor: models.Vendor
+    asset: models.FinancialAsset
+    expense_type: TransactionType
+
+
+class AliasMatch(typing.NamedTuple):
+    pattern: str
+    match_operation: AliasMatchOperation
+    vendor_match: VendorMatch
+
+    def __str__(self):
+        return f'{self.match_operation}("{self.pattern}")'
+
+
+def make_alias_match(alias: models.VendorAliasPattern) -> AliasMatch:
+    # prioritize vendor alias's expense type over the vendor's expense type
+    vendor = alias.vendor
+    return AliasMatch(
+        pattern=alias.pattern,
+        match_operation=alias.match_operation,
+        vendor_match=VendorMatch(
+            vendor=vendor,
+            asset=alias.default_asset or vendor.default_asset,
+            expense_type=alias.default_expense_type or vendor.default_expense_type,
+        ),
+    )
+
+
+class BaseAliasMatcher(metaclass=abc.ABCMeta):
+    """
+    Matches upper-cased transaction descriptions against all vendor alias patterns
+
+    Equivalent to querying:
+
+        VendorAliasPattern.objects.get(
+            Q(match_operation=EQUAL, pattern=description)
+            | Q(match_operation=LIKE, pattern__is_alias_match=description)
+        )
+    """
+
+    # True if all descriptions must be passed to prepare() prior to calling find()
+    requires_prepare = False
+
+    def prepare(self, descriptions: typing.Iterable[str]):
+        """
+        Resolves a batch of (upper-cased) descriptions ahead of calling find()
+        """
+
+    @abc.abstractmethod
+    def find_alias_matches(self, description: str) -> typing.List[AliasMatch]:
+        """
+        Returns all alias patterns matching the (upper-cased) description
+        """
+
+    # TODO: Remove once astroid is upgraded past v2.4.2 (and pylint is upgraded too)
+    # pylint:disable=unsubscriptable-object
+    def find(self, description: str) -> typing.Optional[VendorMatch]:
+        """
+        Returns the vendor match for the (upper-cased) description if one exists
+
+        :raises models.VendorAliasPattern.MultipleObjectsReturned: if the
+            description matches more than one alias pattern
+        """
+        alias_matches = self.find_alias_matches(description)
+        if not alias_matches:
+            return None
+        if len(alias_matches) > 1:
+            raise models.VendorAliasPattern.MultipleObjectsReturned(
+                f"Multiple alias patterns match '{description}': "
+                + ", ".join(str(alias_match) for alias_match in alias_matches)
+            )
+
+        return alias_matches[0].vendor_match
+
+    # pylint:enable=unsubscriptable-object
+
+
+class AliasIndex(BaseAliasMatcher):
+    """
+    Holds all alias patterns in memory so that lookups require no queries
+    """
+
+    def __init__(
+        self,
+        aliases: typing.Iterable[models.VendorAliasPattern],
+        like_matcher_class: typing.Type[BaseLikeMatcher] = AutomatonLikeMatcher,
+    ):
+        self._equal_aliases = {}
+        self._like_aliases = like_matcher_class()
+        self._vendor_matches = {}
+
+        for alias in aliases:
+            if alias.match_operation == AliasMatchOperation.EQUAL:
+                self._equal_aliases[alias.pattern] = self._make_alias_match(alias)
+            elif alias.match_operation == AliasMatchOperation.LIKE:
+                self._like_aliases.add(alias.pattern, self._make_alias_match(alias))
+            else:
+                raise ValueError(f"Unsupported match operation: {alias!r}")
+        self._like_aliases.compile()
+
+    def _make_alias_match(self, alias: models.VendorAliasPattern) -> AliasMatch:
+        alias_match = make_alias_match(alias)
+
+        # share vendor matches (and their instances) between aliases of a vendor
+        vendor_match = alias_match.vendor_match
+        key = (
+            vendor_match.vendor.id,
+            vendor_match.asset.id if vendor_match.asset else None,
+            vendor_match.expense_type,
+        )
+        vendor_match = self._vendor_matches.setdefault(key, vendor_match)
+        return alias_match._replace(vendor_match=vendor_match)
+
+    @classmethod
+    def load(cls, **kwargs) -> "AliasIndex":
+        """
+        Loads all alias patterns (with their vendors and assets) in a single query
+        """
+        return cls(
+            models.VendorAliasPattern.objects.select_related(
+                "vendor", "vendor__default_asset", "default_asset"
+            ),
+            **kwargs,
+        )
+
+    def __len__(self):
+        return len(self._equal_aliases) + len(self._like_aliases)
+
+    def find_alias_matches(self, description: str) -> typing.List[AliasMatch]:
+        alias_matches = []
+        equal_alias_match = self._equal_aliases.get(description)
+        if equal_alias_match:
+            alias_matches.append(equal_alias_match)
+        alias_matches.extend(self._like_aliases.match(description))
+        return alias_matches
+
+    def flatten(self, builder: "FlatMatchingIndexBuilder"):
+        equal_alias_matches = list(self._equal_aliases.values())
+        like_aliases = list(self._like_aliases.items())
+        alias_matches = equal_alias_matches + [
+            alias_match for _, alias_match in like_aliases
+        ]
+
+        arrays = builder.arrays
+        arrays.add_array(
+            "aliases.pattern",
+            "q",
+            (
+                builder.string_index(alias_match.pattern)
+                for alias_match in alias_matches
+            ),
+        )
+        arrays.add_array(
+            "aliases.match_operation",
+            "q",
+            (
+                builder.string_index(alias_match.match_operation)
+                for alias_match in alias_matches
+            ),
+        )
+        arrays.add_array(
+            "aliases.vendor_match",
+            "q",
+            (
+                builder.vendor_match_index(alias_match.vendor_match)
+                for alias_match in alias_matches
+            ),
+        )
+        arrays.add_hash_table(
+            "aliases.equal",
+            {
+                alias_match.pattern.encode(): alias_index
+                for alias_index, alias_match in enumerate(equal_alias_matches)
+            },
+        )
+        build_flat_like_matcher(
+            arrays,
+            "aliases.like",
+            (
+                (pattern, len(equal_alias_matches) + like_index)
+                for like_index, (pattern, _) in enumerate(like_aliases)
+            ),
+        )
+
+
+class AmbiguousPeriodicPaymentError(models.PeriodicPayment.MultipleObjectsReturned):
+    @classmethod
+    def for_amount(
+        cls, amount: int, vendor_names: typing.Iterable[str]
+    ) -> "AmbiguousPeriodicPaymentError":
+        return cls(
+            f"Periodic payments share the same currency and amount ({amount}): "
+            + ", ".join(vendor_names)
+        )
+
+
+def _periodic_payment_key(currency: Currency, amount: int) -> bytes:
+    return f"{Currency(currency).value}\t{amount}".encode()
+
+
+class PeriodicPaymentIndex:
+    """
+    Maps (currency, amount) to the vendor match of the matching periodic payment
+
+    Amounts shared by several periodic payments (in the same currency) are
+    reported when the index is built, but are only an error once a transaction
+    matches them.
+    """
+
+    def __init__(self, periodic_payments: typing.Iterable[models.PeriodicPayment]):
+        self._vendor_matches = {}
+        self._ambiguous_vendor_names = {}
+
+        payments_by_key = collections.defaultdict(list)
+        for periodic_payment in periodic_payments:
+            key = (periodic_payment.currency, periodic_payment.amount)
+            payments_by_key[key].append(periodic_payment)
+
+        for key, key_payments in payments_by_key.items():
+            # TODO determine how to handle regular payments with the same amount
+            # and currency
+            if len(key_payments) > 1:
+                vendor_names = sorted(payment.vendor.name for payment in key_payments)
+                self._ambiguous_vendor_names[key] = vendor_names
+                LOGGER.warning(
+                    "Periodic payments with the same amount %d %s: %s",
+                    key[1],
+                    key[0],
+                    ", ".join(vendor_names),
+                )
+                continue
+
+            vendor = key_payments[0].vendor
+            self._vendor_matches[key] = VendorMatch(
+                vendor=vendor,
+                asset=vendor.default_asset,
+                expense_type=vendor.default_expense_type,
+            )
+
+    @classmethod
+    def load(cls) -> "PeriodicPaymentIndex":
+        """
+        Loads all periodic payments (with their vendors and assets) in a single query
+        """
+        return cls(
+            models.PeriodicPayment.objects.select_related(
+                "vendor", "vendor__default_asset"
+            ).order_by("currency", "amount", "name")
+        )
+
+    def __len__(self):
+        return len(self._vendor_matches)
+
+    # TODO: Remove once astroid is upgraded past v2.4.2 (and pylint is upgraded too)
+    # pylint:disable=unsubscriptable-object
+    def find(self, currency: Currency, amount: int) -> typing.Optional[VendorMatch]:
+        """
+        :raises AmbiguousPeriodicPaymentError: if several periodic payments match
+        """
+        vendor_names = self._ambiguous_vendor_names.get((currency, amount))
+        if vendor_names:
+            raise AmbiguousPeriodicPaymentError.for_amount(amount, vendor_names)
+        return self._vendor_matches.get((currency, amount))
+
+    # pylint:enable=unsubscriptable-object
+
+    def amounts(self, currency: Currency) -> typing.List[int]:
+        """
+        Returns the amounts of all (including ambiguous) periodic payments in a
+        currency
+        """
+        return [
+            amount
+            for keys in (self._vendor_matches, self._ambiguous_vendor_names)
+            for payment_currency, amount in keys
+            if payment_currency == currency
+        ]
+
+    def flatten(self, builder: "FlatMatchingIndexBuilder"):
+        builder.arrays.add_hash_table(
+            "periodic_payments",
+            {
+                _periodic_payment_key(currency, amount): builder.vendor_match_index(
+                    vendor_match
+                )
+                for (currency, amount), vendor_match in self._vendor_matches.items()
+            },
+        )
+        builder.arrays.add_hash_table(
+            "periodic_payments.ambiguous",
+            {
+                _periodic_payment_key(*key): builder.string_index(
+                    "\t".join(vendor_names)
+                )
+                for key, vendor_names in self._ambiguous_vendor_names.items()
+            },
+        )
+
+
+def _dated_amount_key(on_date: datetime.date, amount: int) -> bytes:
+    return f"{on_date.toordinal()}\t{amount}".encode()
+
+
+class ExclusionIndex:
+    """
+    Determines if transactions match any exclusion condition
+
+    Equivalent to the query in filters.ExclusionConditionFilter: a condition
+    applies if the description starts with its (LIKE) prefix on any date or its
+    specific date, or if it has no prefix and matches both date and amount.
+    """
+
+    def __init__(self, conditions: typing.Iterable[models.ExclusionCondition]):
+        self._prefixes = AutomatonLikeMatcher()
+        self._dated_amounts = set()
+
+        for condition in conditions:
+            if condition.prefix is not None:
+                self._prefixes.add(condition.prefix + "%", condition.on_date)
+            elif condition.on_date is not None and condition.amount is not None:
+                self._dated_amounts.add((condition.on_date, condition.amount))
+        self._prefixes.compile()
+
+    @classmethod
+    def load(cls) -> "ExclusionIndex":
+        return cls(models.ExclusionCondition.objects.all())
+
+    def __len__(self):
+        return len(self._prefixes) + len(self._dated_amounts)
+
+    def is_excluded(self, description: str, on_date: datetime.date, amount: int):
+        """
+        Checks an (upper-cased) description, date and amount against all conditions
+        """
+        if (on_date, amount) in self._dated_amounts:
+            return True
+        return self.is_prefix_excluded(description, on_date)
+
+    def is_prefix_excluded(self, description: str, on_date: datetime.date):
+        return any(
+            prefix_date is None or prefix_date == on_date
+            for prefix_date in self._prefixes.match(description)
+        )
+
+    def dated_amounts(self) -> typing.Set[typing.Tuple[int, int]]:
+        """
+        Returns the (date ordinal, amount) of all conditions without a prefix
+        """
+        return {
+            (on_date.toordinal(), amount) for on_date, amount in self._dated_amounts
+        }
+
+    def flatten(self, builder: "FlatMatchingIndexBuilder"):
+        prefixes = list(self._prefixes.items())
+        builder.arrays.add_array(
+            "exclusions.prefix_dates",
+            "q",
+            (on_date.toordinal() if on_date else 0 for _, on_date in prefixes),
+        )
+        build_flat_like_matcher(
+            builder.arrays,
+            "exclusions.prefixes",
+            (
+                (pattern, prefix_index)
+                for prefix_index, (pattern, _) in enumerate(prefixes)
+            ),
+        )
+        builder.arrays.add_hash_table(
+            "exclusions.dated_amounts",
+            {
+                _dated_amount_key(on_date, amount): 0
+                for on_date, amount in self._dated_amounts
+            },
+        )
+
+
+# pattern matching in SQL follows the same semantics as AliasMatchLookup
+MATCHING_ALIAS_WHERE_SQL = """
+    (vendor_alias_pattern.match_operation = %s
+        AND vendor_alias_pattern.pattern = ANY(%s::text[]))
+    OR (vendor_alias_pattern.match_operation = %s
+        AND EXISTS (
+            SELECT 1 FROM unnest(%s::text[]) AS d(description)
+            WHERE d.description LIKE vendor_alias_pattern.pattern
+        ))
+"""
+
+MATCHED_DESCRIPTIONS_SQL = """
+    ARRAY(
+        SELECT d.description FROM unnest(%s::text[]) AS d(description)
+        WHERE CASE
+            WHEN vendor_alias_pattern.match_operation = %s
+                THEN d.description = vendor_alias_pattern.pattern
+            ELSE d.description LIKE vendor_alias_pattern.pattern
+        END
+    )
+"""
+
+
+class SQLAliasMatcher(BaseAliasMatcher):
+    """
+    Resolves batches of descriptions in the database with a single query
+
+    Only aliases matching at least one description of the batch are loaded
+    (with their vendors and assets) along with the descriptions they match.
+    """
+
+    requires_prepare = True
+
+    def __init__(self):
+        self._alias_matches = {}
+        self._alias_matches_by_description = {}
+
+    def prepare(self, descriptions: typing.Iterable[str]):
+        descriptions = sorted(set(descriptions))
+        self._alias_matches_by_description = {
+            description: [] for description in descriptions
+        }
+        if not descriptions:
+            return
+
+        q_ops = AliasMatchOperation
+        aliases = (
+            models.VendorAliasPattern.objects.select_related(
+                "vendor", "vendor__default_asset", "default_asset"
+            )
+            .extra(
+                select={"matched_descriptions": MATCHED_DESCRIPTIONS_SQL},
+                select_params=(descriptions, q_ops.EQUAL.value),
+                where=[MATCHING_ALIAS_WHERE_SQL],
+                params=(
+                    q_ops.EQUAL.value,
+                    descriptions,
+                    q_ops.LIKE.value,
+                    descriptions,
+                ),
+            )
+            .order_by("pattern")
+        )
+        for alias in aliases:
+            # share vendor matches across batches
+            alias_match = self._alias_matches.get(alias.id)
+            if alias_match is None:
+                alias_match = self._alias_matches[alias.id] = make_alias_match(alias)
+            for description in alias.matched_descriptions:
+                self._alias_matches_by_description[description].append(alias_match)
+
+    def find_alias_matches(self, description: str) -> typing.List[AliasMatch]:
+        if description not in self._alias_matches_by_description:
+            # fall back to a single query for descriptions outside of the batch
+            batch = self._alias_matches_by_description
+            self.prepare([description])
+            batch.update(self._alias_matches_by_description)
+            self._alias_matches_by_description = batch
+
+        return self._alias_matches_by_description[description]
+
+
+@enum.unique
+class AliasMatcherType(enum.Enum):
+    MEMORY = "memory"
+    SQL = "sql"
+
+
+MATCHING_INDEX_FORMAT_VERSION = 2
+
+# tables whose contents determine the matching index
+MATCHING_INDEX_TABLES = [
+    models.FinancialAsset._meta.db_table,
+    models.Vendor._meta.db_table,
+    models.VendorAliasPattern._meta.db_table,
+    models.ExclusionCondition._meta.db_table,
+    models.PeriodicPayment._meta.db_table,
+]
+
+# the transaction id of a row (xmin) changes whenever it is inserted or updated,
+# so the row count (for deletions) and the latest xmin change along with the
+# table's contents without reading the rows themselves
+FINGERPRINT_TABLE_SQL = """
+    SELECT %s, COUNT(*), MAX(t.xmin::text::bigint)
+    FROM {table} t
+"""
+
+
+def matching_data_fingerprint() -> typing.Optional[str]:
+    """
+    Returns a cheap fingerprint of all data used to build the matching index
+
+    Only supported on PostgreSQL (otherwise returns None). Changes made within the
+    current (uncommitted) transaction may not change the fingerprint.
+    """
+    if connection.vendor != "postgresql":
+        return None
+
+    sql = " UNION ALL ".join(
+        FINGERPRINT_TABLE_SQL.format(table=connection.ops.quote_name(table))
+        for table in MATCHING_INDEX_TABLES
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, MATCHING_INDEX_TABLES)
+        table_fingerprints = cursor.fetchall()
+
+    return hashlib.sha256(repr(sorted(table_fingerprints)).encode()).hexdigest()
+
+
+# model instances held by the matching index, pickled compactly by their values
+SNAPSHOT_MODELS = (models.FinancialAsset, models.Vendor)
+
+
+def _load_snapshot_model(model, db, values, related_objects):
+    field_names = [field.attname for field in model._meta.concrete_fields]
+    instance = model.from_db(db, field_names, values)
+    for field_name, related_object in related_objects:
+        model._meta.get_field(field_name).set_cached_value(instance, related_object)
+    return instance
+
+
+class SnapshotPickler(pickle.Pickler):
+    """
+    Pickles model instances as their field values (and cached relations) only
+
+    Unpickling rebuilds each instance once like a queryset would, which is much
+    faster than restoring the full state of every instance.
+    """
+
+    def reducer_override(self, obj):
+        # pylint: disable=protected-access
+        if type(obj) not in SNAPSHOT_MODELS:
+            return NotImplemented
+
+        concrete_fields = obj._meta.concrete_fields
+        values = tuple(getattr(obj, field.attname) for field in concrete_fields)
+        related_objects = tuple(
+            (field.name, field.get_cached_value(obj))
+            for field in concrete_fields
+            if field.is_relation and field.is_cached(obj)
+        )
+        return _load_snapshot_model, (type(obj), obj._state.db, values, related_objects)
+
+
+class MatchingIndex:
+    """
+    All compiled in-memory indexes used to itemize transactions
+
+    Aliases are omitted (None) if they are matched in the database instead.
+    """
+
+    def __init__(
+        self,
+        aliases: typing.Optional[AliasIndex],
+        periodic_payments: PeriodicPaymentIndex,
+        exclusions: ExclusionIndex,
+    ):
+        self.aliases = aliases
+        self.periodic_payments = periodic_payments
+        self.exclusions = exclusions
+
+    @classmethod
+    def load(cls, with_aliases: bool = True) -> "MatchingIndex":
+        return cls(
+            AliasIndex.load() if with_aliases else None,
+            PeriodicPaymentIndex.load(),
+            ExclusionIndex.load(),
+        )
+
+    @staticmethod
+    def _snapshot_header(fingerprint: str, with_aliases: bool) -> dict:
+        return {
+            "format_version": MATCHING_INDEX_FORMAT_VERSION,
+            "python_version": sys.version_info[:2],
+            "django_version": django.get_version(),
+            "fingerprint": fingerprint,
+            "with_aliases": with_aliases,
+        }
+
+    @classmethod
+    def load_snapshot(
+        cls, snapshot_path: str, with_aliases: bool = True
+    ) -> "MatchingIndex":
+        """
+        Loads the index from a snapshot file, rebuilding the file if it is stale
+
+        The snapshot is only trusted if it was written by the same code and data
+        versions, otherwise the index is rebuilt from the database and saved.
+        """
+        fingerprint = matching_data_fingerprint()
+        if not fingerprint:
+            return cls.load(with_aliases=with_aliases)
+
+        expected_header = cls._snapshot_header(fingerprint, with_aliases)
+        try:
+            with open(snapshot_path, "rb") as snapshot_file:
+                # NOTE: snapshots are only ever written locally by save_snapshot()
+                if pickle.load(snapshot_file) == expected_header:
+                    LOGGER.debug("Loading matching index from %s", snapshot_path)
+                    return pickle.load(snapshot_file)
+        except FileNotFoundError:
+            pass
+        except Exception:  # pylint: disable=broad-except
+            # e.g. truncated files or model instances pickled before a schema change
+            LOGGER.warning(
+                "Ignoring unreadable matching index: %s", snapshot_path, exc_info=True
+            )
+
+        LOGGER.info("Rebuilding matching index: %s", snapshot_path)
+        matching_index = cls.load(with_aliases=with_aliases)
+        matching_index.save_snapshot(snapshot_path, expected_header)
+        return matching_index
+
+    def save_snapshot(self, snapshot_path: str, header: dict):
+        snapshot_dir = os.path.dirname(os.path.abspath(snapshot_path))
+        os.makedirs(snapshot_dir, exist_ok=True)
+
+        # write to a temporary file first so that readers never see partial files
+        with tempfile.NamedTemporaryFile(
+            "wb", dir=snapshot_dir, suffix=".tmp", delete=False
+        ) as snapshot_file:
+            pickle.dump(header, snapshot_file, protocol=pickle.HIGHEST_PROTOCOL)
+            SnapshotPickler(snapshot_file, protocol=pickle.HIGHEST_PROTOCOL).dump(self)
+        os.replace(snapshot_file.name, snapshot_path)
+
+    def save_flat(self, path: str):
+        """
+        Saves the index in the flat layout read by FlatMatchingIndex
+        """
+        builder = FlatMatchingIndexBuilder()
+        if self.aliases is not None:
+            self.aliases.flatten(builder)
+        self.periodic_payments.flatten(builder)
+        self.exclusions.flatten(builder)
+        builder.save(path)
+
+
+class FlatMatchingIndexBuilder:
+    """
+    Lays out a matching index in flat arrays
+
+    Strings, model instances and vendor matches are stored once and referenced
+    by their index in all other arrays.
+    """
+
+    def __init__(self):
+        self.arrays = FlatArraysBuilder()
+        self._strings = {}
+        self._objects = {}
+        self._vendor_matches = {}
+
+    def string_index(self, value: str) -> int:
+        return self._strings.setdefault(value, len(self._strings))
+
+    def _object_index(self, instance) -> int:
+        if instance is None:
+            return -1
+        key = (type(instance), instance.pk)
+        if key not in self._objects:
+            buffer = io.BytesIO()
+            SnapshotPickler(buffer, protocol=pickle.HIGHEST_PROTOCOL).dump(instance)
+            self._objects[key] = (len(self._objects), buffer.getvalue())
+        return self._objects[key][0]
+
+    def vendor_match_index(self, vendor_match: VendorMatch) -> int:
+        key = (
+            self._object_index(vendor_match.vendor),
+            self._object_index(vendor_match.asset),
+            self.string_index(vendor_match.expense_type)
+            if vendor_match.expense_type
+            else -1,
+        )
+        return self._vendor_matches.setdefault(key, len(self._vendor_matches))
+
+    def save(self, path: str):
+        self.arrays.add_blobs("strings", (value.encode() for value in self._strings))
+        self.arrays.add_blobs("objects", (blob for _, blob in self._objects.values()))
+        for field_index, field_name in enumerate(["vendor", "asset", "expense_type"]):
+            self.arrays.add_array(
+                f"vendor_matches.{field_name}",
+                "q",
+                (key[field_index] for key in self._vendor_matches),
+            )
+        self.arrays.save(path)
+
+
+class FlatAliasIndex(BaseAliasMatcher):
+    """
+    AliasIndex read from flat arrays
+    """
+
+    def __init__(self, index: "FlatMatchingIndex"):
+        self._index = index
+        self._patterns = index.arrays["aliases.pattern"]
+        self._match_operations = index.arrays["aliases.match_operation"]
+        self._vendor_matches = index.arrays["aliases.vendor_match"]
+        self._like_aliases = FlatLikeMatcher(index.arrays, "aliases.like")
+        self._alias_matches = {}
+
+    def __len__(self):
+        return len(self._patterns)
+
+    def _get_alias_match(self, alias_index: int) -> AliasMatch:
+        alias_match = self._alias_matches.get(alias_index)
+        if alias_match is None:
+            alias_match = AliasMatch(
+                pattern=self._index.string(self._patterns[alias_index]),
+                match_operation=AliasMatchOperation(
+                    self._index.string(self._match_operations[alias_index])
+                ),
+                vendor_match=self._index.vendor_match(
+                    self._vendor_matches[alias_index]
+                ),
+            )
+            self._alias_matches[alias_index] = alias_match
+        return alias_match
+
+    def find_alias_matches(self, description: str) -> typing.List[AliasMatch]:
+        alias_indices = []
+        equal_alias_index = self._index.arrays.hash_lookup(
+            "aliases.equal", description.encode()
+        )
+        if equal_alias_index is not None:
+            alias_indices.append(equal_alias_index)
+        alias_indices.extend(self._like_aliases.match(description))
+        return [self._get_alias_match(alias_index) for alias_index in alias_indices]
+
+
+def _hash_table_keys(arrays: FlatArrays, name: str) -> typing.Iterator[bytes]:
+    keys_name = f"{name}.keys"
+    return (
+        bytes(arrays.blob(keys_name, key_index))
+        for key_index in range(arrays.num_blobs(keys_name))
+    )
+
+
+class FlatPeriodicPaymentIndex:
+    """
+    PeriodicPaymentIndex read from flat arrays
+    """
+
+    def __init__(self, index: "FlatMatchingIndex"):
+        self._index = index
+
+    def __len__(self):
+        return len(self._index.arrays["periodic_payments.values"])
+
+    # TODO: Remove once astroid is upgraded past v2.4.2 (and pylint is upgraded too)
+    # pylint:disable=unsubscriptable-object
+    def find(self, currency: Currency, amount: int) -> typing.Optional[VendorMatch]:
+        key = _periodic_payment_key(currency, amount)
+        vendor_names_index = self._index.arrays.hash_lookup(
+            "periodic_payments.ambiguous", key
+        )
+        if vendor_names_index is not None:
+            raise AmbiguousPeriodicPaymentError.for_amount(
+                amount, self._index.string(vendor_names_index).split("\t")
+            )
+
+        vendor_match_index = self._index.arrays.hash_lookup("periodic_payments", key)
+        if vendor_match_index is None:
+            return None
+        return self._index.vendor_match(vendor_match_index)
+
+    # pylint:enable=unsubscriptable-object
+
+    def amounts(self, currency: Currency) -> typing.List[int]:
+        prefix = f"{Currency(currency).value}\t".encode()
+        prefix_length = len(prefix)
+        return [
+            int(key[prefix_length:])
+            for name in ("periodic_payments", "periodic_payments.ambiguous")
+            for key in _hash_table_keys(self._index.arrays, name)
+            if key.startswith(prefix)
+        ]
+
+
+class FlatExclusionIndex:
+    """
+    ExclusionIndex read from flat arrays
+    """
+
+    def __init__(self, index: "FlatMatchingIndex"):
+        self._index = index
+        self._prefix_dates = index.arrays["exclusions.prefix_dates"]
+        self._prefixes = FlatLikeMatcher(index.arrays, "exclusions.prefixes")
+
+    def __len__(self):
+        return len(self._prefix_dates) + len(
+            self._index.arrays["exclusions.dated_amounts.values"]
+        )
+
+    def is_excluded(self, description: str, on_date: datetime.date, amount: int):
+        if (
+            self._index.arrays.hash_lookup(
+                "exclusions.dated_amounts", _dated_amount_key(on_date, amount)
+            )
+            is not None
+        ):
+            return True
+        return self.is_prefix_excluded(description, on_date)
+
+    def is_prefix_excluded(self, description: str, on_date: datetime.date):
+        ordinal = on_date.toordinal()
+        return any(
+            self._prefix_dates[prefix_index] in (0, ordinal)
+            for prefix_index in self._prefixes.match(description)
+        )
+
+    def dated_amounts(self) -> typing.Set[typing.Tuple[int, int]]:
+        return {
+            tuple(int(value) for value in key.split(b"\t"))
+            for key in _hash_table_keys(self._index.arrays, "exclusions.dated_amounts")
+        }
+
+
+class FlatMatchingIndex:
+    """
+    Read-only MatchingIndex addressed in flat arrays (e.g. in a memory-mapped file)
+
+    Nothing is loaded up front: strings, model instances and vendor matches are
+    only decoded (and cached) once they are matched, so processes mapping the
+    same file share its memory.
+    """
+
+    def __init__(self, arrays: FlatArrays):
+        self.arrays = arrays
+        self._objects = {}
+        self._vendor_matches = {}
+
+        self.aliases = FlatAliasIndex(self) if "aliases.pattern" in arrays else None
+        self.periodic_payments = FlatPeriodicPaymentIndex(self)
+        self.exclusions = FlatExclusionIndex(self)
+
+    @classmethod
+    def open(cls, path: str) -> "FlatMatchingIndex":
+        return cls(FlatArrays.open(path))
+
+    def string(self, string_index: int) -> str:
+        return self.arrays.string("strings", string_index)
+
+    def _get_object(self, object_index: int):
+        if object_index < 0:
+            return None
+        instance = self._objects.get(object_index)
+        if instance is None:
+            instance = pickle.loads(self.arrays.blob("objects", object_index))
+            self._objects[object_index] = instance
+        return instance
+
+    def vendor_match(self, vendor_match_index: int) -> VendorMatch:
+        vendor_match = self._vendor_matches.get(vendor_match_index)
+        if vendor_match is None:
+            expense_type_index = self.arrays["vendor_matches.expense_type"][
+                vendor_match_index
+            ]
+            vendor_match = VendorMatch(
+                vendor=self._get_object(
+                    self.arrays["vendor_matches.vendor"][vendor_match_index]
+                ),
+                asset=self._get_object(
+                    self.arrays["vendor_matches.asset"][vendor_match_index]
+                ),
+                expense_type=TransactionType(self.string(expense_type_index))
+                if expense_type_index >= 0
+                else None,
+            )
+            self._vendor_matches[vendor_match_index] = vendor_match
+        return vendor_match
@@ -0,0 +1,29 @@
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('receipts', '0008_receipt_fingerprint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportedFile',
+            fields=[
+                ('id', models.UUIDField(blank=True, default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('path', models.TextField(db_index=True)),
+                ('size', models.BigIntegerField()),
+                ('modified_at', models.DateTimeField()),
+                ('sha256', models.CharField(max_length=64, unique=True)),
+                ('row_count', models.IntegerField()),
+                ('imported_at', models.DateTimeField(auto_now_add=True)),
+                ('payment_method', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='receipts.PaymentMethod')),
+            ],
+            options={
+                'db_table': 'imported_file',
+            },
+        ),
+    ]
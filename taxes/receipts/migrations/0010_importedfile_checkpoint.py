@@ -0,0 +1,21 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('receipts', '0009_importedfile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importedfile',
+            name='completed',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddField(
+            model_name='importedfile',
+            name='last_line_number',
+            field=models.IntegerField(default=0),
+        ),
+    ]
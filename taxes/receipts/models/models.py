@@ -17,6 +17,7 @@ __all__ = [
     "Transaction",
     "ForexRate",
     "TaxAdjustment",
+    "ImportedFile",
 ]
 
 
@@ -185,6 +186,8 @@ class Transaction(SurrogateIdMixin):
     total_amount = models.IntegerField()  # in cents
     currency = fields.text_choice_field(types.Currency)
     description = models.TextField(default=UNKNOWN_VALUE)
+    # identifies the imported raw transaction (see itemize.TransactionFingerprinter)
+    fingerprint = models.CharField(max_length=64, null=True, blank=True, unique=True)
 
     def __repr__(self):
         return f"<Transaction({self.id}, {self.description}, {self.total_amount})>"
@@ -258,5 +261,28 @@ class TaxAdjustment(SurrogateIdMixin):
         return f"<TaxAdjustment({self.tax_type}, {self.amount})>"
 
 
+class ImportedFile(SurrogateIdMixin):
+    """
+    Ledger entry of an itemized transaction file
+    """
+
+    class Meta:
+        db_table = "imported_file"
+
+    path = models.TextField(db_index=True)
+    size = models.BigIntegerField()
+    modified_at = models.DateTimeField()
+    sha256 = models.CharField(max_length=64, unique=True)
+    payment_method = models.ForeignKey("PaymentMethod", on_delete=models.PROTECT)
+    row_count = models.IntegerField()
+    imported_at = models.DateTimeField(auto_now_add=True)
+    # partially imported files are resumed after their last committed line
+    completed = models.BooleanField(default=True)
+    last_line_number = models.IntegerField(default=0)
+
+    def __repr__(self):
+        return f"<ImportedFile({self.path}, {self.sha256})>"
+
+
 django_fields.CharField.register_lookup(lookups.AliasMatchLookup)
 django_fields.CharField.register_lookup(lookups.PrefixMatchLookup)
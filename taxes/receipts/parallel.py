@@ -0,0 +1,375 @@
+"""
+Itemization of transaction files in parallel worker processes
+
+Workers parse, filter and match whole files against the in-memory matching index,
+which all of them map read-only from a single flat file (see FlatMatchingIndex),
+and never connect to the database. Each file's itemized rows are streamed back to
+the coordinating process in chunks of plain tuples through a bounded queue, so
+the coordinator writes a file while it is itemized and never holds more than a
+few chunks of any file. The coordinator writes all files in order within its
+transaction, followed by the log records of each file.
+"""
+import concurrent.futures
+import dataclasses
+import datetime
+import logging
+import multiprocessing
+import os
+import queue
+import tempfile
+import typing
+import uuid
+
+import django
+
+from taxes.receipts.itemize import (
+    ItemizationSession,
+    ItemizedRows,
+    Itemizer,
+    memo_hit_rate,
+)
+from taxes.receipts.matching import (
+    AliasMatcherType,
+    FlatMatchingIndex,
+    MatchingIndex,
+)
+from taxes.receipts.parsers import BaseTransactionParser
+from taxes.receipts.parsers_factory import ParserFactory
+from taxes.receipts.writers import BaseTransactionWriter, ReceiptRow, TaxAdjustmentRow
+
+
+LOGGER = logging.getLogger(__name__)
+
+# all loggers of workers are captured and replayed by the coordinator
+WORKER_LOGGER_NAME = "taxes.receipts"
+
+# itemized rows sent to the coordinator at once
+ROW_CHUNK_SIZE = 1000
+# chunks of a file waiting to be written before its worker blocks
+MAX_QUEUED_CHUNKS = 4
+# interval at which the coordinator checks whether a silent worker has died
+CHUNK_POLL_SECONDS = 1.0
+
+# session of the current worker process (mapping the index on first use)
+_worker_session = None  # pylint: disable=invalid-name
+
+EncodedRows = typing.Tuple[tuple, typing.Optional[tuple]]
+
+
+def _encode_uuid(value: typing.Optional[uuid.UUID]) -> typing.Optional[bytes]:
+    return value.bytes if value is not None else None
+
+
+def _decode_uuid(value: typing.Optional[bytes]) -> typing.Optional[uuid.UUID]:
+    return uuid.UUID(bytes=value) if value is not None else None
+
+
+def _encode_choice(value: typing.Optional[str]) -> typing.Optional[str]:
+    # plain strings rather than (pickled) enum members
+    return str(value) if value is not None else None
+
+
+def encode_itemized_rows(itemized_rows: ItemizedRows) -> EncodedRows:
+    """
+    Encodes a receipt (and any tax adjustment) as tuples of plain values
+    """
+    receipt, tax_adjustment = itemized_rows
+    encoded_receipt = (
+        receipt.id.bytes,
+        _encode_uuid(receipt.vendor_id),
+        _encode_uuid(receipt.asset_id),
+        _encode_choice(receipt.transaction_type),
+        receipt.transaction_date.toordinal(),
+        receipt.payment_method_id.bytes,
+        receipt.total_amount,
+        _encode_choice(receipt.currency),
+        receipt.description,
+        receipt.fingerprint,
+    )
+    if tax_adjustment is None:
+        return encoded_receipt, None
+    return (
+        encoded_receipt,
+        (
+            tax_adjustment.id.bytes,
+            _encode_choice(tax_adjustment.tax_type),
+            tax_adjustment.amount,
+        ),
+    )
+
+
+def decode_itemized_rows(encoded_rows: EncodedRows) -> ItemizedRows:
+    """
+    Decodes a receipt (and any tax adjustment) from encode_itemized_rows()
+    """
+    encoded_receipt, encoded_tax_adjustment = encoded_rows
+    (
+        receipt_id,
+        vendor_id,
+        asset_id,
+        transaction_type,
+        transaction_ordinal,
+        payment_method_id,
+        total_amount,
+        currency,
+        description,
+        fingerprint,
+    ) = encoded_receipt
+    receipt = ReceiptRow(
+        id=uuid.UUID(bytes=receipt_id),
+        vendor_id=_decode_uuid(vendor_id),
+        asset_id=_decode_uuid(asset_id),
+        transaction_type=transaction_type,
+        transaction_date=datetime.date.fromordinal(transaction_ordinal),
+        payment_method_id=uuid.UUID(bytes=payment_method_id),
+        total_amount=total_amount,
+        currency=currency,
+        description=description,
+        fingerprint=fingerprint,
+    )
+    if encoded_tax_adjustment is None:
+        return receipt, None
+
+    tax_adjustment_id, tax_type, amount = encoded_tax_adjustment
+    return (
+        receipt,
+        TaxAdjustmentRow(
+            id=uuid.UUID(bytes=tax_adjustment_id),
+            receipt_id=receipt.id,
+            tax_type=tax_type,
+            amount=amount,
+        ),
+    )
+
+
+@dataclasses.dataclass
+class FileResult:
+    """
+    Summary of an itemized file (whose rows were sent through its queue)
+    """
+
+    filename: str
+    row_count: int
+    sha256: typing.Optional[str]
+    parser_failures: int
+    itemizer_failures: int
+    log_records: typing.List[logging.LogRecord]
+    exception: typing.Optional[BaseException] = None
+    # vendor match memo lookups of the file (in its worker's session)
+    memo_hits: int = 0
+    memo_misses: int = 0
+
+
+class _RecordingHandler(logging.Handler):
+    """
+    Collects log records so that they can be sent to another process
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record: logging.LogRecord):
+        # same as logging.handlers.QueueHandler.prepare()
+        record.msg = self.format(record)
+        record.args = None
+        record.exc_info = None
+        record.exc_text = None
+        self.records.append(record)
+
+
+def _get_worker_session(index_path: str) -> ItemizationSession:
+    global _worker_session  # pylint: disable=global-statement,invalid-name
+    if _worker_session is None:
+        _worker_session = ItemizationSession(
+            FlatMatchingIndex.open(index_path),
+            alias_matcher_type=AliasMatcherType.MEMORY,
+        )
+    return _worker_session
+
+
+def _itemize_file(
+    index_path: str,
+    filename: str,
+    parser: BaseTransactionParser,
+    chunk_queue: queue.Queue,
+) -> FileResult:
+    handler = _RecordingHandler()
+    logger = logging.getLogger(WORKER_LOGGER_NAME)
+    logger.setLevel(logging.DEBUG)
+    logger.propagate = False
+    logger.addHandler(handler)
+
+    session = _get_worker_session(index_path)
+    memo_hits = session.memo_hits
+    memo_misses = session.memo_misses
+    itemizer = Itemizer(filename, session=session)
+    chunk = []
+    exception = None
+    try:
+        for raw_transaction in parser.parse(filename):
+            itemized_rows = itemizer.itemize_transaction(raw_transaction)
+            if itemized_rows:
+                chunk.append(encode_itemized_rows(itemized_rows))
+                if len(chunk) >= ROW_CHUNK_SIZE:
+                    chunk_queue.put(chunk)
+                    chunk = []
+    except Exception as exc:  # pylint: disable=broad-except
+        exception = exc
+    finally:
+        logger.removeHandler(handler)
+
+    if chunk:
+        chunk_queue.put(chunk)
+    # end of the file's rows
+    chunk_queue.put(None)
+    return FileResult(
+        filename,
+        parser.rows,
+        parser.sha256,
+        parser.failures,
+        itemizer.failures,
+        handler.records,
+        exception,
+        session.memo_hits - memo_hits,
+        session.memo_misses - memo_misses,
+    )
+
+
+def _replay_log_records(records: typing.List[logging.LogRecord]):
+    for record in records:
+        logger = logging.getLogger(record.name)
+        if logger.isEnabledFor(record.levelno):
+            logger.handle(record)
+
+
+class ParallelItemizer:
+    """
+    Itemizes files in a pool of worker processes and writes them in order
+
+    The matching index must include aliases (i.e. be loaded for in-memory
+    matching).
+    """
+
+    def __init__(
+        self,
+        parser_factory: ParserFactory,
+        matching_index: MatchingIndex,
+        writer: BaseTransactionWriter,
+        jobs: int,
+    ):
+        if jobs < 1:
+            raise ValueError(f"Invalid number of jobs: {jobs}")
+        if matching_index.aliases is None:
+            raise ValueError("Matching index must include aliases")
+        self.parser_factory = parser_factory
+        self.matching_index = matching_index
+        self.writer = writer
+        self.jobs = jobs
+        # number of parsed rows and digest of every written file
+        self.row_counts = {}
+        self.digests = {}
+        # vendor match memo lookups of all workers
+        self.memo_hits = 0
+        self.memo_misses = 0
+
+    def run(self, filenames: typing.List[str]) -> int:
+        """
+        Itemizes all files
+
+        Any exception of a worker is raised once the files before it are written.
+
+        :return: total number of parser failures
+        """
+        with tempfile.TemporaryDirectory() as index_dir:
+            index_path = os.path.join(index_dir, "matching_index.flat")
+            self.matching_index.save_flat(index_path)
+
+            # spawned (rather than forked) workers never share the DB connection.
+            # The manager (serving the chunk queues) exits first, which unblocks
+            # any workers still waiting to queue chunks after a failure.
+            mp_context = multiprocessing.get_context("spawn")
+            with concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.jobs, mp_context=mp_context, initializer=django.setup,
+            ) as executor, mp_context.Manager() as manager:
+                chunk_queues = [
+                    manager.Queue(maxsize=MAX_QUEUED_CHUNKS) for _ in filenames
+                ]
+                futures = [
+                    executor.submit(
+                        _itemize_file,
+                        index_path,
+                        filename,
+                        self.parser_factory.get_parser(filename),
+                        chunk_queue,
+                    )
+                    for filename, chunk_queue in zip(filenames, chunk_queues)
+                ]
+                try:
+                    return sum(
+                        self._write(filename, chunk_queue, future)
+                        for filename, chunk_queue, future in zip(
+                            filenames, chunk_queues, futures
+                        )
+                    )
+                except BaseException:
+                    for future in futures:
+                        future.cancel()
+                    raise
+
+    @staticmethod
+    def _get_chunks(
+        chunk_queue: queue.Queue, future: concurrent.futures.Future
+    ) -> typing.Iterator[typing.List[EncodedRows]]:
+        while True:
+            try:
+                chunk = chunk_queue.get(timeout=CHUNK_POLL_SECONDS)
+            except queue.Empty:
+                if future.done():
+                    # raises the exception of a worker which died
+                    future.result()
+                    raise RuntimeError("Worker did not send all itemized rows")
+                continue
+            if chunk is None:
+                return
+            yield chunk
+
+    def _write(
+        self,
+        filename: str,
+        chunk_queue: queue.Queue,
+        future: concurrent.futures.Future,
+    ) -> int:
+        LOGGER.info("Starting to process: %s...", filename)
+        for chunk in self._get_chunks(chunk_queue, future):
+            for encoded_rows in chunk:
+                self.writer.add(*decode_itemized_rows(encoded_rows))
+
+        result = future.result()
+        _replay_log_records(result.log_records)
+        if result.exception:
+            raise result.exception
+        self.writer.flush()
+        self.row_counts[filename] = result.row_count
+        self.digests[filename] = result.sha256
+        self.memo_hits += result.memo_hits
+        self.memo_misses += result.memo_misses
+
+        error_summary = (
+            f"({result.parser_failures} parser errors, {result.itemizer_failures} "
+            "itemization errors)"
+            if result.parser_failures + result.itemizer_failures
+            else ""
+        )
+        LOGGER.info("Finished processing: %s, %s", filename, error_summary)
+        return result.parser_failures
+
+    def log_statistics(self, logger: logging.Logger = None):
+        logger = logger or LOGGER
+        logger.info(
+            "Vendor match memo: %d hits, %d misses (%.1f%% hit rate), %d jobs",
+            self.memo_hits,
+            self.memo_misses,
+            memo_hit_rate(self.memo_hits, self.memo_misses),
+            self.jobs,
+        )
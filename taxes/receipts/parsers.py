@@ -1,17 +1,31 @@
 import abc
+import collections
 import csv
 import enum
+import functools
+import hashlib
+import io
+import itertools
 import logging
 import re
+import typing
 
+from taxes.receipts.batch import (
+    DEFAULT_TRANSACTION_BATCH_SIZE,
+    TransactionBatch,
+    batch_transactions,
+)
 from taxes.receipts.models import PaymentMethod
 from taxes.receipts.types import RawTransaction, RawTransactinGenerator
+from taxes.receipts.util.compression import open_text_file
 from taxes.receipts.util.datetime import parse_date
 from taxes.receipts.util.currency import parse_amount
 
 
 LOGGER = logging.getLogger(__name__)
 
+DEFAULT_READ_BUFFER_SIZE = io.DEFAULT_BUFFER_SIZE
+
 
 class CommonColumn(enum.Enum):
     transaction_date = "transaction_date"
@@ -30,12 +44,22 @@ class ParseException(Exception):
 
 
 class TextFileLineFilter(metaclass=abc.ABCMeta):
+    # regular expression matching (from the start) all rejected lines, which
+    # allows fusing filters into a single regular expression (if specified)
+    REJECTED_LINES_PATTERN = None
+
     @abc.abstractmethod
     def is_accepted(self, line):
         pass
 
+    @property
+    def rejected_lines_pattern(self) -> typing.Optional[str]:
+        return self.REJECTED_LINES_PATTERN
+
 
 class NonEmptyLinesFilter(TextFileLineFilter):
+    REJECTED_LINES_PATTERN = r"\s*\Z"
+
     def is_accepted(self, line):
         return line.strip() != ""
 
@@ -50,15 +74,68 @@ class SkipPatternsFilter(TextFileLineFilter):
                 return False
         return True
 
+    @property
+    def rejected_lines_pattern(self) -> typing.Optional[str]:
+        if not self.patterns:
+            return r"(?!)"  # never matches
+        return "|".join(f"(?:{pattern.pattern})" for pattern in self.patterns)
+
+
+LineFilterFunction = typing.Callable[[typing.Iterable[str]], typing.Iterator[str]]
+
+
+def compile_line_filters(
+    line_filters: typing.List[TextFileLineFilter],
+) -> LineFilterFunction:
+    """
+    Fuses line filters into a single function which filters an iterable of lines
+
+    The rejected lines of all filters which specify them are matched with a single
+    regular expression, and lines are filtered without calling back into Python
+    unless a filter does not specify its rejected lines.
+    """
+    patterns = []
+    other_filters = []
+    for line_filter in line_filters:
+        pattern = line_filter.rejected_lines_pattern
+        if pattern is None:
+            other_filters.append(line_filter)
+        else:
+            patterns.append(pattern)
+
+    stages = []
+    if patterns:
+        match_rejected = re.compile(
+            "|".join(f"(?:{pattern})" for pattern in patterns)
+        ).match
+        stages.append(functools.partial(itertools.filterfalse, match_rejected))
+    for line_filter in other_filters:
+        stages.append(functools.partial(filter, line_filter.is_accepted))
+
+    def filter_lines(lines: typing.Iterable[str]) -> typing.Iterator[str]:
+        for stage in stages:
+            lines = stage(lines)
+        return iter(lines)
+
+    return filter_lines
+
 
 class TextFileIterator:
+    """
+    Iterates lazily over the lines of a file, counting them
+
+    Only the file's read buffer and the current line are held in memory. Since
+    the CSV reader pulls lines on demand, line_num is the (last) line of the
+    current row even if its quoted fields span several lines.
+    """
+
     def __init__(self, file):
         self.file = file
         self._line_num = 0
 
     def __iter__(self):
         self._line_num = 0
-        for line in self.file.readlines():
+        for line in self.file:
             self._line_num += 1
             yield line
 
@@ -77,28 +154,55 @@ class BaseTransactionParser(metaclass=abc.ABCMeta):
     Base class for parsing transaction files from financial institutions
     """
 
-    def __init__(self, payment_method: PaymentMethod):
+    def __init__(
+        self,
+        payment_method: PaymentMethod,
+        read_buffer_size: int = DEFAULT_READ_BUFFER_SIZE,
+    ):
         self.payment_method = payment_method
+        self.read_buffer_size = read_buffer_size
         self._failures = 0
+        self._rows = 0
+        self._sha256 = None
         if not self.CSV_FIELDS:
             raise RuntimeError("CSV_FIELDS not specified in derived class")
 
     def parse(self, filename: str) -> RawTransactinGenerator:
+        return self._parse_file(filename, self.parse_fields)
+
+    def parse_batches(
+        self, filename: str, batch_size: int = DEFAULT_TRANSACTION_BATCH_SIZE
+    ) -> typing.Iterator[TransactionBatch]:
+        """
+        Parses a file into columnar batches of transactions
+        """
+        return batch_transactions(self.parse(filename), batch_size)
+
+    def _parse_file(
+        self,
+        filename: str,
+        parse_fields: typing.Callable[[typing.List[str], int], typing.Any],
+    ) -> typing.Iterator:
+        """
+        Yields the result of parse_fields() for every row of a file
+        """
         self._failures = 0
-        with open(filename, "r") as csv_file:
+        self._rows = 0
+        self._sha256 = None
+        # the file is hashed while it is parsed (see sha256)
+        digest = hashlib.sha256()
+        with open_text_file(
+            filename, buffering=self.read_buffer_size, digest=digest
+        ) as csv_file:
             raw_iter_lines = TextFileIterator(csv_file)
-            iter_filtered_lines = filter(
-                lambda line: all((f.is_accepted(line) for f in self.LINE_FILTERS)),
-                raw_iter_lines,
-            )
-            iter_rows = csv.DictReader(
-                iter_filtered_lines,
-                fieldnames=self.CSV_FIELDS,
-                quotechar=self.QUOTE_CHAR,
-            )
-            for row in iter_rows:
+            iter_filtered_lines = self.get_line_filter()(raw_iter_lines)
+            iter_rows = csv.reader(iter_filtered_lines, quotechar=self.QUOTE_CHAR)
+            for fields in iter_rows:
+                # skipped like csv.DictReader does
+                if not fields:
+                    continue
                 try:
-                    yield self.parse_row(row, raw_iter_lines.line_num)
+                    result = parse_fields(fields, raw_iter_lines.line_num)
                 except Exception:
                     LOGGER.error(
                         "FAILURE on line %d of file %s",
@@ -107,15 +211,64 @@ class BaseTransactionParser(metaclass=abc.ABCMeta):
                     )
                     self._failures += 1
                     raise
+                self._rows += 1
+                yield result
+        self._sha256 = digest.hexdigest()
+
+    def parse_fields(
+        self, fields: typing.List[str], line_number: int
+    ) -> RawTransaction:
+        """
+        Parses the fields of a row (in the order of CSV_FIELDS)
+
+        Passes the row as a dictionary to parse_row() unless overridden.
+        """
+        return self.parse_row(self._make_row(fields), line_number)
 
     @abc.abstractmethod
     def parse_row(self, row: dict, line_number: int) -> RawTransaction:
         pass
 
+    def _make_row(self, fields: typing.List[str]) -> dict:
+        # same as csv.DictReader
+        row = dict(zip(self.CSV_FIELDS, fields))
+        num_columns = len(self.CSV_FIELDS)
+        num_fields = len(fields)
+        if num_fields > num_columns:
+            row[None] = fields[num_columns:]
+        else:
+            for field in self.CSV_FIELDS[num_fields:]:
+                row[field] = None
+        return row
+
+    @classmethod
+    def get_line_filter(cls) -> LineFilterFunction:
+        """
+        Returns the LINE_FILTERS of the class (compiled once)
+        """
+        # looked up on the class itself since derived classes have their own filters
+        line_filter = cls.__dict__.get("_line_filter")
+        if line_filter is None:
+            line_filter = compile_line_filters(cls.LINE_FILTERS)
+            cls._line_filter = line_filter
+        return line_filter
+
     @property
     def failures(self) -> int:
         return self._failures
 
+    @property
+    def rows(self) -> int:
+        return self._rows
+
+    @property
+    def sha256(self) -> typing.Optional[str]:
+        """
+        SHA-256 (hex) digest of the last file parsed completely, as stored (see
+        ledger.hash_file())
+        """
+        return self._sha256
+
     def _make_transaction(
         self, row: dict, line_number: int, misc: dict, amount: int = None
     ) -> RawTransaction:
@@ -132,7 +285,116 @@ class BaseTransactionParser(metaclass=abc.ABCMeta):
         )
 
 
-class BMOCSVBankAccountParser(BaseTransactionParser):
+class PositionalTransactionParser(BaseTransactionParser):
+    """
+    Base class for parsers which access the fields of a row by their position
+
+    This avoids creating a dictionary for every row. The names of CSV_FIELDS must
+    be valid identifiers.
+    """
+
+    # positional index of every field in CSV_FIELDS (e.g. COLUMNS.amount)
+    COLUMNS = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # batch receiving the parsed fields instead of a RawTransaction (if any)
+        self._batch: typing.Optional[TransactionBatch] = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if cls.CSV_FIELDS:
+            columns_type = collections.namedtuple(
+                f"{cls.__name__}Columns", cls.CSV_FIELDS
+            )
+            cls.COLUMNS = columns_type(*range(len(cls.CSV_FIELDS)))
+
+    def parse_batches(
+        self, filename: str, batch_size: int = DEFAULT_TRANSACTION_BATCH_SIZE
+    ) -> typing.Iterator[TransactionBatch]:
+        """
+        Parses a file into columnar batches of transactions
+
+        The parsed fields of every row are appended to the columns of the current
+        batch directly, without allocating a RawTransaction.
+        """
+        payment_method = self.payment_method
+        batch = self._batch = TransactionBatch(payment_method, payment_method.currency)
+        try:
+            for _ in self._parse_file(filename, self.parse_fields):
+                if len(batch) >= batch_size:
+                    # detached while the batch is processed
+                    self._batch = None
+                    yield batch
+                    batch = self._batch = TransactionBatch(
+                        payment_method, payment_method.currency
+                    )
+        finally:
+            self._batch = None
+        if batch:
+            yield batch
+
+    @abc.abstractmethod
+    def parse_fields(
+        self, fields: typing.List[str], line_number: int
+    ) -> typing.Optional[RawTransaction]:
+        """
+        :return: None if the fields were appended to the current batch
+        """
+
+    def parse_row(self, row: dict, line_number: int) -> RawTransaction:
+        return self.parse_fields([row[field] for field in self.CSV_FIELDS], line_number)
+
+    def _make_transaction_from_fields(
+        self,
+        fields: typing.List[str],
+        line_number: int,
+        misc: dict = None,
+        amount: int = None,
+        description: str = None,
+        **extras,
+    ) -> typing.Optional[RawTransaction]:
+        """
+        :param extras: known extras of RawTransaction (e.g. transaction_code)
+        :return: None if the fields were appended to the current batch
+        """
+        columns = self.COLUMNS
+        transaction_date = parse_date(
+            fields[columns.transaction_date], self.TRANSACTION_DATE_FORMAT
+        )
+        if amount is None:
+            amount = parse_amount(fields[columns.amount])
+        description = (
+            fields[columns.description] if description is None else description
+        ).strip()
+
+        batch = self._batch
+        if batch is None:
+            return RawTransaction(
+                line_number=line_number,
+                transaction_date=transaction_date,
+                amount=amount,
+                currency=self.payment_method.currency,
+                description=description,
+                misc=misc,
+                payment_method=self.payment_method,
+                **extras,
+            )
+
+        if misc:
+            # same as RawTransaction.misc
+            for key, value in misc.items():
+                if key in RawTransaction.MISC_FIELDS:
+                    extras[key] = value
+                else:
+                    extras.setdefault("extras", {})[key] = value
+        batch.append_values(
+            line_number, transaction_date.toordinal(), amount, description, **extras
+        )
+        return None
+
+
+class BMOCSVBankAccountParser(PositionalTransactionParser):
     QUOTE_CHAR = "'"
     LINE_FILTERS = [
         NonEmptyLinesFilter(),
@@ -150,24 +412,25 @@ class BMOCSVBankAccountParser(BaseTransactionParser):
     TRANSACTION_DATE_FORMAT = "%Y%m%d"
     DESCRIPTION_PARSER = re.compile(r"^\[([A-Z]{2})\](.*)$")
 
-    def parse_row(self, row: dict, line_number: int) -> RawTransaction:
-        match = self.DESCRIPTION_PARSER.search(row["consolidated_description"])
+    def parse_fields(
+        self, fields: typing.List[str], line_number: int
+    ) -> RawTransaction:
+        columns = self.COLUMNS
+        match = self.DESCRIPTION_PARSER.search(fields[columns.consolidated_description])
         if not match:
             raise ParseException("Unable to parse line", line_number=line_number)
         transaction_code, description = match.groups()
 
-        row[CommonColumn.description.value] = description
-        return self._make_transaction(
-            row,
+        return self._make_transaction_from_fields(
+            fields,
             line_number,
-            {
-                "last_4_digits": row["card_number"][-4:],
-                "transaction_code": transaction_code,
-            },
+            description=description,
+            last_4_digits=fields[columns.card_number][-4:],
+            transaction_code=transaction_code,
         )
 
 
-class BMOCSVCreditParser(BaseTransactionParser):
+class BMOCSVCreditParser(PositionalTransactionParser):
     QUOTE_CHAR = "'"
     LINE_FILTERS = [
         NonEmptyLinesFilter(),
@@ -183,16 +446,22 @@ class BMOCSVCreditParser(BaseTransactionParser):
     ]
     TRANSACTION_DATE_FORMAT = "%Y%m%d"
 
-    def parse_row(self, row: dict, line_number: int) -> RawTransaction:
+    def parse_fields(
+        self, fields: typing.List[str], line_number: int
+    ) -> RawTransaction:
+        columns = self.COLUMNS
         # all postive values are debited as expenses
-        amount = -1 * parse_amount(row[CommonColumn.amount.value])
+        amount = -1 * parse_amount(fields[columns.amount])
 
-        return self._make_transaction(
-            row, line_number, {"last_4_digits": row["card_number"][-4:],}, amount=amount
+        return self._make_transaction_from_fields(
+            fields,
+            line_number,
+            amount=amount,
+            last_4_digits=fields[columns.card_number][-4:],
         )
 
 
-class MBNAMastercardParser(BaseTransactionParser):
+class MBNAMastercardParser(PositionalTransactionParser):
     LINE_FILTERS = [SkipPatternsFilter([r"^Posted Date,Payee.*"])]
     CSV_FIELDS = [
         CommonColumn.transaction_date.value,
@@ -202,11 +471,13 @@ class MBNAMastercardParser(BaseTransactionParser):
     ]
     TRANSACTION_DATE_FORMAT = "%m/%d/%Y"
 
-    def parse_row(self, row: dict, line_number: int) -> RawTransaction:
-        return self._make_transaction(row, line_number, {})
+    def parse_fields(
+        self, fields: typing.List[str], line_number: int
+    ) -> RawTransaction:
+        return self._make_transaction_from_fields(fields, line_number)
 
 
-class CapitalOneMastercardParser(BaseTransactionParser):
+class CapitalOneMastercardParser(PositionalTransactionParser):
     LINE_FILTERS = [SkipPatternsFilter([r"^Transaction Date.*"])]
     CSV_FIELDS = [
         CommonColumn.transaction_date.value,
@@ -219,18 +490,22 @@ class CapitalOneMastercardParser(BaseTransactionParser):
     ]
     TRANSACTION_DATE_FORMAT = "%Y-%m-%d"
 
-    def parse_row(self, row: dict, line_number: int) -> RawTransaction:
-        debit_amount = parse_amount(row["debit"] or "0.0")
-        credit_amount = parse_amount(row["credit"] or "0.0")
-        return self._make_transaction(
-            row,
+    def parse_fields(
+        self, fields: typing.List[str], line_number: int
+    ) -> RawTransaction:
+        columns = self.COLUMNS
+        debit_amount = parse_amount(fields[columns.debit] or "0.0")
+        credit_amount = parse_amount(fields[columns.credit] or "0.0")
+        return self._make_transaction_from_fields(
+            fields,
             line_number,
-            {"last_4_digits": row["card_number"], "category": row["category"]},
             amount=credit_amount - debit_amount,
+            last_4_digits=fields[columns.card_number],
+            category=fields[columns.category],
         )
 
 
-class ChaseVisaParser(BaseTransactionParser):
+class ChaseVisaParser(PositionalTransactionParser):
     LINE_FILTERS = [SkipPatternsFilter([r"^Transaction Date,Post Date.*"])]
     CSV_FIELDS = [
         CommonColumn.transaction_date.value,
@@ -241,13 +516,19 @@ class ChaseVisaParser(BaseTransactionParser):
         CommonColumn.amount.value,
     ]
 
-    def parse_row(self, row: dict, line_number: int) -> RawTransaction:
-        return self._make_transaction(
-            row, line_number, {"category": row["category"], "type": row["type"],}
+    def parse_fields(
+        self, fields: typing.List[str], line_number: int
+    ) -> RawTransaction:
+        columns = self.COLUMNS
+        return self._make_transaction_from_fields(
+            fields,
+            line_number,
+            category=fields[columns.category],
+            type=fields[columns.type],
         )
 
 
-class WellsFargoParser(BaseTransactionParser):
+class WellsFargoParser(PositionalTransactionParser):
     LINE_FILTERS = [
         NonEmptyLinesFilter(),
     ]
@@ -259,22 +540,27 @@ class WellsFargoParser(BaseTransactionParser):
         CommonColumn.description.value,
     ]
 
-    def __init__(self, *args):
-        super().__init__(*args)
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
         self.authorized_purchase_pattern = re.compile(
             r"^PURCHASE AUTHORIZED ON (?P<authorized_date>\d{2}/\d{2}) (?P<party>.+)$"
         )
 
-    def parse_row(self, row: dict, line_number: int) -> RawTransaction:
+    def parse_fields(
+        self, fields: typing.List[str], line_number: int
+    ) -> RawTransaction:
         # extract real payee if preauthorized payment
-        misc = {}
+        description = authorized_purchase_on = None
         preauthorized_match = self.authorized_purchase_pattern.match(
-            row[CommonColumn.description.value]
+            fields[self.COLUMNS.description]
         )
         if preauthorized_match:
-            row[CommonColumn.description.value] = preauthorized_match.group("party")
-            misc["authorized_purchase_on"] = preauthorized_match.group(
-                "authorized_date"
-            )
+            description = preauthorized_match.group("party")
+            authorized_purchase_on = preauthorized_match.group("authorized_date")
 
-        return self._make_transaction(row, line_number, misc)
+        return self._make_transaction_from_fields(
+            fields,
+            line_number,
+            description=description,
+            authorized_purchase_on=authorized_purchase_on,
+        )
@@ -5,6 +5,7 @@ import os
 from dataclasses import dataclass
 from taxes.receipts.models import PaymentMethod
 from taxes.receipts.parsers import BaseTransactionParser
+from taxes.receipts.util.compression import inner_name
 
 
 class ParserFactoryException(Exception):
@@ -34,8 +35,10 @@ class ParserFactory:
     def get_parser(self, pathname: str) -> BaseTransactionParser:
         """
         Returns an appropriate parser based on the filename
+
+        Compressed files and archive members are matched by their inner filename.
         """
-        filename = os.path.basename(pathname)
+        filename = os.path.basename(inner_name(pathname))
 
         # perform a linear search for a matching parser
         manifest_entry = next(
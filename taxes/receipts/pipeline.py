@@ -0,0 +1,315 @@
+"""
+Itemization of transaction files in concurrent stages
+
+    parse (thread) -> itemize (thread) -> write (calling thread)
+
+Stages are connected by bounded queues, so the next transactions (or files) are
+parsed and matched while receipts are being written, and a slow stage holds
+back the stages ahead of it. All database access remains on the calling thread
+so that every write happens within its transaction.
+"""
+import dataclasses
+import logging
+import queue
+import threading
+import time
+import typing
+
+from taxes.receipts.itemize import ItemizationSession, ItemizedRows, Itemizer
+from taxes.receipts.parsers import BaseTransactionParser
+from taxes.receipts.parsers_factory import ParserFactory
+from taxes.receipts.types import RawTransaction
+from taxes.receipts.writers import BaseTransactionWriter
+
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 500
+DEFAULT_QUEUE_SIZE = 8
+
+# interval (in seconds) at which blocked stages check if the pipeline stopped
+STOP_POLL_INTERVAL = 0.1
+
+
+@dataclasses.dataclass
+class StageStatistics:
+    name: str
+    rows: int = 0
+    busy_seconds: float = 0.0
+    # waiting for input, i.e. the previous stage is slower
+    starved_seconds: float = 0.0
+    # waiting for room in the output queue, i.e. the next stage is slower
+    blocked_seconds: float = 0.0
+    max_queue_size: int = 0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.busy_seconds if self.busy_seconds else 0.0
+
+
+class PipelineStopped(Exception):
+    pass
+
+
+@dataclasses.dataclass
+class _ParsedChunk:
+    filename: str
+    parser: BaseTransactionParser
+    transactions: typing.List[RawTransaction]
+    is_last: bool
+
+
+@dataclasses.dataclass
+class _ItemizedChunk:
+    filename: str
+    parser: BaseTransactionParser
+    itemizer: Itemizer
+    rows: typing.List[ItemizedRows]
+    is_last: bool
+
+
+@dataclasses.dataclass
+class _StageFailure:
+    exception: BaseException
+
+
+class _StageQueue:
+    """
+    Bounded queue between two stages which records how long either side waits
+
+    Items are followed by a final None.
+    """
+
+    def __init__(
+        self,
+        maxsize: int,
+        producer: StageStatistics,
+        consumer: StageStatistics,
+        stopped: threading.Event,
+    ):
+        self._queue = queue.Queue(maxsize)
+        self._producer = producer
+        self._consumer = consumer
+        self._stopped = stopped
+
+    def put(self, item):
+        started_at = time.perf_counter()
+        while True:
+            try:
+                self._queue.put(item, timeout=STOP_POLL_INTERVAL)
+                break
+            except queue.Full:
+                if self._stopped.is_set():
+                    raise PipelineStopped()
+
+        self._producer.blocked_seconds += time.perf_counter() - started_at
+        self._producer.max_queue_size = max(
+            self._producer.max_queue_size, self._queue.qsize()
+        )
+
+    def __iter__(self):
+        while True:
+            started_at = time.perf_counter()
+            while True:
+                try:
+                    item = self._queue.get(timeout=STOP_POLL_INTERVAL)
+                    break
+                except queue.Empty:
+                    if self._stopped.is_set():
+                        raise PipelineStopped()
+            self._consumer.starved_seconds += time.perf_counter() - started_at
+
+            if item is None:
+                return
+            if isinstance(item, _StageFailure):
+                raise item.exception
+            yield item
+
+
+class ItemizationPipeline:
+    """
+    Parses, itemizes and writes transaction files in concurrent stages
+
+    Itemization only runs on its own thread if it requires no queries (i.e. if
+    aliases are matched in memory), otherwise it runs on the calling thread.
+    """
+
+    def __init__(
+        self,
+        parser_factory: ParserFactory,
+        session: ItemizationSession,
+        writer: BaseTransactionWriter,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+    ):
+        self.parser_factory = parser_factory
+        self.session = session
+        self.writer = writer
+        self.chunk_size = chunk_size
+        self.queue_size = queue_size
+
+        self.parse_stats = StageStatistics("parse")
+        self.itemize_stats = StageStatistics("itemize")
+        self.write_stats = StageStatistics("write")
+        # number of parsed rows and digest of every written file
+        self.row_counts = {}
+        self.digests = {}
+        self._stopped = threading.Event()
+
+    @property
+    def statistics(self) -> typing.List[StageStatistics]:
+        return [self.parse_stats, self.itemize_stats, self.write_stats]
+
+    def _run_stage(self, output_queue: _StageQueue, produce: typing.Iterable):
+        try:
+            for item in produce:
+                output_queue.put(item)
+            output_queue.put(None)
+        except PipelineStopped:
+            pass
+        except BaseException as exc:  # pylint: disable=broad-except
+            try:
+                output_queue.put(_StageFailure(exc))
+            except PipelineStopped:
+                pass
+
+    def _parse(self, filenames: typing.List[str]) -> typing.Iterator[_ParsedChunk]:
+        stats = self.parse_stats
+        for filename in filenames:
+            LOGGER.info("Starting to process: %s...", filename)
+            started_at = time.perf_counter()
+            parser = self.parser_factory.get_parser(filename)
+
+            transactions = []
+            for transaction in parser.parse(filename):
+                transactions.append(transaction)
+                if len(transactions) == self.chunk_size:
+                    stats.rows += len(transactions)
+                    stats.busy_seconds += time.perf_counter() - started_at
+                    yield _ParsedChunk(filename, parser, transactions, False)
+                    started_at = time.perf_counter()
+                    transactions = []
+
+            stats.rows += len(transactions)
+            stats.busy_seconds += time.perf_counter() - started_at
+            yield _ParsedChunk(filename, parser, transactions, True)
+
+    def _itemize(
+        self, parsed_chunks: typing.Iterable[_ParsedChunk]
+    ) -> typing.Iterator[_ItemizedChunk]:
+        stats = self.itemize_stats
+        itemizer = None
+        for chunk in parsed_chunks:
+            started_at = time.perf_counter()
+            if not itemizer or itemizer.filename != chunk.filename:
+                itemizer = Itemizer(
+                    chunk.filename, session=self.session, writer=self.writer
+                )
+
+            if self.session.alias_matcher.requires_prepare:
+                self.session.prepare(
+                    transaction.description.upper()
+                    for transaction in chunk.transactions
+                )
+            rows = []
+            for transaction in chunk.transactions:
+                itemized_rows = itemizer.itemize_transaction(transaction)
+                if itemized_rows:
+                    rows.append(itemized_rows)
+
+            stats.rows += len(chunk.transactions)
+            stats.busy_seconds += time.perf_counter() - started_at
+            yield _ItemizedChunk(
+                chunk.filename, chunk.parser, itemizer, rows, chunk.is_last
+            )
+            if chunk.is_last:
+                itemizer = None
+
+    def _start_stage(self, produce: typing.Iterable, queue_stats, consumer_stats):
+        output_queue = _StageQueue(
+            self.queue_size, queue_stats, consumer_stats, self._stopped
+        )
+        thread = threading.Thread(
+            target=self._run_stage, args=(output_queue, produce), daemon=True
+        )
+        thread.start()
+        return output_queue, thread
+
+    def run(self, filenames: typing.List[str]) -> int:
+        """
+        Itemizes all files
+
+        :return: total number of parser failures
+        """
+        # load all in-memory indexes up front since workers must not query
+        threaded_itemize = not self.session.alias_matcher.requires_prepare
+        self.session.exclusion_filters  # pylint: disable=pointless-statement
+        if threaded_itemize:
+            self.session.periodic_payments  # pylint: disable=pointless-statement
+
+        threads = []
+        try:
+            parsed_chunks, thread = self._start_stage(
+                self._parse(filenames), self.parse_stats, self.itemize_stats
+            )
+            threads.append(thread)
+
+            if threaded_itemize:
+                itemized_chunks, thread = self._start_stage(
+                    self._itemize(parsed_chunks), self.itemize_stats, self.write_stats
+                )
+                threads.append(thread)
+            else:
+                itemized_chunks = self._itemize(parsed_chunks)
+
+            return self._write(itemized_chunks)
+        finally:
+            self._stopped.set()
+            for thread in threads:
+                thread.join()
+
+    def _write(self, itemized_chunks: typing.Iterable[_ItemizedChunk]) -> int:
+        stats = self.write_stats
+        total_failures = 0
+        for chunk in itemized_chunks:
+            started_at = time.perf_counter()
+            for itemized_rows in chunk.rows:
+                self.writer.add(*itemized_rows)
+            if chunk.is_last:
+                self.writer.flush()
+            stats.rows += len(chunk.rows)
+            stats.busy_seconds += time.perf_counter() - started_at
+
+            if chunk.is_last:
+                parser = chunk.parser
+                itemizer = chunk.itemizer
+                total_failures += parser.failures
+                self.row_counts[chunk.filename] = parser.rows
+                self.digests[chunk.filename] = parser.sha256
+                error_summary = (
+                    f"({parser.failures} parser errors, {itemizer.failures} "
+                    "itemization errors)"
+                    if parser.failures + itemizer.failures
+                    else ""
+                )
+                LOGGER.info(
+                    "Finished processing: %s, %s", chunk.filename, error_summary
+                )
+
+        return total_failures
+
+    def log_statistics(self, logger: logging.Logger = None):
+        logger = logger or LOGGER
+        for stats in self.statistics:
+            logger.info(
+                "Pipeline stage %s: %d rows in %.2fs (%.0f rows/s), "
+                "%.2fs waiting for input, %.2fs blocked on output "
+                "(max queue size %d)",
+                stats.name,
+                stats.rows,
+                stats.busy_seconds,
+                stats.rows_per_second,
+                stats.starved_seconds,
+                stats.blocked_seconds,
+                stats.max_queue_size,
+            )
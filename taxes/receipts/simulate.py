@@ -0,0 +1,187 @@
+"""
+Simulated itemization which reports matches instead of writing receipts
+
+Transactions are parsed, filtered and matched against the in-memory matching
+index exactly as they would be itemized, but nothing is written to the database
+(nor is a transaction held open). Instead, every transaction is reported along
+with its match (or why it has none), e.g. to curate aliases.
+"""
+import abc
+import csv
+import enum
+import json
+import logging
+import typing
+
+from taxes.receipts.itemize import ItemizationSession, Itemizer
+from taxes.receipts.matching import AliasMatcherType
+from taxes.receipts.parsers_factory import ParserFactory
+from taxes.receipts.types import RawTransaction, TransactionType
+from taxes.receipts.util.currency import cents_to_dollars
+from taxes.receipts.writers import ReceiptRow, TaxAdjustmentRow
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+@enum.unique
+class MatchStatus(enum.Enum):
+    MATCHED = "matched"
+    UNMATCHED = "unmatched"
+    EXCLUDED = "excluded"
+
+
+@enum.unique
+class MatchReportFormat(enum.Enum):
+    CSV = "csv"
+    JSONL = "jsonl"
+
+
+MATCH_REPORT_FIELDS = [
+    "filename",
+    "line_number",
+    "transaction_date",
+    "description",
+    "amount",
+    "currency",
+    "payment_method",
+    "status",
+    "vendor",
+    "category",
+    "asset",
+    "hst_amount",
+]
+
+
+class BaseMatchReportWriter(metaclass=abc.ABCMeta):
+    def __init__(self, fileobj: typing.io):
+        self.fileobj = fileobj
+
+    @abc.abstractmethod
+    def write(self, report_row: dict):
+        pass
+
+
+class CSVMatchReportWriter(BaseMatchReportWriter):
+    def __init__(self, fileobj: typing.io):
+        super().__init__(fileobj)
+        self._writer = csv.DictWriter(fileobj, fieldnames=MATCH_REPORT_FIELDS)
+        self._writer.writeheader()
+
+    def write(self, report_row: dict):
+        self._writer.writerow(report_row)
+
+
+class JSONLinesMatchReportWriter(BaseMatchReportWriter):
+    def write(self, report_row: dict):
+        self.fileobj.write(json.dumps(report_row))
+        self.fileobj.write("\n")
+
+
+MATCH_REPORT_WRITERS = {
+    MatchReportFormat.CSV: CSVMatchReportWriter,
+    MatchReportFormat.JSONL: JSONLinesMatchReportWriter,
+}
+
+
+def make_match_report_writer(
+    report_format: MatchReportFormat, fileobj: typing.io
+) -> BaseMatchReportWriter:
+    return MATCH_REPORT_WRITERS[report_format](fileobj)
+
+
+class ItemizationSimulator:
+    """
+    Itemizes files without writing anything, reporting every transaction's match
+    """
+
+    def __init__(
+        self,
+        parser_factory: ParserFactory,
+        report_writer: BaseMatchReportWriter,
+        session: ItemizationSession = None,
+    ):
+        self.parser_factory = parser_factory
+        self.report_writer = report_writer
+        self.session = session or ItemizationSession(
+            alias_matcher_type=AliasMatcherType.MEMORY
+        )
+        self.status_counts = {status: 0 for status in MatchStatus}
+        self.unmatched_descriptions = set()
+
+    def run(self, filenames: typing.List[str]) -> int:
+        """
+        Simulates the itemization of all files
+
+        :return: total number of parser failures
+        """
+        total_failures = 0
+        for filename in filenames:
+            LOGGER.info("Starting to simulate: %s...", filename)
+            parser = self.parser_factory.get_parser(filename)
+            # receipts are never passed to the (default) writer
+            itemizer = Itemizer(filename, session=self.session)
+            for raw_transaction in parser.parse(filename):
+                itemized_rows = itemizer.itemize_transaction(raw_transaction)
+                self.report_writer.write(
+                    self._make_report_row(
+                        filename, raw_transaction, *(itemized_rows or (None, None))
+                    )
+                )
+            total_failures += parser.failures
+
+        LOGGER.info(
+            "Simulated %d transactions: %d matched, %d unmatched "
+            "(%d distinct descriptions), %d excluded",
+            sum(self.status_counts.values()),
+            self.status_counts[MatchStatus.MATCHED],
+            self.status_counts[MatchStatus.UNMATCHED],
+            len(self.unmatched_descriptions),
+            self.status_counts[MatchStatus.EXCLUDED],
+        )
+        return total_failures
+
+    # TODO: Remove once astroid is upgraded past v2.4.2 (and pylint is upgraded too)
+    # pylint:disable=unsubscriptable-object
+    def _make_report_row(
+        self,
+        filename: str,
+        raw_transaction: RawTransaction,
+        receipt: typing.Optional[ReceiptRow],
+        tax_adjustment: typing.Optional[TaxAdjustmentRow],
+    ) -> dict:
+        vendor = asset = None
+        if not receipt:
+            status = MatchStatus.EXCLUDED
+        elif receipt.vendor_id:
+            status = MatchStatus.MATCHED
+            vendor = self.session.get_matched_vendor(receipt.vendor_id)
+            if receipt.asset_id:
+                asset = self.session.get_matched_asset(receipt.asset_id)
+        else:
+            status = MatchStatus.UNMATCHED
+            self.unmatched_descriptions.add(raw_transaction.description)
+        self.status_counts[status] += 1
+
+        return {
+            "filename": filename,
+            "line_number": raw_transaction.line_number,
+            "transaction_date": raw_transaction.transaction_date.isoformat(),
+            "description": raw_transaction.description,
+            "amount": cents_to_dollars(
+                receipt.total_amount if receipt else raw_transaction.amount
+            ),
+            "currency": raw_transaction.currency,
+            "payment_method": raw_transaction.payment_method.name,
+            "status": status.value,
+            "vendor": vendor.name if vendor else "",
+            "category": TransactionType(receipt.transaction_type).label
+            if receipt and receipt.transaction_type
+            else "",
+            "asset": asset.name if asset else "",
+            "hst_amount": cents_to_dollars(tax_adjustment.amount)
+            if tax_adjustment
+            else "",
+        }
+
+    # pylint:enable=unsubscriptable-object
@@ -0,0 +1,379 @@
+"""
+Set-based itemization of transactions inside PostgreSQL
+
+Transactions are copied into a temporary staging table and itemized with a
+fixed number of statements per file (rather than a few queries per transaction).
+Only the exclusion filters implemented in Python are applied row by row.
+"""
+import enum
+import logging
+import typing
+import uuid
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from taxes.receipts import models
+from taxes.receipts.filters import (
+    BaseVendorExclusionFilter,
+    ExclusionConditionFilter,
+    load_filters_from_modules,
+)
+from taxes.receipts.itemize import TransactionFingerprinter, is_periodic_payment
+from taxes.receipts.matching import AmbiguousPeriodicPaymentError
+from taxes.receipts.tax import HST_TAX_FRACTION
+from taxes.receipts.types import (
+    AliasMatchOperation,
+    RawTransaction,
+    RawTransactionIterable,
+    TaxType,
+)
+from taxes.receipts.util.currency import cents_to_dollars
+from taxes.receipts.writers import encode_copy_rows
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+@enum.unique
+class ItemizerType(enum.Enum):
+    PYTHON = "python"
+    STAGING = "staging"
+
+
+STAGING_TABLE_COLUMNS = (
+    "row_number",
+    "receipt_id",
+    "tax_adjustment_id",
+    "transaction_date",
+    "amount",
+    "currency",
+    "description",
+    "match_description",
+    "payment_method_id",
+    "is_periodic",
+    "fingerprint",
+)
+
+CREATE_STAGING_TABLE_SQL = """
+    CREATE TEMPORARY TABLE itemize_staging (
+        row_number integer PRIMARY KEY,
+        receipt_id uuid NOT NULL,
+        tax_adjustment_id uuid NOT NULL,
+        transaction_date date NOT NULL,
+        amount integer NOT NULL,
+        currency varchar(3) NOT NULL,
+        description text NOT NULL,
+        match_description text NOT NULL,
+        payment_method_id uuid NOT NULL,
+        is_periodic boolean NOT NULL,
+        fingerprint varchar(64) NOT NULL,
+        vendor_id uuid,
+        asset_id uuid,
+        transaction_type varchar(32)
+    )
+"""
+
+DROP_STAGING_TABLE_SQL = "DROP TABLE IF EXISTS itemize_staging"
+
+COPY_STAGING_TABLE_SQL = "COPY itemize_staging ({columns}) FROM STDIN".format(
+    columns=", ".join(STAGING_TABLE_COLUMNS)
+)
+
+# same conditions as filters.ExclusionConditionFilter
+DELETE_EXCLUDED_SQL = """
+    DELETE FROM itemize_staging s
+    WHERE EXISTS (
+        SELECT 1 FROM exclusion_condition e
+        WHERE (
+            e.prefix IS NOT NULL
+            AND s.match_description LIKE e.prefix || '%%'
+            AND (e.on_date IS NULL OR e.on_date = s.transaction_date)
+        ) OR (
+            e.prefix IS NULL
+            AND e.on_date = s.transaction_date
+            AND e.amount = s.amount
+        )
+    )
+    RETURNING s.row_number, s.description, s.amount
+"""
+
+# same semantics as matching.BaseAliasMatcher (equal matches can be hash joined)
+ALIAS_MATCHES_CTE = """
+    alias_matches AS (
+        SELECT s.row_number, p.id AS alias_id
+        FROM itemize_staging s
+        JOIN vendor_alias_pattern p ON p.pattern = s.match_description
+        WHERE NOT s.is_periodic AND p.match_operation = %(equal)s
+        UNION ALL
+        SELECT s.row_number, p.id AS alias_id
+        FROM itemize_staging s
+        JOIN vendor_alias_pattern p ON s.match_description LIKE p.pattern
+        WHERE NOT s.is_periodic AND p.match_operation = %(like)s
+    )
+"""
+
+AMBIGUOUS_ALIAS_MATCHES_SQL = (
+    "WITH "
+    + ALIAS_MATCHES_CTE
+    + """
+    SELECT
+        s.match_description,
+        array_agg(p.match_operation || '("' || p.pattern || '")' ORDER BY p.pattern)
+    FROM alias_matches m
+    JOIN itemize_staging s ON s.row_number = m.row_number
+    JOIN vendor_alias_pattern p ON p.id = m.alias_id
+    GROUP BY s.row_number, s.match_description
+    HAVING COUNT(*) > 1
+    ORDER BY s.row_number
+    LIMIT 1
+"""
+)
+
+# prioritize vendor alias's expense type over the vendor's expense type
+MATCH_ALIASES_SQL = (
+    "WITH "
+    + ALIAS_MATCHES_CTE
+    + """
+    UPDATE itemize_staging s
+    SET
+        vendor_id = v.id,
+        asset_id = COALESCE(p.default_asset_id, v.default_asset_id),
+        transaction_type = COALESCE(
+            NULLIF(p.default_expense_type, ''), v.default_expense_type
+        )
+    FROM alias_matches m
+    JOIN vendor_alias_pattern p ON p.id = m.alias_id
+    JOIN vendor v ON v.id = p.vendor_id
+    WHERE s.row_number = m.row_number
+"""
+)
+
+AMBIGUOUS_PERIODIC_PAYMENTS_SQL = """
+    SELECT s.amount, array_agg(v.name ORDER BY v.name)
+    FROM itemize_staging s
+    JOIN periodic_payment pp ON pp.currency = s.currency AND pp.amount = s.amount
+    JOIN vendor v ON v.id = pp.vendor_id
+    WHERE s.is_periodic
+    GROUP BY s.row_number, s.amount
+    HAVING COUNT(*) > 1
+    ORDER BY s.row_number
+    LIMIT 1
+"""
+
+MATCH_PERIODIC_PAYMENTS_SQL = """
+    UPDATE itemize_staging s
+    SET
+        vendor_id = v.id,
+        asset_id = v.default_asset_id,
+        transaction_type = v.default_expense_type
+    FROM periodic_payment pp
+    JOIN vendor v ON v.id = pp.vendor_id
+    WHERE s.is_periodic AND pp.currency = s.currency AND pp.amount = s.amount
+"""
+
+UNMATCHED_SQL = """
+    SELECT is_periodic, description, amount
+    FROM itemize_staging
+    WHERE vendor_id IS NULL
+    ORDER BY row_number
+"""
+
+FIXED_AMOUNTS_SQL = """
+    SELECT v.fixed_amount, v.name
+    FROM itemize_staging s
+    JOIN vendor v ON v.id = s.vendor_id
+    WHERE v.fixed_amount <> 0
+    ORDER BY s.row_number
+"""
+
+INSERT_RECEIPTS_SQL = """
+    INSERT INTO receipt (
+        id,
+        vendor_id,
+        asset_id,
+        transaction_type,
+        transaction_date,
+        payment_method_id,
+        total_amount,
+        currency,
+        description,
+        fingerprint
+    )
+    SELECT
+        s.receipt_id,
+        s.vendor_id,
+        s.asset_id,
+        s.transaction_type,
+        s.transaction_date,
+        s.payment_method_id,
+        COALESCE(NULLIF(v.fixed_amount, 0), s.amount),
+        s.currency,
+        COALESCE(v.name, s.description),
+        s.fingerprint
+    FROM itemize_staging s
+    LEFT JOIN vendor v ON v.id = s.vendor_id
+    ORDER BY s.row_number
+    ON CONFLICT (fingerprint) DO NOTHING
+"""
+
+# rounds half to even exactly like tax.compute_tax_adjustment_amount()
+# (receipts which were skipped as duplicates get no adjustment)
+INSERT_HST_ADJUSTMENTS_SQL = """
+    INSERT INTO tax_adjustment (id, receipt_id, tax_type, amount)
+    SELECT
+        s.tax_adjustment_id,
+        s.receipt_id,
+        v.tax_adjustment_type,
+        CASE
+            WHEN ABS(t.amount - TRUNC(t.amount)) = 0.5 THEN 2 * ROUND(t.amount / 2)
+            ELSE ROUND(t.amount)
+        END
+    FROM itemize_staging s
+    JOIN receipt r ON r.id = s.receipt_id
+    JOIN vendor v ON v.id = s.vendor_id
+    CROSS JOIN LATERAL (
+        SELECT
+            COALESCE(NULLIF(v.fixed_amount, 0), s.amount)
+            * %(hst_fraction)s::numeric AS amount
+    ) t
+    WHERE v.tax_adjustment_type = %(hst)s
+"""
+
+
+def load_python_exclusion_filters() -> typing.List[BaseVendorExclusionFilter]:
+    """
+    Loads all configured exclusion filters which are not applied in the database
+    """
+    return [
+        exclusion_filter
+        for exclusion_filter in load_filters_from_modules(
+            settings.EXCLUSION_FILTER_MODULES
+        )
+        if not isinstance(exclusion_filter, ExclusionConditionFilter)
+    ]
+
+
+class StagingItemizer:
+    """
+    Itemizes transactions with set-based statements in PostgreSQL
+
+    Produces the same receipts and tax adjustments as itemize.Itemizer.
+    """
+
+    def __init__(
+        self,
+        filename: str,
+        exclusion_filters: typing.List[BaseVendorExclusionFilter] = None,
+    ):
+        self._failures = 0
+        self.filename = filename
+        self.inserted = 0
+        self.skipped = 0
+        self._staged = 0
+        self.fingerprinter = TransactionFingerprinter()
+        if exclusion_filters is None:
+            exclusion_filters = load_python_exclusion_filters()
+        self.exclusion_filters = exclusion_filters
+
+    def _is_excluded(self, transaction: RawTransaction) -> bool:
+        return any(f.is_exclusion(transaction) for f in self.exclusion_filters)
+
+    def _make_staging_rows(
+        self, raw_transactions: RawTransactionIterable
+    ) -> typing.Iterator[tuple]:
+        for row_number, raw_transaction in enumerate(raw_transactions):
+            fingerprint = self.fingerprinter.fingerprint(raw_transaction)
+            if self._is_excluded(raw_transaction):
+                LOGGER.info(
+                    "Skipping transaction: %s %d",
+                    raw_transaction.description,
+                    raw_transaction.amount,
+                )
+                continue
+
+            self._staged += 1
+            yield (
+                row_number,
+                uuid.uuid4(),
+                uuid.uuid4(),
+                raw_transaction.transaction_date,
+                raw_transaction.amount,
+                raw_transaction.currency,
+                raw_transaction.description,
+                raw_transaction.description.upper(),
+                raw_transaction.payment_method.id,
+                bool(is_periodic_payment(raw_transaction)),
+                fingerprint,
+            )
+
+    def process_transactions(self, raw_transactions: RawTransactionIterable):
+        """
+        Itemizes an iterable of transactions
+        """
+        staging_rows = encode_copy_rows(self._make_staging_rows(raw_transactions))
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(DROP_STAGING_TABLE_SQL)
+            cursor.execute(CREATE_STAGING_TABLE_SQL)
+            cursor.copy_expert(COPY_STAGING_TABLE_SQL, staging_rows)
+
+            cursor.execute(DELETE_EXCLUDED_SQL, ())
+            excluded = sorted(cursor.fetchall())
+            for _, description, amount in excluded:
+                LOGGER.info("Skipping transaction: %s %d", description, amount)
+
+            self._match_vendors(cursor)
+
+            cursor.execute(FIXED_AMOUNTS_SQL)
+            for fixed_amount, vendor_name in cursor.fetchall():
+                LOGGER.info(
+                    "Using fixed amount %d for vendor %s", fixed_amount, vendor_name
+                )
+
+            cursor.execute(INSERT_RECEIPTS_SQL)
+            self.inserted += cursor.rowcount
+            self.skipped += self._staged - len(excluded) - cursor.rowcount
+            self._staged = 0
+            cursor.execute(
+                INSERT_HST_ADJUSTMENTS_SQL,
+                {"hst_fraction": HST_TAX_FRACTION, "hst": TaxType.HST.value},
+            )
+            cursor.execute(DROP_STAGING_TABLE_SQL)
+
+    def _match_vendors(self, cursor):
+        cursor.execute(AMBIGUOUS_PERIODIC_PAYMENTS_SQL)
+        ambiguous_payment = cursor.fetchone()
+        if ambiguous_payment:
+            amount, vendor_names = ambiguous_payment
+            raise AmbiguousPeriodicPaymentError.for_amount(amount, vendor_names)
+        cursor.execute(MATCH_PERIODIC_PAYMENTS_SQL)
+
+        match_operations = {
+            "equal": AliasMatchOperation.EQUAL.value,
+            "like": AliasMatchOperation.LIKE.value,
+        }
+        cursor.execute(AMBIGUOUS_ALIAS_MATCHES_SQL, match_operations)
+        ambiguous_match = cursor.fetchone()
+        if ambiguous_match:
+            description, aliases = ambiguous_match
+            raise models.VendorAliasPattern.MultipleObjectsReturned(
+                f"Multiple alias patterns match '{description}': " + ", ".join(aliases)
+            )
+        cursor.execute(MATCH_ALIASES_SQL, match_operations)
+
+        cursor.execute(UNMATCHED_SQL)
+        for is_periodic, description, amount in cursor.fetchall():
+            self._failures += 1
+            if is_periodic:
+                LOGGER.warning(
+                    "Pattern not found for amount: %s", cents_to_dollars(amount)
+                )
+            else:
+                LOGGER.warning(
+                    "Pattern not found in %s: %s", self.filename, description
+                )
+
+    @property
+    def failures(self) -> int:
+        return self._failures
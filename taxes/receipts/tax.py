@@ -1,8 +1,14 @@
+from array import array
 from decimal import Decimal
+import typing
 
 from taxes.receipts import models, types
 
 
+# portion of an amount (including HST) which is HST
+HST_TAX_FRACTION = Decimal(1) - (Decimal(1) / Decimal(1.13))
+
+
 def add_tax_adjustment(receipt: models.Transaction):
     """
     Adds a tax adjustment for a receipt with a periodic payment
@@ -17,17 +23,32 @@ def add_tax_adjustment(receipt: models.Transaction):
     return models.TaxAdjustment.objects.create(
         receipt=receipt,
         tax_type=tax_adjustment_type,
-        amount=_compute_tax_adjustment_amount(receipt, tax_adjustment_type),
+        amount=compute_tax_adjustment_amount(receipt.total_amount, tax_adjustment_type),
     )
 
 
-def _compute_tax_adjustment_amount(
-    receipt: models.Transaction, tax_type: types.TaxType.HST
-) -> int:
+def compute_tax_adjustment_amount(total_amount: int, tax_type: types.TaxType) -> int:
+    """
+    Computes the tax included in a total amount (in cents)
+    """
     if tax_type == types.TaxType.HST:
-        tax_amount = Decimal(receipt.total_amount) * (
-            Decimal(1) - (Decimal(1) / Decimal(1.13))
-        )
-        return round(tax_amount)
+        return round(Decimal(total_amount) * HST_TAX_FRACTION)
 
     raise ValueError("Unsupported tax type")
+
+
+def compute_tax_adjustment_amounts(
+    total_amounts: typing.Sequence[int], tax_type: types.TaxType
+) -> array:
+    """
+    Computes the tax included in a batch of total amounts (in cents)
+
+    Computed once per distinct total amount.
+    """
+    tax_amounts = {}
+    for total_amount in total_amounts:
+        if total_amount not in tax_amounts:
+            tax_amounts[total_amount] = compute_tax_adjustment_amount(
+                total_amount, tax_type
+            )
+    return array("q", (tax_amounts[total_amount] for total_amount in total_amounts))
@@ -1,3 +1,5 @@
+import os
+
 from django.conf import settings
 import pytest
 
@@ -23,3 +25,11 @@ def vendors_and_exclusions():
 @pytest.fixture(scope="session")
 def transaction_fixture_dir():
     return _testfile_pathname("transactions")
+
+
+@pytest.fixture()
+def transaction_filenames(transaction_fixture_dir):
+    return [
+        os.path.join(transaction_fixture_dir, filename)
+        for filename in sorted(os.listdir(transaction_fixture_dir))
+    ]
@@ -0,0 +1,17 @@
+import tracemalloc
+import typing
+
+
+def trace_memory(function: typing.Callable[[], typing.Any]) -> typing.Tuple:
+    """
+    Calls a function while tracing the memory it allocates
+
+    :return: (result, current memory, peak memory) with memory in bytes
+    """
+    tracemalloc.start()
+    try:
+        result = function()
+        current_memory, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, current_memory, peak_memory
@@ -0,0 +1,23 @@
+from taxes.receipts import models
+
+
+RECEIPT_FIELDS = (
+    "transaction_date",
+    "vendor__name",
+    "total_amount",
+    "description",
+    "payment_method__name",
+    "tax_adjustments__amount",
+)
+
+
+def get_receipts(extra_fields: tuple = ()) -> list:
+    """
+    Returns the stored receipts (with their tax adjustments) in a stable order
+
+    :param extra_fields: fields to compare in addition to RECEIPT_FIELDS
+    """
+    return sorted(
+        models.Transaction.objects.values_list(*RECEIPT_FIELDS, *extra_fields),
+        key=repr,
+    )
@@ -0,0 +1,156 @@
+import datetime
+
+import pytest
+
+from taxes.receipts import filters
+from taxes.receipts.batch import TransactionBatch, batch_transactions
+from taxes.receipts.matching import ExclusionIndex
+from taxes.receipts.models import ExclusionCondition, PaymentMethod
+from taxes.receipts.tax import (
+    compute_tax_adjustment_amount,
+    compute_tax_adjustment_amounts,
+)
+from taxes.receipts.tests.memory import trace_memory
+from taxes.receipts.types import Currency, RawTransaction, TaxType
+from taxes.receipts.vectorized import BatchBackendType, make_batch_backend
+
+
+BMO_SAVINGS = PaymentMethod(name="BMO Savings", currency=Currency.CAD)
+CHASE_VISA = PaymentMethod(name="Chase Visa", currency=Currency.USD)
+
+
+def _make_transaction(line_number, description, payment_method=BMO_SAVINGS, **misc):
+    return RawTransaction(
+        line_number=line_number,
+        transaction_date=datetime.date(2016, 5, 1 + line_number % 28),
+        amount=-100 * line_number,
+        currency=payment_method.currency,
+        description=description,
+        payment_method=payment_method,
+        misc=misc,
+    )
+
+
+def _make_transactions():
+    return [
+        _make_transaction(1, "TIM HORTONS #6011 TORONTO ON", transaction_code="CD"),
+        _make_transaction(2, "ONLINE PURCHASE 1234 PAY TO CRA", transaction_code="SO"),
+        _make_transaction(3, "WINE RACK 303 TORONTO ON"),
+        _make_transaction(4, "PAYMENT", CHASE_VISA, category="Payment", type="Sale"),
+        _make_transaction(5, "NETFLIX.COM", CHASE_VISA, type="Sale", branch="123"),
+    ]
+
+
+def test_batch_transactions():
+    transactions = _make_transactions()
+    batches = list(batch_transactions(transactions, batch_size=2))
+
+    assert [len(batch) for batch in batches] == [2, 1, 2]
+    assert [batch.payment_method for batch in batches] == [
+        BMO_SAVINGS,
+        BMO_SAVINGS,
+        CHASE_VISA,
+    ]
+    assert [transaction for batch in batches for transaction in batch] == transactions
+
+    chase_batch = batches[2]
+    assert chase_batch.get_column("transaction_code") == [None, None]
+    assert chase_batch.get_column("category") == ["Payment", None]
+    assert chase_batch.get_column("type") == ["Sale", "Sale"]
+    assert chase_batch.get_column("extras") == [None, {"branch": "123"}]
+    assert list(chase_batch.amounts) == [-400, -500]
+    assert chase_batch.transaction_dates() == [
+        datetime.date(2016, 5, 5),
+        datetime.date(2016, 5, 6),
+    ]
+
+
+def test_append_values():
+    batch = TransactionBatch(CHASE_VISA, Currency.USD)
+    batch.append_values(
+        4,
+        datetime.date(2016, 5, 5).toordinal(),
+        -400,
+        "PAYMENT",
+        category="Payment",
+        type="Sale",
+    )
+    batch.append_values(
+        5,
+        datetime.date(2016, 5, 6).toordinal(),
+        -500,
+        "NETFLIX.COM",
+        type="Sale",
+        extras={"branch": "123"},
+    )
+    assert list(batch) == _make_transactions()[3:]
+
+    with pytest.raises(ValueError):
+        batch.append_values(6, 0, 0, "UNKNOWN", branch="123")
+
+
+@pytest.mark.parametrize("backend_type", [e.value for e in BatchBackendType])
+def test_exclusion_masks(backend_type):
+    if backend_type == BatchBackendType.NUMPY.value:
+        pytest.importorskip("numpy")
+    backend = make_batch_backend(BatchBackendType(backend_type))
+
+    condition_filter = filters.ExclusionConditionFilter()
+    condition_filter.use_exclusion_index(
+        ExclusionIndex(
+            [
+                ExclusionCondition(prefix="WINE RACK"),
+                ExclusionCondition(on_date=datetime.date(2016, 5, 6), amount=-500),
+                ExclusionCondition(on_date=datetime.date(2016, 5, 6), amount=-400),
+                # the date and amount of the first Chase transaction (but not both)
+                ExclusionCondition(on_date=datetime.date(2016, 5, 5), amount=-500),
+            ]
+        )
+    )
+    transactions = _make_transactions()
+    batches = list(batch_transactions(transactions))
+    for exclusion_filter in [
+        condition_filter,
+        filters.BMOTransactionCodeFilter(),
+        filters.CreditPaymentFilter(),
+        filters.CRAPaymentFilter(),
+        filters.WellsFargoOnlinePaymentFilter(),
+    ]:
+        assert [
+            is_excluded
+            for batch in batches
+            for is_excluded in exclusion_filter.exclusion_mask(batch, backend)
+        ] == [
+            bool(exclusion_filter.is_exclusion(transaction))
+            for transaction in transactions
+        ]
+    assert condition_filter.exclusion_mask(batches[1], backend) == [False, True]
+
+
+def test_compute_tax_adjustment_amounts():
+    total_amounts = [1130, -1130, 1130, 0, 99999]
+    assert list(compute_tax_adjustment_amounts(total_amounts, TaxType.HST)) == [
+        compute_tax_adjustment_amount(total_amount, TaxType.HST)
+        for total_amount in total_amounts
+    ]
+
+
+def _get_buffered_memory(make_buffer, num_rows):
+    transactions = (
+        _make_transaction(
+            row, f"PAYEE {row % 100:04d} TORONTO ON", last_4_digits="0067"
+        )
+        for row in range(num_rows)
+    )
+    buffered_transactions, memory, _ = trace_memory(lambda: make_buffer(transactions))
+    assert len(buffered_transactions) == num_rows
+    return memory
+
+
+def test_compact_memory():
+    num_rows = 10000
+    object_memory = _get_buffered_memory(list, num_rows)
+    batch_memory = _get_buffered_memory(
+        lambda transactions: next(batch_transactions(transactions, num_rows)), num_rows,
+    )
+    assert batch_memory < object_memory * 0.25
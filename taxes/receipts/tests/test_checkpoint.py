@@ -0,0 +1,92 @@
+"""
+Tests for itemization with intermediate commits
+"""
+import os
+
+from django.db import transaction
+import pytest
+
+from taxes.receipts import models
+from taxes.receipts.checkpoint import CheckpointedImport
+from taxes.receipts.itemize import ItemizationSession, Itemizer
+from taxes.receipts.ledger import ImportLedger
+from taxes.receipts.parsers_factory import ParserFactory
+from taxes.receipts.staging import ItemizerType
+from taxes.receipts.tests.receipts import get_receipts
+from taxes.receipts.writers import BulkTransactionWriter
+
+
+@pytest.fixture()
+def manual_commits():
+    transaction.set_autocommit(False)
+    yield
+    transaction.rollback()
+    transaction.set_autocommit(True)
+
+
+@pytest.mark.usefixtures(
+    "transactional_db", "payment_methods", "vendors_and_exclusions", "manual_commits"
+)
+@pytest.mark.parametrize("itemizer_type", list(ItemizerType))
+def test_resumes_after_failure(monkeypatch, itemizer_type, transaction_filenames):
+    parser_factory = ParserFactory()
+    session = ItemizationSession()
+    writer = BulkTransactionWriter()
+    for filename in transaction_filenames:
+        Itemizer(filename, session=session, writer=writer).process_transactions(
+            parser_factory.get_parser(filename).parse(filename)
+        )
+    expected_receipts = get_receipts(("fingerprint",))
+    transaction.rollback()
+
+    # fail in the middle of the largest file
+    failing_filename = max(transaction_filenames, key=os.path.getsize)
+    original_get_parser = ParserFactory.get_parser
+
+    def get_failing_parser(self, pathname):
+        parser = original_get_parser(self, pathname)
+        if pathname == failing_filename:
+            original_parse_fields = parser.parse_fields
+
+            def parse_fields(fields, line_number):
+                if parser.rows == 5:
+                    raise RuntimeError("Interrupted")
+                return original_parse_fields(fields, line_number)
+
+            parser.parse_fields = parse_fields
+        return parser
+
+    monkeypatch.setattr(ParserFactory, "get_parser", get_failing_parser)
+    ledger = ImportLedger()
+    with pytest.raises(RuntimeError):
+        CheckpointedImport(
+            ParserFactory(),
+            ledger,
+            BulkTransactionWriter(),
+            itemizer_type,
+            checkpoint_rows=2,
+        ).run(ledger.filter_new(transaction_filenames))
+    transaction.rollback()
+    monkeypatch.undo()
+
+    partial_import = models.ImportedFile.objects.get(completed=False)
+    assert partial_import.path == failing_filename
+    assert partial_import.row_count == 4
+
+    ledger = ImportLedger()
+    remaining_filenames = ledger.filter_new(transaction_filenames)
+    assert remaining_filenames[0] == failing_filename
+    assert ledger.resume_line_number(failing_filename) == (
+        partial_import.last_line_number
+    )
+    assert (
+        CheckpointedImport(
+            ParserFactory(), ledger, BulkTransactionWriter(), itemizer_type
+        ).run(remaining_filenames)
+        == 0
+    )
+    transaction.rollback()
+
+    assert get_receipts(("fingerprint",)) == expected_receipts
+    assert not models.ImportedFile.objects.filter(completed=False).exists()
+    assert models.ImportedFile.objects.count() == len(transaction_filenames)
@@ -2,16 +2,23 @@
 Regression tests for business logic that classifies transactions into receipts
 """
 import functools
+import itertools
 import logging
 from io import StringIO
 
 import pytest
 
 from taxes.receipts import models
+from taxes.receipts.batch import batch_transactions
 from taxes.receipts.tests.logging import MockLogger, log_contains_message
 import taxes.receipts.itemize as itemize_module
+import taxes.receipts.staging as staging_module
+from taxes.receipts.staging import ItemizerType
+from taxes.receipts.matching import AliasMatcherType
 from taxes.receipts.util.datetime import parse_iso_datestring
+from taxes.receipts.vectorized import BatchBackendType
 from taxes.receipts.tests.factories import VendorFactory
+from taxes.receipts.writers import TransactionWriterType, make_transaction_writer
 
 from taxes.receipts.types import (
     RawTransaction,
@@ -24,12 +31,49 @@ from taxes.receipts.types import (
 )
 
 
-@pytest.fixture()
-def itemize_test_setup(request, monkeypatch):
+@pytest.fixture(
+    params=[
+        (ItemizerType.PYTHON.value, alias_matcher, writer)
+        for alias_matcher, writer in itertools.product(
+            [e.value for e in AliasMatcherType],
+            [e.value for e in TransactionWriterType],
+        )
+    ]
+    + [
+        (
+            ItemizerType.PYTHON.value,
+            AliasMatcherType.MEMORY.value,
+            TransactionWriterType.BULK.value,
+            "columnar",
+            backend.value,
+        )
+        for backend in BatchBackendType
+    ]
+    + [(ItemizerType.STAGING.value,)],
+    ids="-".join,
+)
+def itemize_test_setup(request, monkeypatch, settings):
     mock = MockLogger()
     monkeypatch.setattr(itemize_module, "LOGGER", mock)
+    monkeypatch.setattr(staging_module, "LOGGER", mock)
     request.cls.mock_logger = mock
-    request.cls.itemizer = itemize_module.Itemizer("test_filename.csv")
+    request.cls.columnar = "columnar" in request.param
+
+    if ItemizerType(request.param[0]) == ItemizerType.STAGING:
+        request.cls.itemizer = staging_module.StagingItemizer("test_filename.csv")
+        return
+
+    settings.ALIAS_MATCHER, writer_type = request.param[1:3]
+    if request.cls.columnar:
+        settings.BATCH_BACKEND = request.param[4]
+        if settings.BATCH_BACKEND == BatchBackendType.NUMPY.value:
+            pytest.importorskip("numpy")
+    request.cls.itemizer = itemize_module.Itemizer(
+        "test_filename.csv",
+        writer=make_transaction_writer(
+            TransactionWriterType(writer_type), batch_size=2
+        ),
+    )
 
 
 @pytest.fixture()
@@ -105,9 +149,13 @@ class BaseTestItemize:
     mock_logger: MockLogger = None
     itemizer: itemize_module.Itemizer = None
     payment_method: models.PaymentMethod = None
+    columnar = False
 
     def _run_itemizer(self, transactions: RawTransactionIterable):
-        self.itemizer.process_transactions(transactions)
+        if self.columnar:
+            self.itemizer.process_batches(batch_transactions(transactions, 3))
+        else:
+            self.itemizer.process_transactions(transactions)
         assert not log_contains_message(
             self.mock_logger, "Pattern not found", level=logging.WARNING
         )
@@ -435,3 +483,53 @@ class TestWellsFargoItemize(BaseTestItemize):
                 "U.S. Employment",
             ),
         ]
+
+
+@pytest.mark.usefixtures(
+    "itemize_test_setup",
+    "transactional_db",
+    "payment_methods",
+    "vendors_and_exclusions",
+    "wellsfargo_checking_test_setup",
+)
+class TestItemizationSession(BaseTestItemize):
+    def test_shared_across_files(self):
+        # pylint:disable=invalid-name
+        _T = functools.partial(
+            _make_expected_transaction,
+            currency=Currency.USD,
+            payment_method=self.payment_method,
+        )
+        # pylint:enable=invalid-name
+
+        session = itemize_module.ItemizationSession()
+        for filename in ["first.csv", "second.csv"]:
+            self.itemizer = itemize_module.Itemizer(filename, session=session)
+            self._run_itemizer(
+                [
+                    _T(2, "2016-09-27", -3000, "JEEPERS *DOMAINS", {}),
+                    _T(3, "2016-09-28", -4000, "Jeepers *domains", {}),
+                    _T(4, "2016-09-28", 290000, "JEEPERS LLC PAYROLL FEBRUARY", {}),
+                ]
+            )
+
+        assert session.memo_misses == 2
+        assert session.memo_hits == 4
+
+        # the second file only repeats the transactions of the first one
+        receipts = models.Transaction.objects.select_related("vendor").all()
+        assert len(receipts) == 3
+        assert (self.itemizer.writer.inserted, self.itemizer.writer.skipped) == (0, 3)
+
+        # matched vendors and assets are shared across lookups
+        vendor_matches = [
+            session.find_vendor_match("JEEPERS *DOMAINS"),
+            session.find_vendor_match("JEEPERS LLC PAYROLL FEBRUARY"),
+        ]
+        assert vendor_matches[0].vendor is vendor_matches[1].vendor
+        assert vendor_matches[0].asset is not vendor_matches[1].asset
+
+        session.log_statistics(self.mock_logger)
+        assert log_contains_message(
+            self.mock_logger, "Vendor match memo", expected_args=(6, 2, 75.0, 1, 2)
+        )
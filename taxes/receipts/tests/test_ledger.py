@@ -0,0 +1,110 @@
+"""
+Tests for the ledger of imported files
+"""
+import hashlib
+import os
+import shutil
+import zipfile
+
+import pytest
+
+from taxes.receipts import models
+from taxes.receipts.ledger import FileSignature, ImportLedger, hash_file
+from taxes.receipts.parsers_factory import ParserFactory
+from taxes.receipts.util.compression import make_archive_member_name
+
+
+@pytest.fixture()
+def transaction_filename(tmp_path, transaction_fixture_dir):
+    filename = str(tmp_path / "bmo_savings_2016-08.csv")
+    shutil.copy(
+        os.path.join(transaction_fixture_dir, "bmo_savings_2016-08.csv"), filename
+    )
+    return filename
+
+
+def test_hash_file(tmp_path):
+    content = os.urandom(10000)
+    filename = str(tmp_path / "content.bin")
+    with open(filename, "wb") as hashed_file:
+        hashed_file.write(content)
+
+    assert hash_file(filename, chunk_size=999) == hashlib.sha256(content).hexdigest()
+
+
+def test_archive_members(tmp_path):
+    archive_filename = str(tmp_path / "statements.zip")
+    with zipfile.ZipFile(archive_filename, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("first.csv", "first\n" * 100)
+        archive.writestr("second.csv", "second\n")
+
+    member_filename = make_archive_member_name(archive_filename, "first.csv")
+    assert (
+        hash_file(member_filename, chunk_size=99)
+        == hashlib.sha256(b"first\n" * 100).hexdigest()
+    )
+    signature = FileSignature.from_path(member_filename)
+    assert signature.path == make_archive_member_name(
+        os.path.abspath(archive_filename), "first.csv"
+    )
+    assert signature.size == 600
+    assert (
+        signature.modified_at == FileSignature.from_path(archive_filename).modified_at
+    )
+
+
+@pytest.mark.usefixtures("transactional_db", "payment_methods")
+def test_skips_imported_files(monkeypatch, tmp_path, transaction_filename):
+    payment_method = models.PaymentMethod.objects.get(name="BMO Savings")
+    duplicate_filename = str(tmp_path / "bmo_savings_copy.csv")
+    shutil.copy(transaction_filename, duplicate_filename)
+
+    ledger = ImportLedger()
+    assert ledger.filter_new([transaction_filename, duplicate_filename]) == [
+        transaction_filename
+    ]
+    assert ledger.skipped == 1
+    ledger.record(transaction_filename, payment_method, 5)
+
+    imported_file = models.ImportedFile.objects.get()
+    signature = FileSignature.from_path(transaction_filename)
+    assert imported_file.path == signature.path
+    assert imported_file.size == signature.size
+    assert imported_file.modified_at == signature.modified_at
+    assert imported_file.sha256 == hash_file(transaction_filename)
+    assert imported_file.row_count == 5
+
+    # unchanged files are not read again
+    def fail_hash_file(*_args, **_kwargs):
+        raise AssertionError("File was hashed")
+
+    monkeypatch.setattr("taxes.receipts.ledger.hash_file", fail_hash_file)
+    ledger = ImportLedger()
+    assert ledger.filter_new([transaction_filename]) == []
+    monkeypatch.undo()
+
+    # renamed files are recognized by their content
+    assert ledger.filter_new([duplicate_filename]) == []
+    assert ledger.skipped == 2
+
+    with open(duplicate_filename, "a") as changed_file:
+        changed_file.write("\n")
+    assert ledger.filter_new([duplicate_filename]) == [duplicate_filename]
+
+
+@pytest.mark.usefixtures("transactional_db", "payment_methods")
+def test_hashes_new_files_while_parsing(monkeypatch, transaction_filename):
+    def fail_hash_file(*_args, **_kwargs):
+        raise AssertionError("File was hashed")
+
+    # files which cannot be copies of others are not read up front
+    monkeypatch.setattr("taxes.receipts.ledger.hash_file", fail_hash_file)
+    ledger = ImportLedger()
+    assert ledger.filter_new([transaction_filename]) == [transaction_filename]
+
+    parser = ParserFactory().get_parser(transaction_filename)
+    rows = list(parser.parse(transaction_filename))
+    ledger.record(transaction_filename, parser.payment_method, len(rows), parser.sha256)
+    monkeypatch.undo()
+
+    assert models.ImportedFile.objects.get().sha256 == hash_file(transaction_filename)
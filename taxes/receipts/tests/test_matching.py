@@ -0,0 +1,354 @@
+"""
+Tests for the in-memory vendor matching indexes
+"""
+import datetime
+import logging
+import os
+import pickle
+
+import django.core.exceptions as django_exc
+from django.db.models.query import Q
+import pytest
+
+from taxes.receipts import matching, models
+from taxes.receipts.filters import ExclusionConditionFilter
+from taxes.receipts.matching import (
+    AliasIndex,
+    AmbiguousPeriodicPaymentError,
+    ExclusionIndex,
+    FlatMatchingIndex,
+    MatchingIndex,
+    PeriodicPaymentIndex,
+    SQLAliasMatcher,
+)
+from taxes.receipts.tests.factories import VendorFactory
+from taxes.receipts.tests.logging import MockLogger, log_contains_message
+from taxes.receipts.types import (
+    AliasMatchOperation,
+    Currency,
+    RawTransaction,
+    TransactionType,
+)
+from taxes.receipts.util.datetime import parse_iso_datestring
+from taxes.receipts.util.like import AutomatonLikeMatcher, RegexLikeMatcher
+
+
+def _find_alias_with_sql(description: str) -> models.VendorAliasPattern:
+    q_ops = AliasMatchOperation
+    return models.VendorAliasPattern.objects.get(
+        Q(match_operation=q_ops.EQUAL, pattern=description)
+        | Q(match_operation=q_ops.LIKE, pattern__is_alias_match=description)
+    )
+
+
+@pytest.mark.usefixtures(
+    "transactional_db", "payment_methods", "vendors_and_exclusions"
+)
+class TestAliasIndex:
+    DESCRIPTIONS = [
+        "IHOP #123 SAN FRANCISCO",
+        "FEDEXOFFICE 00001234",
+        "MARKHAM TOWN OF TAX PAYMENT",
+        "TORONTO TAX     TAX/TAX",
+        "JEEPERS *DOMAINS",
+        "JEEPERS LLC PAYROLL FEBRUARY",
+        "ANNUAL FEE FOR 01/16 THROUGH 12/16",
+        "GUSTO PAY 666666 555555 6AAAAAA06UQ JOHN DOE",
+        "NO SUCH VENDOR",
+        "",
+    ]
+
+    @pytest.mark.parametrize(
+        "like_matcher_class", (AutomatonLikeMatcher, RegexLikeMatcher)
+    )
+    def test_matches_sql_lookup(self, like_matcher_class):
+        alias_index = AliasIndex.load(like_matcher_class=like_matcher_class)
+        assert len(alias_index) == models.VendorAliasPattern.objects.count()
+
+        for description in self.DESCRIPTIONS:
+            try:
+                expected_alias = _find_alias_with_sql(description)
+            except django_exc.ObjectDoesNotExist:
+                assert alias_index.find(description) is None
+                continue
+
+            vendor_match = alias_index.find(description)
+            vendor = expected_alias.vendor
+            assert vendor_match.vendor == vendor
+            assert vendor_match.asset == (
+                expected_alias.default_asset or vendor.default_asset
+            )
+            assert vendor_match.expense_type == (
+                expected_alias.default_expense_type or vendor.default_expense_type
+            )
+
+    def test_no_queries_per_lookup(self, django_assert_num_queries):
+        with django_assert_num_queries(1):
+            alias_index = AliasIndex.load()
+
+        with django_assert_num_queries(0):
+            for description in self.DESCRIPTIONS:
+                vendor_match = alias_index.find(description)
+                if vendor_match:
+                    assert vendor_match.vendor.name
+                    assert vendor_match.asset is None or vendor_match.asset.name
+
+    def test_sql_matcher(self, django_assert_num_queries):
+        alias_index = AliasIndex.load()
+        sql_matcher = SQLAliasMatcher()
+
+        with django_assert_num_queries(1):
+            sql_matcher.prepare(self.DESCRIPTIONS)
+
+        with django_assert_num_queries(0):
+            for description in self.DESCRIPTIONS:
+                assert sql_matcher.find(description) == alias_index.find(description)
+
+        # descriptions outside of the prepared batch are resolved individually
+        with django_assert_num_queries(1):
+            vendor_match = sql_matcher.find("IHOP #456 OAKLAND")
+        assert vendor_match.vendor.name == "IHOP"
+        assert sql_matcher.find("IHOP #123 SAN FRANCISCO").vendor.name == "IHOP"
+
+    @pytest.mark.parametrize("matcher_loader", (AliasIndex.load, SQLAliasMatcher))
+    def test_multiple_matches(self, matcher_loader):
+        vendor = VendorFactory.create(
+            name="Double IHOP", default_expense_type=TransactionType.MEALS
+        )
+        models.VendorAliasPattern.objects.create(
+            vendor=vendor,
+            pattern="IHOP #123%",
+            match_operation=AliasMatchOperation.LIKE,
+        )
+
+        alias_matcher = matcher_loader()
+        with pytest.raises(models.VendorAliasPattern.MultipleObjectsReturned):
+            alias_matcher.find("IHOP #123 SAN FRANCISCO")
+
+
+@pytest.mark.usefixtures(
+    "transactional_db", "payment_methods", "vendors_and_exclusions"
+)
+class TestPeriodicPaymentIndex:
+    def test_find(self, django_assert_num_queries):
+        with django_assert_num_queries(1):
+            periodic_payments = PeriodicPaymentIndex.load()
+
+        assert len(periodic_payments) == models.PeriodicPayment.objects.count()
+        with django_assert_num_queries(0):
+            vendor_match = periodic_payments.find(Currency.CAD, 30890)
+            assert vendor_match.vendor.name == "FootBlind Finance Analytic"
+            assert vendor_match.asset.name == "5-699 Amber St"
+            assert vendor_match.expense_type == TransactionType.RENT
+
+            assert periodic_payments.find(Currency.USD, 30890) is None
+            assert periodic_payments.find(Currency.CAD, 30891) is None
+
+    def test_ambiguous_amounts(self, tmpdir, monkeypatch):
+        vendor = VendorFactory.create(name="Duplicate Rent")
+        models.PeriodicPayment.objects.create(
+            name="duplicate", vendor=vendor, currency=Currency.CAD, amount=30890
+        )
+
+        # reported when built, but only an error once a transaction matches an
+        # ambiguous amount
+        mock_logger = MockLogger()
+        monkeypatch.setattr(matching, "LOGGER", mock_logger)
+        matching_index = MatchingIndex.load(with_aliases=False)
+        assert log_contains_message(
+            mock_logger,
+            "Periodic payments with the same amount",
+            level=logging.WARNING,
+            expected_args=(
+                30890,
+                Currency.CAD,
+                "Duplicate Rent, FootBlind Finance Analytic",
+            ),
+        )
+        flat_path = str(tmpdir.join("matching_index.flat"))
+        matching_index.save_flat(flat_path)
+        flat_index = FlatMatchingIndex.open(flat_path)
+        for periodic_payments in (
+            matching_index.periodic_payments,
+            flat_index.periodic_payments,
+        ):
+            assert periodic_payments.find(Currency.CAD, 160000) is not None
+            assert 30890 in periodic_payments.amounts(Currency.CAD)
+            with pytest.raises(AmbiguousPeriodicPaymentError) as exc_info:
+                periodic_payments.find(Currency.CAD, 30890)
+            assert "Duplicate Rent" in str(exc_info.value)
+            assert "FootBlind Finance Analytic" in str(exc_info.value)
+
+
+@pytest.mark.usefixtures(
+    "transactional_db", "payment_methods", "vendors_and_exclusions"
+)
+class TestExclusionIndex:
+    @pytest.mark.parametrize(
+        "description, on_date, amount",
+        (
+            ("SAFEWAY #1234", "2016-09-01", -1000),
+            ("safeway #1234", "2016-09-01", -1000),
+            ("THE SAFEWAY", "2016-09-01", -1000),
+            ("SOME VENDOR", "2016-09-15", 4219),
+            ("SOME VENDOR", "2016-09-15", 4220),
+            ("SOME VENDOR", "2016-09-16", 4219),
+            ("MAVEN", "2016-09-21", -667),
+            ("MAVEN", "2016-09-22", -667),
+            ("AT&AMP;T MOBILITY", "2016-09-22", -5000),
+            ("", "2016-09-22", 0),
+        ),
+    )
+    def test_matches_exclusion_filter(self, description, on_date, amount):
+        transaction = RawTransaction(
+            line_number=1,
+            transaction_date=parse_iso_datestring(on_date),
+            amount=amount,
+            currency=Currency.USD,
+            description=description,
+            misc={},
+        )
+        exclusion_filter = ExclusionConditionFilter()
+        expected = exclusion_filter.is_exclusion(transaction)
+
+        exclusion_index = ExclusionIndex.load()
+        assert len(exclusion_index) == models.ExclusionCondition.objects.count()
+        exclusion_filter.use_exclusion_index(exclusion_index)
+        assert exclusion_filter.is_exclusion(transaction) == expected
+
+
+@pytest.mark.usefixtures(
+    "transactional_db", "payment_methods", "vendors_and_exclusions"
+)
+class TestMatchingIndexSnapshot:
+    def test_snapshot_reload(self, tmpdir, django_assert_num_queries):
+        snapshot_path = os.path.join(str(tmpdir), "cache", "matching_index.pickle")
+
+        matching_index = MatchingIndex.load_snapshot(snapshot_path)
+        assert os.path.exists(snapshot_path)
+        assert matching_index.aliases.find("IHOP #123").vendor.name == "IHOP"
+
+        # only the data fingerprint is queried when the snapshot is current
+        with django_assert_num_queries(1):
+            matching_index = MatchingIndex.load_snapshot(snapshot_path)
+            assert matching_index.aliases.find("IHOP #123").vendor.name == "IHOP"
+            vendor_match = matching_index.periodic_payments.find(Currency.CAD, 30890)
+            assert vendor_match.asset.name == "5-699 Amber St"
+            assert vendor_match.vendor.default_asset is vendor_match.asset
+            assert matching_index.exclusions.is_excluded(
+                "SAFEWAY #1", datetime.date(2016, 9, 1), 100
+            )
+
+    def test_stale_snapshot(self, tmpdir):
+        snapshot_path = os.path.join(str(tmpdir), "matching_index.pickle")
+        matching_index = MatchingIndex.load_snapshot(snapshot_path)
+        assert matching_index.aliases.find("MAVEN") is None
+
+        vendor = VendorFactory.create(name="Maven")
+        alias = models.VendorAliasPattern.objects.create(
+            vendor=vendor, pattern="MAVEN", match_operation=AliasMatchOperation.EQUAL,
+        )
+        matching_index = MatchingIndex.load_snapshot(snapshot_path)
+        assert matching_index.aliases.find("MAVEN").vendor == vendor
+
+        # updates (with unchanged row counts) are detected too
+        alias.pattern = "MAVEN SF"
+        alias.save()
+        matching_index = MatchingIndex.load_snapshot(snapshot_path)
+        assert matching_index.aliases.find("MAVEN") is None
+        assert matching_index.aliases.find("MAVEN SF").vendor == vendor
+
+    def test_unreadable_snapshot(self, tmpdir):
+        snapshot_path = os.path.join(str(tmpdir), "matching_index.pickle")
+        with open(snapshot_path, "wb") as snapshot_file:
+            snapshot_file.write(b"garbage")
+
+        matching_index = MatchingIndex.load_snapshot(snapshot_path)
+        assert matching_index.aliases.find("IHOP #123").vendor.name == "IHOP"
+        assert MatchingIndex.load_snapshot(snapshot_path).aliases
+
+    def test_incompatible_snapshot(self, tmpdir):
+        snapshot_path = os.path.join(str(tmpdir), "matching_index.pickle")
+        MatchingIndex.load_snapshot(snapshot_path)
+
+        # e.g. model instances pickled before a schema change
+        class IncompatibleValues:
+            def __reduce__(self):
+                return datetime.date, ("2016-09-01",)
+
+        with open(snapshot_path, "r+b") as snapshot_file:
+            pickle.load(snapshot_file)
+            snapshot_file.truncate(snapshot_file.tell())
+            pickle.dump(IncompatibleValues(), snapshot_file)
+
+        matching_index = MatchingIndex.load_snapshot(snapshot_path)
+        assert matching_index.aliases.find("IHOP #123").vendor.name == "IHOP"
+        assert MatchingIndex.load_snapshot(snapshot_path).aliases
+
+
+@pytest.fixture()
+def flat_index_setup(request, tmpdir):
+    request.cls.matching_index = MatchingIndex.load()
+    flat_path = str(tmpdir.join("matching_index.flat"))
+    request.cls.matching_index.save_flat(flat_path)
+    request.cls.flat_index = FlatMatchingIndex.open(flat_path)
+
+
+@pytest.mark.usefixtures(
+    "transactional_db", "payment_methods", "vendors_and_exclusions", "flat_index_setup"
+)
+class TestFlatMatchingIndex:
+    matching_index = None
+    flat_index = None
+
+    def test_matches_matching_index(self, django_assert_num_queries):
+        aliases = self.matching_index.aliases
+        periodic_payments = self.matching_index.periodic_payments
+        exclusions = self.matching_index.exclusions
+
+        with django_assert_num_queries(0):
+            assert len(self.flat_index.aliases) == len(aliases)
+            for description in TestAliasIndex.DESCRIPTIONS:
+                assert self.flat_index.aliases.find(description) == aliases.find(
+                    description
+                )
+
+            assert len(self.flat_index.periodic_payments) == len(periodic_payments)
+            for currency, amount in ((Currency.CAD, 30890), (Currency.USD, 30890)):
+                assert self.flat_index.periodic_payments.find(
+                    currency, amount
+                ) == periodic_payments.find(currency, amount)
+                assert sorted(
+                    self.flat_index.periodic_payments.amounts(currency)
+                ) == sorted(periodic_payments.amounts(currency))
+
+            assert len(self.flat_index.exclusions) == len(exclusions)
+            for description, on_date, amount in (
+                ("SAFEWAY #1234", datetime.date(2016, 9, 1), -1000),
+                ("SAFEWAY #1234", datetime.date(2016, 9, 2), -1000),
+                ("SOME VENDOR", datetime.date(2016, 9, 15), 4219),
+                ("SOME VENDOR", datetime.date(2016, 9, 15), 4220),
+                ("MAVEN", datetime.date(2016, 9, 21), -667),
+            ):
+                assert self.flat_index.exclusions.is_excluded(
+                    description, on_date, amount
+                ) == exclusions.is_excluded(description, on_date, amount)
+            assert (
+                self.flat_index.exclusions.dated_amounts() == exclusions.dated_amounts()
+            )
+            assert (datetime.date(2016, 9, 15).toordinal(), 4219) in (
+                exclusions.dated_amounts()
+            )
+
+    def test_vendor_matches_are_cached(self):
+        vendor_match = self.flat_index.periodic_payments.find(Currency.CAD, 30890)
+        assert vendor_match.asset.name == "5-699 Amber St"
+        assert vendor_match.expense_type == TransactionType.RENT
+        assert self.flat_index.periodic_payments.find(Currency.CAD, 30890) is (
+            vendor_match
+        )
+
+    def test_without_aliases(self, tmpdir):
+        flat_path = str(tmpdir.join("no_aliases.flat"))
+        MatchingIndex.load(with_aliases=False).save_flat(flat_path)
+        assert FlatMatchingIndex.open(flat_path).aliases is None
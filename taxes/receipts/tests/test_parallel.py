@@ -0,0 +1,131 @@
+"""
+Tests for itemization in parallel worker processes
+"""
+import datetime
+import pickle
+import uuid
+
+import pytest
+
+from taxes.receipts import models
+from taxes.receipts import parallel as parallel_module
+from taxes.receipts.itemize import ItemizationSession, Itemizer
+from taxes.receipts.matching import MatchingIndex
+from taxes.receipts.parallel import (
+    ParallelItemizer,
+    decode_itemized_rows,
+    encode_itemized_rows,
+)
+from taxes.receipts.parsers import ParseException
+from taxes.receipts.parsers_factory import ParserFactory
+from taxes.receipts.tests.logging import MockLogger, log_contains_message
+from taxes.receipts.tests.receipts import get_receipts
+from taxes.receipts.types import Currency, TaxType, TransactionType
+from taxes.receipts.writers import (
+    BulkTransactionWriter,
+    ReceiptRow,
+    TaxAdjustmentRow,
+)
+
+
+@pytest.mark.usefixtures(
+    "transactional_db", "payment_methods", "vendors_and_exclusions"
+)
+def test_matches_sequential_itemizer(transaction_filenames):
+    parser_factory = ParserFactory()
+
+    session = ItemizationSession()
+    writer = BulkTransactionWriter()
+    expected_failures = 0
+    for filename in transaction_filenames:
+        parser = parser_factory.get_parser(filename)
+        Itemizer(filename, session=session, writer=writer).process_transactions(
+            parser.parse(filename)
+        )
+        expected_failures += parser.failures
+    expected_receipts = get_receipts()
+    assert expected_receipts
+
+    models.Transaction.objects.all().delete()
+    parallel_itemizer = ParallelItemizer(
+        parser_factory, MatchingIndex.load(), BulkTransactionWriter(), jobs=2
+    )
+    assert parallel_itemizer.run(transaction_filenames) == expected_failures
+    assert get_receipts() == expected_receipts
+
+    # every match is looked up in the memo of a worker
+    lookups = session.memo_hits + session.memo_misses
+    assert parallel_itemizer.memo_hits + parallel_itemizer.memo_misses == lookups
+    assert parallel_itemizer.memo_misses > 0
+    mock_logger = MockLogger()
+    parallel_itemizer.log_statistics(mock_logger)
+    assert log_contains_message(
+        mock_logger,
+        "Vendor match memo",
+        expected_args=(
+            parallel_itemizer.memo_hits,
+            parallel_itemizer.memo_misses,
+            100.0 * parallel_itemizer.memo_hits / lookups,
+            2,
+        ),
+    )
+
+
+@pytest.mark.usefixtures(
+    "transactional_db", "payment_methods", "vendors_and_exclusions"
+)
+def test_worker_failure(monkeypatch, tmp_path, transaction_filenames):
+    mock_logger = MockLogger()
+    monkeypatch.setattr(parallel_module, "LOGGER", mock_logger)
+
+    invalid_filename = str(tmp_path / "bmo_savings_invalid.csv")
+    with open(invalid_filename, "w") as invalid_file:
+        invalid_file.write("'1234','DEBIT',20160901,-1.00,'MISSING CODE'\n")
+
+    parallel_itemizer = ParallelItemizer(
+        ParserFactory(), MatchingIndex.load(), BulkTransactionWriter(), jobs=2
+    )
+    with pytest.raises(ParseException):
+        parallel_itemizer.run(transaction_filenames[:2] + [invalid_filename])
+
+    # files before the failure were written in order
+    for filename in transaction_filenames[:2]:
+        assert log_contains_message(
+            mock_logger, "Finished processing", expected_args=(filename, "")
+        )
+    assert log_contains_message(
+        mock_logger, "Starting to process", expected_args=(invalid_filename,)
+    )
+    assert not log_contains_message(
+        mock_logger, "Finished processing", expected_args=(invalid_filename, "")
+    )
+
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError):
+        ParallelItemizer(None, MatchingIndex(None, None, None), None, jobs=2)
+
+
+def test_encoded_itemized_rows():
+    receipt = ReceiptRow(
+        id=uuid.uuid4(),
+        vendor_id=uuid.uuid4(),
+        asset_id=None,
+        transaction_type=TransactionType.RENT,
+        transaction_date=datetime.date(2016, 8, 2),
+        payment_method_id=uuid.uuid4(),
+        total_amount=-1133,
+        currency=Currency.CAD,
+        description="MTCC 452",
+        fingerprint="0" * 64,
+    )
+    tax_adjustment = TaxAdjustmentRow(
+        id=uuid.uuid4(), receipt_id=receipt.id, tax_type=TaxType.HST, amount=-130
+    )
+
+    for itemized_rows in ((receipt, tax_adjustment), (receipt, None)):
+        encoded_rows = encode_itemized_rows(itemized_rows)
+        # only plain values are sent by workers
+        pickled_rows = pickle.dumps(encoded_rows)
+        assert b"uuid" not in pickled_rows and b"taxes" not in pickled_rows
+        assert decode_itemized_rows(encoded_rows) == itemized_rows
@@ -1,14 +1,20 @@
+import csv
+import gzip
 import logging
 import functools
 import os
+import zipfile
 
 import pytest
 
 from taxes.receipts.types import Currency, RawTransactionSequence
+from taxes.receipts.ledger import hash_file
 from taxes.receipts.models import PaymentMethod
 from taxes.receipts import parsers
 from taxes.receipts.parsers_factory import ParserFactory
 from taxes.receipts.tests.logging import log_contains_message, MockLogger
+from taxes.receipts.tests.memory import trace_memory
+from taxes.receipts.util.compression import make_archive_member_name
 from taxes.receipts.util.datetime import parse_iso_datestring
 
 
@@ -59,15 +65,20 @@ class TestParsers:
         self, filename
     ) -> RawTransactionSequence:  # pylint:disable=redefined-outer-name
         test_parser = self.parser_factory.get_parser(filename)
-        results = list(
-            test_parser.parse(os.path.join(self.transaction_fixture_dir, filename))
-        )
+        filename = os.path.join(self.transaction_fixture_dir, filename)
+        results = list(test_parser.parse(filename))
 
         assert not log_contains_message(
             self.mock_logger, "Pattern not found", level=logging.ERROR
         )
         assert test_parser.failures == 0
 
+        # parsed directly into the columns of batches
+        batches = list(test_parser.parse_batches(filename, batch_size=4))
+        assert [transaction for batch in batches for transaction in batch] == results
+        assert test_parser.rows == len(results)
+        assert test_parser.sha256 == hash_file(filename)
+
         return results
 
     def test_bmo_savings_parser(self):
@@ -392,3 +403,160 @@ class TestParsers:
             _T(7, "2016-09-01", -11900, "CHARIOT TRANSIT INC. 855-444-8111 CA", {}),
             _T(8, "2016-09-01", -2500, "ANNUAL FEE FOR 01/16 THROUGH 12/16", {}),
         ]
+
+
+@pytest.mark.usefixtures("transactional_db", "payment_methods")
+def test_compressed_and_archived_files(tmp_path, transaction_fixture_dir):
+    fixture_filename = os.path.join(transaction_fixture_dir, "bmo_savings_2016-08.csv")
+    with open(fixture_filename, "rb") as fixture_file:
+        content = fixture_file.read()
+
+    compressed_filename = str(tmp_path / "bmo_savings_2016-08.csv.gz")
+    with gzip.open(compressed_filename, "wb") as compressed_file:
+        compressed_file.write(content)
+    archive_filename = str(tmp_path / "statements.zip")
+    with zipfile.ZipFile(archive_filename, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("bmo_savings_2016-08.csv", content)
+    member_filename = make_archive_member_name(
+        archive_filename, "bmo_savings_2016-08.csv"
+    )
+
+    parser_factory = ParserFactory()
+    expected_transactions = list(
+        parser_factory.get_parser(fixture_filename).parse(fixture_filename)
+    )
+    for filename in (compressed_filename, member_filename):
+        # matched by the name of the inner file
+        parser = parser_factory.get_parser(filename)
+        assert isinstance(parser, parsers.BMOCSVBankAccountParser)
+        assert list(parser.parse(filename)) == expected_transactions
+        # hashed as stored while parsed
+        assert parser.sha256 == hash_file(filename)
+
+
+def _make_mbna_parser(**kwargs) -> parsers.MBNAMastercardParser:
+    return parsers.MBNAMastercardParser(
+        PaymentMethod(name="MBNA Mastercard", currency=Currency.CAD), **kwargs
+    )
+
+
+def test_quoted_newlines(tmp_path):
+    filename = str(tmp_path / "mbna_mastercard.csv")
+    with open(filename, "w") as transaction_file:
+        transaction_file.write(
+            "Posted Date,Payee,Address,Amount\n"
+            '09/15/2016,"PAYMENT"," ",9.99\n'
+            '09/16/2016,"RELAY 4753\nTORONTO ON","1 FRONT ST\nTORONTO",-2.81\n'
+            '09/26/2016,"NETFLIX.COM"," ",-9.99\n'
+        )
+
+    assert [
+        (transaction.line_number, transaction.description)
+        for transaction in _make_mbna_parser(read_buffer_size=16).parse(filename)
+    ] == [(2, "PAYMENT"), (5, "RELAY 4753\nTORONTO ON"), (6, "NETFLIX.COM")]
+
+
+def _get_peak_parse_memory(filename: str) -> int:
+    parser = _make_mbna_parser()
+
+    def parse():
+        for _ in parser.parse(filename):
+            pass
+
+    _, _, peak_memory = trace_memory(parse)
+    return peak_memory
+
+
+def test_constant_memory(tmp_path):
+    peak_memory = []
+    for num_rows in (1000, 20000):
+        filename = str(tmp_path / f"mbna_mastercard_{num_rows}.csv")
+        with open(filename, "w") as transaction_file:
+            transaction_file.write("Posted Date,Payee,Address,Amount\n")
+            for row in range(num_rows):
+                transaction_file.write(
+                    f'09/{1 + row % 28:02d}/2016,"PAYEE {row:08d} TORONTO ON",'
+                    f'"{row} MAIN ST",-{row % 1000}.99\n'
+                )
+        peak_memory.append(_get_peak_parse_memory(filename))
+
+    small_file_peak, large_file_peak = peak_memory
+    assert large_file_peak < small_file_peak * 1.2
+
+
+class _OddLinesFilter(parsers.TextFileLineFilter):
+    def is_accepted(self, line):
+        return len(line) % 2 == 1
+
+
+@pytest.mark.parametrize(
+    "line_filters",
+    [
+        [],
+        [parsers.NonEmptyLinesFilter()],
+        [parsers.SkipPatternsFilter([])],
+        [
+            parsers.NonEmptyLinesFilter(),
+            parsers.SkipPatternsFilter([r"^Following data.*", r"^Item #.*"]),
+        ],
+        [
+            parsers.SkipPatternsFilter([r"^Posted Date,Payee.*", "A|B"]),
+            _OddLinesFilter(),
+        ],
+    ],
+)
+def test_compiled_line_filters(line_filters):
+    lines = [
+        "Following data is valid as of 20160602230457:\n",
+        "\n",
+        " \t \n",
+        "",
+        "Item #,Card #,Transaction Date\n",
+        "Posted Date,Payee,Address,Amount\n",
+        "1,'XXXXXXXXXXXX0004',20160510,1.5,TIM HORTONS\n",
+        "ABC\n",
+        "BC\n",
+        "CB\n",
+        " Following data\n",
+    ]
+    assert list(parsers.compile_line_filters(line_filters)(lines)) == [
+        line for line in lines if all(f.is_accepted(line) for f in line_filters)
+    ]
+
+
+class _DictRowParser(parsers.BaseTransactionParser):
+    # (not necessarily valid identifiers)
+    CSV_FIELDS = ["Transaction Date", "_description", "address", "amount"]
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.parsed_rows = []
+
+    def parse_row(self, row: dict, line_number: int) -> parsers.RawTransaction:
+        self.parsed_rows.append(row)
+        return line_number
+
+
+def test_dict_row_adapter(tmp_path):
+    filename = str(tmp_path / "transactions.csv")
+    with open(filename, "w") as transaction_file:
+        transaction_file.write(
+            '09/15/2016,"PAYMENT"," ",9.99\n'
+            "\n"
+            "09/16/2016,RELAY\n"
+            "09/26/2016,NETFLIX.COM, ,-9.99,EXTRA,FIELDS\n"
+        )
+
+    parser = _DictRowParser(PaymentMethod(name="Dict", currency=Currency.CAD))
+    assert list(parser.parse(filename)) == [1, 3, 4]
+    with open(filename, "r") as transaction_file:
+        assert parser.parsed_rows == list(
+            csv.DictReader(transaction_file, fieldnames=_DictRowParser.CSV_FIELDS)
+        )
+
+    # positional parsers accept rows too
+    mbna_parser = _make_mbna_parser()
+    row = dict(zip(mbna_parser.CSV_FIELDS, parser.parsed_rows[0].values()))
+    assert mbna_parser.parse_row(row, 1) == (
+        mbna_parser.parse_fields(["09/15/2016", "PAYMENT", " ", "9.99"], 1)
+    )
@@ -0,0 +1,59 @@
+"""
+Tests for itemization in concurrent stages
+"""
+import pytest
+
+from taxes.receipts import models
+from taxes.receipts.itemize import ItemizationSession, Itemizer
+from taxes.receipts.matching import AliasMatcherType
+from taxes.receipts.parsers_factory import ParserFactory
+from taxes.receipts.pipeline import ItemizationPipeline
+from taxes.receipts.tests.receipts import get_receipts
+from taxes.receipts.writers import BulkTransactionWriter
+
+
+@pytest.mark.usefixtures(
+    "transactional_db", "payment_methods", "vendors_and_exclusions"
+)
+@pytest.mark.parametrize("alias_matcher", [e.value for e in AliasMatcherType])
+def test_matches_sequential_itemizer(settings, alias_matcher, transaction_filenames):
+    settings.ALIAS_MATCHER = alias_matcher
+    parser_factory = ParserFactory()
+
+    session = ItemizationSession()
+    writer = BulkTransactionWriter()
+    expected_failures = 0
+    for filename in transaction_filenames:
+        parser = parser_factory.get_parser(filename)
+        Itemizer(filename, session=session, writer=writer).process_transactions(
+            parser.parse(filename)
+        )
+        expected_failures += parser.failures
+    expected_receipts = get_receipts()
+    assert expected_receipts
+
+    models.Transaction.objects.all().delete()
+    pipeline = ItemizationPipeline(
+        parser_factory,
+        ItemizationSession(),
+        BulkTransactionWriter(),
+        chunk_size=3,
+        queue_size=2,
+    )
+    assert pipeline.run(transaction_filenames) == expected_failures
+    assert get_receipts() == expected_receipts
+
+    parse_stats, itemize_stats, write_stats = pipeline.statistics
+    assert parse_stats.rows == itemize_stats.rows
+    assert sum(pipeline.row_counts.values()) == parse_stats.rows
+    assert write_stats.rows == models.Transaction.objects.count()
+    assert 0 < parse_stats.max_queue_size <= 2
+
+
+@pytest.mark.usefixtures("transactional_db", "payment_methods")
+def test_stage_failure(transaction_filenames):
+    pipeline = ItemizationPipeline(
+        ParserFactory(), ItemizationSession(), BulkTransactionWriter()
+    )
+    with pytest.raises(FileNotFoundError):
+        pipeline.run(transaction_filenames[:1] + ["/no/such/bmo_savings.csv"])
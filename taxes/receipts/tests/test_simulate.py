@@ -0,0 +1,109 @@
+"""
+Tests for simulated itemization
+"""
+import csv
+import io
+import json
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+import pytest
+
+from taxes.receipts import models
+from taxes.receipts.itemize import Itemizer
+from taxes.receipts.parsers_factory import ParserFactory
+from taxes.receipts.simulate import (
+    MATCH_REPORT_FIELDS,
+    ItemizationSimulator,
+    MatchReportFormat,
+    MatchStatus,
+    make_match_report_writer,
+)
+
+
+def _simulate(report_format, filenames):
+    report_file = io.StringIO()
+    simulator = ItemizationSimulator(
+        ParserFactory(), make_match_report_writer(report_format, report_file)
+    )
+    with CaptureQueriesContext(connection) as queries:
+        assert simulator.run(filenames) == 0
+    assert not [
+        query
+        for query in queries.captured_queries
+        if not query["sql"].lstrip().upper().startswith("SELECT")
+    ]
+    report_file.seek(0)
+    return simulator, report_file
+
+
+@pytest.mark.usefixtures(
+    "transactional_db", "payment_methods", "vendors_and_exclusions"
+)
+def test_reports_itemized_receipts(transaction_filenames):
+    simulator, report_file = _simulate(MatchReportFormat.CSV, transaction_filenames)
+    report = list(csv.DictReader(report_file))
+    assert not models.Transaction.objects.exists()
+    assert set(report[0].keys()) == set(MATCH_REPORT_FIELDS)
+    assert sum(simulator.status_counts.values()) == len(report)
+    assert simulator.status_counts[MatchStatus.EXCLUDED] > 0
+
+    parser_factory = ParserFactory()
+    for filename in transaction_filenames:
+        Itemizer(filename).process_transactions(
+            parser_factory.get_parser(filename).parse(filename)
+        )
+    receipts = models.Transaction.objects.values_list(
+        "transaction_date",
+        "vendor__name",
+        "asset__name",
+        "total_amount",
+        "tax_adjustments__amount",
+    )
+    expected_rows = sorted(
+        (
+            transaction_date.isoformat(),
+            vendor_name or "",
+            asset_name or "",
+            f"{total_amount * 0.01:0.2f}",
+            f"{hst_amount * 0.01:0.2f}" if hst_amount else "",
+        )
+        for transaction_date, vendor_name, asset_name, total_amount, hst_amount in (
+            receipts
+        )
+    )
+    assert (
+        sorted(
+            (
+                row["transaction_date"],
+                row["vendor"],
+                row["asset"],
+                row["amount"],
+                row["hst_amount"],
+            )
+            for row in report
+            if row["status"] != MatchStatus.EXCLUDED.value
+        )
+        == expected_rows
+    )
+
+    unmatched_rows = [
+        row for row in report if row["status"] == MatchStatus.UNMATCHED.value
+    ]
+    assert {row["description"] for row in unmatched_rows} == (
+        simulator.unmatched_descriptions
+    )
+    assert not any(row["vendor"] for row in unmatched_rows)
+
+
+@pytest.mark.usefixtures(
+    "transactional_db", "payment_methods", "vendors_and_exclusions"
+)
+def test_json_lines_report(transaction_filenames):
+    _, csv_report_file = _simulate(MatchReportFormat.CSV, transaction_filenames)
+    _, jsonl_report_file = _simulate(MatchReportFormat.JSONL, transaction_filenames)
+
+    jsonl_report = [json.loads(line) for line in jsonl_report_file]
+    for row in jsonl_report:
+        row["line_number"] = str(row["line_number"])
+    assert jsonl_report == list(csv.DictReader(csv_report_file))
@@ -0,0 +1,168 @@
+"""
+Tests for set-based itemization in a staging table
+"""
+import datetime
+import random
+import types
+
+from django.db import IntegrityError
+import pytest
+
+from taxes.receipts import models, staging, tax
+from taxes.receipts.itemize import Itemizer
+from taxes.receipts.staging import StagingItemizer
+from taxes.receipts.tests.factories import VendorFactory
+from taxes.receipts.types import (
+    AliasMatchOperation,
+    Currency,
+    RawTransaction,
+    TaxType,
+    TransactionType,
+)
+
+
+def _make_transactions(payment_method, rows):
+    return [
+        RawTransaction(
+            line_number=line_number,
+            transaction_date=datetime.date(2016, 8, 1 + line_number % 28),
+            amount=amount,
+            currency=Currency.CAD,
+            description=description,
+            misc={"transaction_code": transaction_code},
+            payment_method=payment_method,
+        )
+        for line_number, (amount, description, transaction_code) in enumerate(rows)
+    ]
+
+
+def _get_results():
+    receipts = models.Transaction.objects.order_by(
+        "transaction_date", "description", "total_amount"
+    ).values_list(
+        "transaction_date",
+        "vendor__name",
+        "asset__name",
+        "transaction_type",
+        "total_amount",
+        "currency",
+        "description",
+        "payment_method__name",
+        "fingerprint",
+    )
+    adjustments = models.TaxAdjustment.objects.order_by(
+        "receipt__transaction_date", "receipt__total_amount"
+    ).values_list("receipt__description", "tax_type", "amount")
+    return list(receipts), list(adjustments)
+
+
+@pytest.mark.usefixtures(
+    "transactional_db", "payment_methods", "vendors_and_exclusions"
+)
+class TestStagingItemizer:
+    ROWS = [
+        (-1133, "MTCC 452        FEE/FRA", "DS"),
+        (160000, "877 LAWRENCE A", "CD"),  # periodic payment
+        (30890, "", "IB"),  # periodic payment with HST
+        (-200839, "YRCC994         FEE/FRA", "DS"),  # HST
+        (-1000, "XOOM.COM DEBIT 1234", "DS"),  # fixed amount
+        (-1000, "Xoom.com debit 5678", "DS"),
+        (-50000, "AP    000000002288889ZZZZ", "SO"),  # BMO transaction code
+        (-1234, "SAFEWAY #1234", "DS"),  # exclusion condition
+        (-500, "NO SUCH VENDOR", "DS"),
+        (12345, "", "CD"),  # unknown periodic payment
+    ]
+
+    def test_matches_python_itemizer(self):
+        payment_method = models.PaymentMethod.objects.get(name="BMO Savings")
+        transactions = _make_transactions(payment_method, self.ROWS)
+
+        itemizer = Itemizer("test.csv")
+        itemizer.process_transactions(transactions)
+        expected_results = _get_results()
+        assert len(expected_results[0]) == 8
+        assert len(expected_results[1]) == 2
+
+        models.Transaction.objects.all().delete()
+        staging_itemizer = StagingItemizer("test.csv")
+        staging_itemizer.process_transactions(transactions)
+
+        assert _get_results() == expected_results
+        assert staging_itemizer.failures == itemizer.failures == 2
+
+    def test_hst_rounding(self):
+        vendor = VendorFactory.create(
+            name="HST Vendor",
+            default_expense_type=TransactionType.MAINTENANCE,
+            tax_adjustment_type=TaxType.HST,
+        )
+        models.VendorAliasPattern.objects.create(
+            vendor=vendor, pattern="HST%", match_operation=AliasMatchOperation.LIKE
+        )
+        payment_method = models.PaymentMethod.objects.get(name="BMO Savings")
+
+        rng = random.Random(1234)
+        amounts = list(range(-300, 300)) + [
+            rng.randint(-(10 ** 9), 10 ** 9) for _ in range(2000)
+        ]
+        StagingItemizer("test.csv").process_transactions(
+            _make_transactions(
+                payment_method, [(amount, "HST", "DS") for amount in amounts]
+            )
+        )
+
+        adjustments = models.TaxAdjustment.objects.values_list(
+            "receipt__total_amount", "amount"
+        )
+        assert len(adjustments) == len(amounts)
+        for total_amount, amount in adjustments:
+            assert amount == tax.compute_tax_adjustment_amount(
+                total_amount, TaxType.HST
+            )
+
+    def test_multiple_alias_matches(self):
+        vendor = VendorFactory.create(name="Double MTCC")
+        models.VendorAliasPattern.objects.create(
+            vendor=vendor, pattern="MTCC%", match_operation=AliasMatchOperation.LIKE
+        )
+        payment_method = models.PaymentMethod.objects.get(name="BMO Savings")
+
+        with pytest.raises(models.VendorAliasPattern.MultipleObjectsReturned):
+            StagingItemizer("test.csv").process_transactions(
+                _make_transactions(payment_method, self.ROWS)
+            )
+        assert not models.Transaction.objects.exists()
+
+    def test_skips_imported_transactions(self):
+        payment_method = models.PaymentMethod.objects.get(name="BMO Savings")
+        transactions = _make_transactions(payment_method, self.ROWS)
+        Itemizer("first.csv").process_transactions(transactions[:4])
+
+        # the first rows overlap with the previous (python) import
+        staging_itemizer = StagingItemizer("second.csv")
+        staging_itemizer.process_transactions(transactions)
+        assert (staging_itemizer.inserted, staging_itemizer.skipped) == (4, 4)
+
+        staging_itemizer = StagingItemizer("third.csv")
+        staging_itemizer.process_transactions(transactions)
+        assert (staging_itemizer.inserted, staging_itemizer.skipped) == (0, 8)
+
+        # same receipts as a single import of all transactions
+        results = _get_results()
+        assert len(results[1]) == 2
+        models.Transaction.objects.all().delete()
+        Itemizer("all.csv").process_transactions(transactions)
+        assert _get_results() == results
+
+    def test_other_conflicts(self, monkeypatch):
+        payment_method = models.PaymentMethod.objects.get(name="BMO Savings")
+        transactions = _make_transactions(payment_method, self.ROWS)
+        Itemizer("first.csv").process_transactions(transactions[:1])
+        receipt_id = models.Transaction.objects.get().id
+
+        # only duplicate fingerprints are skipped
+        monkeypatch.setattr(
+            staging, "uuid", types.SimpleNamespace(uuid4=lambda: receipt_id)
+        )
+        with pytest.raises(IntegrityError):
+            StagingItemizer("second.csv").process_transactions(transactions[1:2])
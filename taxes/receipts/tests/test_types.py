@@ -0,0 +1,83 @@
+import dataclasses
+import datetime
+import pickle
+
+from taxes.receipts.tests.memory import trace_memory
+from taxes.receipts.types import Currency, RawTransaction
+
+
+@dataclasses.dataclass
+class _DictTransaction:
+    line_number: int
+    transaction_date: datetime.date
+    amount: int
+    currency: Currency
+    description: str = None
+    misc: dict = None
+    payment_method: str = None
+
+
+def _make_transaction(line_number, transaction_class=RawTransaction, **kwargs):
+    return transaction_class(
+        line_number=line_number,
+        transaction_date=datetime.date(2016, 5, 1),
+        amount=-150,
+        currency=Currency.CAD,
+        description="TIM HORTONS #6011 TORONTO ON",
+        **kwargs,
+    )
+
+
+def test_misc():
+    transaction = _make_transaction(
+        1, misc={"transaction_code": "CD", "last_4_digits": "0067", "branch": "123"}
+    )
+    assert transaction.transaction_code == "CD"
+    assert transaction.last_4_digits == "0067"
+    assert transaction.category is None
+    assert transaction.extras == {"branch": "123"}
+    assert transaction.misc == {
+        "transaction_code": "CD",
+        "last_4_digits": "0067",
+        "branch": "123",
+    }
+    assert transaction == _make_transaction(
+        1, transaction_code="CD", last_4_digits="0067", misc={"branch": "123"}
+    )
+    assert transaction != _make_transaction(1, transaction_code="CD")
+
+    transaction.misc = {"category": "Payment"}
+    assert transaction.misc == {"category": "Payment"}
+    assert transaction.transaction_code is None
+    assert transaction.extras is None
+    assert _make_transaction(1).misc == {}
+    assert _make_transaction(1, misc={}) == _make_transaction(1)
+
+
+def test_pickle():
+    transaction = _make_transaction(1, type="Sale", misc={"branch": "123"})
+    assert pickle.loads(pickle.dumps(transaction)) == transaction
+
+
+def _get_buffered_memory(transaction_class, misc_factory, num_rows):
+    transactions, memory, _ = trace_memory(
+        lambda: [
+            _make_transaction(row, transaction_class, misc=misc_factory(row))
+            for row in range(num_rows)
+        ]
+    )
+    assert len(transactions) == num_rows
+    return memory
+
+
+def test_compact_memory():
+    num_rows = 10000
+
+    def make_misc(row):
+        # distinct values, as when parsed from a file
+        return {"last_4_digits": str(row), "transaction_code": "CD"}
+
+    dict_memory = _get_buffered_memory(_DictTransaction, make_misc, num_rows)
+    slotted_memory = _get_buffered_memory(RawTransaction, make_misc, num_rows)
+    assert not hasattr(_make_transaction(1), "__dict__")
+    assert slotted_memory < dict_memory * 0.7
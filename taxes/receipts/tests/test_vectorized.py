@@ -0,0 +1,65 @@
+import pytest
+
+from taxes.receipts.tax import compute_tax_adjustment_amount
+from taxes.receipts.types import TaxType
+from taxes.receipts.vectorized import (
+    BatchBackendType,
+    PythonBatchBackend,
+    make_batch_backend,
+)
+
+
+@pytest.fixture(params=[e.value for e in BatchBackendType])
+def batch_backend(request):
+    backend_type = BatchBackendType(request.param)
+    if backend_type == BatchBackendType.NUMPY:
+        pytest.importorskip("numpy")
+    return make_batch_backend(backend_type)
+
+
+def test_isin(batch_backend):
+    assert list(batch_backend.isin([1, -2, 3, 0], [3, -2])) == [
+        False,
+        True,
+        True,
+        False,
+    ]
+    assert list(batch_backend.isin([1, 2], [])) == [False, False]
+
+
+def test_pairs_isin(batch_backend):
+    members = {(736000, -500), (736001, 700)}
+    # (736000, 700) is a candidate whose pair is not a member
+    assert list(
+        batch_backend.pairs_isin(
+            [736000, 736000, 736001, 736002], [-500, 700, 700, -500], members
+        )
+    ) == [True, False, True, False]
+    assert list(batch_backend.pairs_isin([736000], [-500], set())) == [False]
+
+
+def test_override_amounts(batch_backend):
+    assert list(batch_backend.override_amounts([100, -200, 300], [0, 5000, 0])) == [
+        100,
+        5000,
+        300,
+    ]
+
+
+def test_tax_adjustment_amounts(batch_backend):
+    # the tax of every (positive and negative) residue modulo 113, since HST is
+    # 13/113 of the total amount, and of amounts too large for floating point
+    total_amounts = list(range(-20000, 20000, 7)) + [
+        10 ** 12 + 1,
+        -(10 ** 12) - 3,
+        2 ** 62 + 5,
+    ]
+    assert list(batch_backend.tax_adjustment_amounts(total_amounts, TaxType.HST)) == [
+        compute_tax_adjustment_amount(total_amount, TaxType.HST)
+        for total_amount in total_amounts
+    ]
+
+
+def test_default_backend(settings):
+    settings.BATCH_BACKEND = BatchBackendType.PYTHON.value
+    assert isinstance(make_batch_backend(), PythonBatchBackend)
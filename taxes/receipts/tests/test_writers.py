@@ -0,0 +1,193 @@
+import datetime
+import uuid
+
+from django.db import IntegrityError, connection
+import pytest
+
+from taxes.receipts import types, models, tax
+from taxes.receipts.tests import factories
+from taxes.receipts.writers import (
+    BulkTransactionWriter,
+    CopyTransactionWriter,
+    ReceiptRow,
+    TaxAdjustmentRow,
+    TransactionWriter,
+    TransactionWriterType,
+    encode_copy_value,
+    make_transaction_writer,
+)
+
+
+pytestmark = pytest.mark.usefixtures(  # pylint: disable=invalid-name
+    "transactional_db",
+)
+
+
+def _make_rows(count: int, description: str = "test receipt"):
+    vendor = factories.VendorFactory.create(tax_adjustment_type=types.TaxType.HST)
+    payment_method = factories.PaymentMethodFactory.create(currency=types.Currency.CAD)
+
+    rows = []
+    for i in range(count):
+        receipt = ReceiptRow(
+            id=uuid.uuid4(),
+            vendor_id=vendor.id,
+            asset_id=None,
+            transaction_type=vendor.default_expense_type,
+            transaction_date=datetime.date(2016, 8, 1 + i),
+            payment_method_id=payment_method.id,
+            total_amount=50850,
+            currency=types.Currency.CAD,
+            description=description,
+            fingerprint=f"fingerprint {i}",
+        )
+        tax_adjustment = TaxAdjustmentRow(
+            id=uuid.uuid4(),
+            receipt_id=receipt.id,
+            tax_type=types.TaxType.HST,
+            amount=tax.compute_tax_adjustment_amount(50850, types.TaxType.HST),
+        )
+        rows.append((receipt, tax_adjustment))
+    return rows
+
+
+@pytest.mark.parametrize(
+    "writer_class, receipt_queries",
+    (
+        # insert (skipping conflicts) returning the inserted receipts
+        (BulkTransactionWriter, 1),
+        # create and truncate a temporary table, copy into it and insert from it
+        (CopyTransactionWriter, 4),
+    ),
+)
+def test_batches(writer_class, receipt_queries, django_assert_num_queries):
+    rows = _make_rows(3)
+    writer = writer_class(batch_size=2)
+
+    # receipts and tax adjustments are inserted once per full batch
+    with django_assert_num_queries(0):
+        writer.add(*rows[0])
+    with django_assert_num_queries(receipt_queries + 1):
+        writer.add(*rows[1])
+    with django_assert_num_queries(0):
+        writer.add(rows[2][0], None)
+    assert models.Transaction.objects.count() == 2
+
+    with django_assert_num_queries(receipt_queries):
+        writer.flush()
+    with django_assert_num_queries(0):
+        writer.flush()
+
+    receipts = models.Transaction.objects.order_by("transaction_date")
+    assert [receipt.id for receipt in receipts] == [row[0].id for row in rows]
+    assert receipts[0].transaction_type == rows[0][0].transaction_type
+    assert receipts[0].currency == types.Currency.CAD
+
+    adjustments = models.TaxAdjustment.objects.order_by("receipt__transaction_date")
+    assert [(a.receipt_id, a.tax_type, a.amount) for a in adjustments] == [
+        (rows[0][0].id, types.TaxType.HST, 5850),
+        (rows[1][0].id, types.TaxType.HST, 5850),
+    ]
+
+
+def test_insert_round_trips(django_assert_num_queries):
+    rows = _make_rows(2)
+    writer = TransactionWriter()
+    with django_assert_num_queries(1):
+        writer.add(rows[0][0], None)
+    with django_assert_num_queries(2):
+        writer.add(*rows[1])
+    assert (writer.inserted, writer.skipped) == (2, 0)
+
+
+@pytest.mark.parametrize(
+    "writer_class", (TransactionWriter, BulkTransactionWriter, CopyTransactionWriter)
+)
+def test_other_conflicts(writer_class):
+    ((receipt, _),) = _make_rows(1)
+    writer = writer_class()
+    writer.add(receipt, None)
+    writer.flush()
+
+    # only duplicate fingerprints are skipped
+    writer = writer_class()
+    with pytest.raises(IntegrityError):
+        writer.add(receipt._replace(fingerprint="other fingerprint"), None)
+        writer.flush()
+
+
+@pytest.mark.parametrize(
+    "writer_class", (TransactionWriter, BulkTransactionWriter, CopyTransactionWriter)
+)
+def test_special_characters(writer_class):
+    description = "TAB\\tAND\tNEWLINE\nCR\r\\N"
+    ((receipt, tax_adjustment),) = _make_rows(1, description=description)
+    writer = writer_class()
+    writer.add(receipt, tax_adjustment)
+    writer.flush()
+
+    assert models.Transaction.objects.get().description == description
+
+
+@pytest.mark.parametrize(
+    "writer_class", (TransactionWriter, BulkTransactionWriter, CopyTransactionWriter)
+)
+def test_duplicate_fingerprints(writer_class):
+    rows = _make_rows(3)
+    writer = writer_class()
+    for receipt, tax_adjustment in rows[:2]:
+        writer.add(receipt, tax_adjustment)
+    writer.flush()
+    assert (writer.inserted, writer.skipped) == (2, 0)
+
+    # rows of a later import with the same fingerprints are skipped
+    writer = writer_class()
+    for receipt, tax_adjustment in rows:
+        receipt = receipt._replace(id=uuid.uuid4())
+        writer.add(receipt, tax_adjustment._replace(receipt_id=receipt.id))
+    writer.flush()
+    assert (writer.inserted, writer.skipped) == (1, 2)
+
+    assert models.Transaction.objects.count() == 3
+    assert models.TaxAdjustment.objects.count() == 3
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    (
+        (None, "\\N"),
+        ("\\N", "\\\\N"),
+        ("A\tB\nC\rD", "A\\tB\\nC\\rD"),
+        (types.Currency.CAD, "CAD"),
+        (datetime.date(2016, 8, 1), "2016-08-01"),
+        (-1234, "-1234"),
+    ),
+)
+def test_encode_copy_value(value, expected):
+    assert encode_copy_value(value) == expected
+
+
+def test_make_transaction_writer(monkeypatch):
+    writer = make_transaction_writer(TransactionWriterType.INSERT)
+    assert isinstance(writer, TransactionWriter)
+
+    writer = make_transaction_writer(TransactionWriterType.BULK, batch_size=500)
+    assert isinstance(writer, BulkTransactionWriter)
+    assert writer.batch_size == 500
+
+    # a batch size of 0 inserts every receipt immediately
+    for writer_type in (TransactionWriterType.BULK, TransactionWriterType.COPY):
+        writer = make_transaction_writer(writer_type, batch_size=0)
+        assert isinstance(writer, TransactionWriter)
+    with pytest.raises(ValueError):
+        make_transaction_writer(TransactionWriterType.BULK, batch_size=-1)
+
+    writer = make_transaction_writer(TransactionWriterType.COPY)
+    assert isinstance(writer, CopyTransactionWriter)
+
+    # COPY falls back to bulk inserts on other databases
+    monkeypatch.setattr(connection, "vendor", "sqlite")
+    writer = make_transaction_writer(TransactionWriterType.COPY)
+    assert (
+        type(writer) is BulkTransactionWriter
+    )  # pylint: disable=unidiomatic-typecheck
@@ -0,0 +1,93 @@
+"""
+Compressed file and archive tests
+"""
+import bz2
+import gzip
+import lzma
+import zipfile
+
+import pytest
+
+from taxes.receipts.util.compression import (
+    COMPRESSION_MAGIC_BYTES,
+    Compression,
+    detect_compression,
+    expand_archives,
+    inner_name,
+    make_archive_member_name,
+    open_stored_file,
+    open_text_file,
+)
+
+
+CONTENT = "Date,Amount\n2016-08-01,-12.34\n"
+
+
+@pytest.mark.parametrize(
+    "compression,extension,compress",
+    [
+        (Compression.GZIP, ".gz", gzip.compress),
+        (Compression.XZ, ".xz", lzma.compress),
+        (Compression.BZIP2, ".bz2", bz2.compress),
+    ],
+)
+def test_compressed_files(tmp_path, compression, extension, compress):
+    compressed_content = compress(CONTENT.encode())
+    for filename in (
+        str(tmp_path / f"transactions.csv{extension}"),
+        # detected by magic bytes
+        str(tmp_path / "transactions"),
+    ):
+        with open(filename, "wb") as compressed_file:
+            compressed_file.write(compressed_content)
+
+        assert detect_compression(filename) == compression
+        with open_text_file(filename, buffering=16) as text_file:
+            assert list(text_file) == CONTENT.splitlines(keepends=True)
+        with open_stored_file(filename) as stored_file:
+            assert stored_file.read() == compressed_content
+
+
+def test_plain_files(monkeypatch, tmp_path):
+    filename = str(tmp_path / "transactions.csv")
+    with open(filename, "w") as plain_file:
+        plain_file.write(CONTENT)
+
+    # plain files are not sniffed
+    monkeypatch.setitem(COMPRESSION_MAGIC_BYTES, b"Date", Compression.GZIP)
+    assert detect_compression(filename) is None
+    assert expand_archives([filename]) == [filename]
+    with open_text_file(filename, buffering=16) as text_file:
+        assert text_file.read() == CONTENT
+
+
+def test_zip_archives(tmp_path):
+    archive_filename = str(tmp_path / "statements.zip")
+    with zipfile.ZipFile(archive_filename, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("bmo_savings.csv", CONTENT)
+        archive.writestr("2016/", "")
+        archive.writestr("2016/capitalone.csv", "")
+
+    member_filenames = expand_archives([archive_filename])
+    assert member_filenames == [
+        make_archive_member_name(archive_filename, "bmo_savings.csv"),
+        make_archive_member_name(archive_filename, "2016/capitalone.csv"),
+    ]
+    assert [inner_name(filename) for filename in member_filenames] == [
+        "bmo_savings.csv",
+        "2016/capitalone.csv",
+    ]
+    with open_text_file(member_filenames[0], buffering=16) as text_file:
+        assert text_file.read() == CONTENT
+    with open_stored_file(member_filenames[0]) as stored_file:
+        assert stored_file.read() == CONTENT.encode()
+
+    with pytest.raises(ValueError):
+        with open_text_file(archive_filename):
+            pass
+
+
+def test_inner_name():
+    assert inner_name("path/to/transactions.csv") == "path/to/transactions.csv"
+    assert inner_name("path/to/transactions.csv.GZ") == "path/to/transactions.csv"
+    assert inner_name("statements.zip::bmo_savings.csv") == "bmo_savings.csv"
@@ -0,0 +1,116 @@
+"""
+Amount parsing tests
+"""
+from decimal import Decimal
+import random
+
+import pytest
+
+from taxes.receipts.util import currency
+from taxes.receipts.util.currency import parse_accounting_amount, parse_amount
+
+
+def _decimal_amount(amount_string):
+    # the original (Decimal only) implementation
+    return round(Decimal(amount_string) * 100)
+
+
+def _result(parse, amount_string):
+    try:
+        return parse(amount_string)
+    except Exception as exc:  # pylint: disable=broad-except
+        return type(exc), str(exc)
+
+
+def _random_amount_string(rng):
+    sign = rng.choice(["", "", "-", "+"])
+    integer = "".join(rng.choice("0123456789") for _ in range(rng.randint(0, 12)))
+    fraction = "".join(rng.choice("0123456789") for _ in range(rng.randint(0, 6)))
+    if fraction and rng.random() < 0.3:
+        # ties and values next to them
+        fraction = fraction[:2] + rng.choice(["5", "50", "49", "51", "500", "0"])
+    amount_string = sign + integer
+    if fraction or rng.random() < 0.2:
+        amount_string += "." + fraction
+    if rng.random() < 0.05:
+        amount_string = rng.choice([" ", "\t", ""]) + amount_string + " "
+    if rng.random() < 0.05:
+        amount_string += rng.choice(["e2", "E-3", "_0", "x", ".", "-"])
+    if rng.random() < 0.05:
+        # signs and whitespace in the fraction
+        integer, point, fraction = amount_string.partition(".")
+        if point:
+            amount_string = (
+                integer + point + rng.choice(["-", "+", " ", "_"]) + fraction
+            )
+    return amount_string
+
+
+def test_same_as_decimal():
+    parse_amount.cache_clear()
+    rng = random.Random(0)
+    for _ in range(100000):
+        amount_string = _random_amount_string(rng)
+        assert _result(parse_amount, amount_string) == _result(
+            _decimal_amount, amount_string
+        ), amount_string
+
+
+@pytest.mark.parametrize(
+    "amount_string", ["0", "-1", "+12.3", "-.45", "1234.5678", "-0.0050", "5."]
+)
+def test_plain_amounts(amount_string):
+    # pylint: disable=protected-access
+    assert currency._parse_cents(amount_string) == _decimal_amount(amount_string)
+
+
+@pytest.mark.parametrize(
+    "amount_string",
+    [
+        "0.005",
+        "0.015",
+        "-0.025",
+        "1.0050",
+        "1.0051",
+        "-0",
+        "",
+        "-",
+        ".",
+        "+.5",
+        " 1.5",
+        "1.5 ",
+        "1_0.5",
+        # signs and whitespace which int() would accept after the point
+        ".-434",
+        ". 3",
+        ".+16",
+        "1.-5",
+        "-+1.5",
+        "1.2.3",
+        "1" * 30 + ".01",
+        "NaN",
+        "Infinity",
+        "１２.３４",
+        None,
+        12,
+        1.1,
+    ],
+)
+def test_exotic_amounts(amount_string):
+    assert _result(parse_amount, amount_string) == _result(
+        _decimal_amount, amount_string
+    )
+
+
+@pytest.mark.parametrize(
+    "amount_string,expected_amount",
+    [
+        ("1,234.56", 123456),
+        ("(1,234.56)", -123456),
+        ("(0.005)", 0),
+        ("-12", -1200),
+        ("1,000,000", 100000000),
+    ],
+)
+def test_accounting_amounts(amount_string, expected_amount):
+    assert parse_accounting_amount(amount_string) == expected_amount
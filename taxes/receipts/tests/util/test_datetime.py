@@ -0,0 +1,77 @@
+"""
+Date parsing tests
+"""
+from datetime import datetime
+import random
+
+import pytest
+
+from taxes.receipts.util.datetime import FAST_DATE_PARSERS, parse_date
+
+
+def _strptime_result(date_string, date_format):
+    try:
+        return datetime.strptime(date_string, date_format).date()
+    except (TypeError, ValueError) as exc:
+        return type(exc), str(exc)
+
+
+def _parse_date_result(date_string, date_format):
+    try:
+        return parse_date(date_string, date_format)
+    except (TypeError, ValueError) as exc:
+        return type(exc), str(exc)
+
+
+DATE_STRINGS = [
+    "20160801",
+    "20161231",
+    "20160229",
+    "20150229",
+    "20161301",
+    "20160001",
+    "20160132",
+    "2016081",
+    "201608011",
+    " 20160801",
+    "2016-08-01",
+    "2016-8-1",
+    "2016-02-30",
+    "2016-13-01",
+    "2016-08-01T00:00",
+    "08/01/2016",
+    "8/1/2016",
+    "02/30/2016",
+    "12/31/2016 ",
+    "08-01-2016",
+    "",
+    "abcdefgh",
+    "２０１６０８０１",
+    None,
+]
+
+
+@pytest.mark.parametrize("date_format", list(FAST_DATE_PARSERS) + ["%d.%m.%Y"])
+@pytest.mark.parametrize("date_string", DATE_STRINGS)
+def test_same_as_strptime(date_string, date_format):
+    assert _parse_date_result(date_string, date_format) == _strptime_result(
+        date_string, date_format
+    )
+    # memoized
+    assert _parse_date_result(date_string, date_format) == _strptime_result(
+        date_string, date_format
+    )
+
+
+@pytest.mark.parametrize("date_format", list(FAST_DATE_PARSERS))
+def test_random_dates(date_format):
+    rng = random.Random(0)
+    for _ in range(2000):
+        date_string = (
+            date_format.replace("%Y", f"{rng.randint(1, 9999):04d}")
+            .replace("%m", f"{rng.randint(0, 13):02d}")
+            .replace("%d", f"{rng.randint(0, 32):02d}")
+        )
+        assert _parse_date_result(date_string, date_format) == _strptime_result(
+            date_string, date_format
+        )
@@ -0,0 +1,37 @@
+"""
+Flat array layout tests
+"""
+import pytest
+
+from taxes.receipts.util.flat import FlatArrays, FlatArraysBuilder
+
+
+def test_round_trip(tmpdir):
+    builder = FlatArraysBuilder()
+    builder.add_array("numbers", "q", [-1, 0, 2 ** 40])
+    builder.add_array("empty", "I", [])
+    builder.add_blobs("strings", [b"", "ÉTÉ".encode(), b"\0\t"])
+    builder.add_hash_table("table", {str(i).encode(): i * 10 for i in range(100)})
+
+    with pytest.raises(ValueError):
+        builder.add_array("numbers", "q", [])
+
+    flat_path = str(tmpdir.join("arrays.flat"))
+    builder.save(flat_path)
+    for arrays in (FlatArrays(builder.dumps()), FlatArrays.open(flat_path)):
+        assert arrays["numbers"].tolist() == [-1, 0, 2 ** 40]
+        assert len(arrays["empty"]) == 0
+        assert arrays.num_blobs("strings") == 3
+        assert arrays.string("strings", 1) == "ÉTÉ"
+        assert bytes(arrays.blob("strings", 2)) == b"\0\t"
+        assert "strings.data" in arrays and "missing" not in arrays
+
+        for i in range(100):
+            assert arrays.hash_lookup("table", str(i).encode()) == i * 10
+        assert arrays.hash_lookup("table", b"100") is None
+        arrays.release()
+
+
+def test_invalid_buffer():
+    with pytest.raises(ValueError):
+        FlatArrays(b"TALF" + bytes(100))
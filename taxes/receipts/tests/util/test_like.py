@@ -0,0 +1,124 @@
+"""
+LIKE pattern matching tests
+"""
+import random
+
+import pytest
+
+from taxes.receipts.util.flat import FlatArrays, FlatArraysBuilder
+from taxes.receipts.util.like import (
+    AhoCorasickAutomaton,
+    AutomatonLikeMatcher,
+    FlatLikeMatcher,
+    LikePattern,
+    RegexLikeMatcher,
+    build_flat_like_matcher,
+    like_pattern_literals,
+    like_pattern_to_regex,
+)
+
+
+@pytest.mark.parametrize(
+    "pattern, value, expected",
+    (
+        ("IHOP%", "IHOP #123 SAN FRANCISCO", True),
+        ("IHOP%", "IHOP", True),
+        ("IHOP%", "THE IHOP", False),
+        ("%NETFLIX%", "WWW.NETFLIX.COM", True),
+        ("%NETFLIX%", "NETFLI", False),
+        ("TIM HORTONS _0__", "TIM HORTONS 3021", True),
+        ("TIM HORTONS _0__", "TIM HORTONS 30211", False),
+        ("50\\% OFF%", "50% OFF SALE", True),
+        ("50\\% OFF%", "500 OFF SALE", False),
+        ("A.B*C%", "A.B*CDE", True),
+        ("A.B*C%", "AXBBC", False),
+        ("%", "", True),
+    ),
+)
+def test_like_pattern_to_regex(pattern, value, expected):
+    assert bool(like_pattern_to_regex(pattern).fullmatch(value)) == expected
+
+
+def test_like_pattern_trailing_escape():
+    with pytest.raises(ValueError):
+        like_pattern_to_regex("FOO\\")
+
+
+@pytest.mark.parametrize(
+    "pattern, expected_literals",
+    (
+        ("IHOP%", ["IHOP"]),
+        ("%NETFLIX%", ["NETFLIX"]),
+        ("AB_CD%EF", ["AB", "CD", "EF"]),
+        ("50\\%%", ["50%"]),
+        ("%_%", []),
+    ),
+)
+def test_like_pattern_literals(pattern, expected_literals):
+    assert like_pattern_literals(pattern) == expected_literals
+
+
+def test_like_pattern_matches_regex():
+    rng = random.Random(4321)
+    for _ in range(2000):
+        # mostly '%' wildcards so that literal matching is exercised
+        pattern = "".join(rng.choice("AB%%_") for _ in range(rng.randint(0, 6)))
+        text = "".join(rng.choice("AB") for _ in range(rng.randint(0, 8)))
+        expected = like_pattern_to_regex(pattern).fullmatch(text) is not None
+        assert LikePattern(pattern).fullmatch(text) == expected, (pattern, text)
+
+
+def test_aho_corasick_search():
+    automaton = AhoCorasickAutomaton(["HE", "SHE", "HIS", "HERS"])
+    assert automaton.search("USHERS") == {0, 1, 3}
+    assert automaton.search("AHISH") == {2}
+    assert automaton.search("XYZ") == set()
+
+
+def test_automaton_matches_regex_matcher():
+    rng = random.Random(1234)
+    alphabet = "ABC _%"
+
+    def _random_string(chars, max_length):
+        return "".join(rng.choice(chars) for _ in range(rng.randint(0, max_length)))
+
+    automaton_matcher = AutomatonLikeMatcher()
+    regex_matcher = RegexLikeMatcher()
+    for index in range(300):
+        pattern = _random_string(alphabet, 6)
+        automaton_matcher.add(pattern, index)
+        regex_matcher.add(pattern, index)
+
+    assert len(automaton_matcher) == len(regex_matcher)
+    for _ in range(500):
+        text = _random_string("ABC ", 10)
+        assert sorted(automaton_matcher.match(text)) == sorted(
+            regex_matcher.match(text)
+        )
+
+
+def test_flat_matcher_matches_regex_matcher():
+    rng = random.Random(5678)
+    alphabet = "ABÉ _%\\"
+
+    def _random_string(chars, max_length):
+        return "".join(rng.choice(chars) for _ in range(rng.randint(0, max_length)))
+
+    regex_matcher = RegexLikeMatcher()
+    patterns = []
+    while len(patterns) < 300:
+        pattern = _random_string(alphabet, 6)
+        try:
+            regex_matcher.add(pattern, len(patterns))
+        except ValueError:  # trailing escape character
+            continue
+        patterns.append(pattern)
+
+    builder = FlatArraysBuilder()
+    build_flat_like_matcher(builder, "like", regex_matcher.items())
+    flat_matcher = FlatLikeMatcher(FlatArrays(builder.dumps()), "like")
+
+    assert len(flat_matcher) == len(regex_matcher)
+    for _ in range(500):
+        text = _random_string("ABÉ _%", 10)
+        assert sorted(flat_matcher.match(text)) == sorted(regex_matcher.match(text))
@@ -1,7 +1,6 @@
 from datetime import date
 import typing
 
-from dataclasses import dataclass
 from django.db.models import TextChoices
 
 
@@ -59,19 +58,111 @@ class TaxType(TextChoices):
     HST = "hst", "HST"
 
 
-@dataclass
 class RawTransaction:
     """
     Represents a parsed transaction
+
+    The known extras of each bank are optional attributes rather than a dictionary
+    per transaction (any others are kept in extras). misc combines both.
     """
 
-    line_number: int
-    transaction_date: date
-    amount: int
-    currency: Currency
-    description: str = None
-    misc: dict = None
-    payment_method: PaymentMethod = None
+    MISC_FIELDS = (
+        "transaction_code",
+        "last_4_digits",
+        "category",
+        "type",
+        "authorized_purchase_on",
+    )
+
+    __slots__ = (
+        "line_number",
+        "transaction_date",
+        "amount",
+        "currency",
+        "description",
+        "payment_method",
+        *MISC_FIELDS,
+        "extras",
+    )
+
+    # pylint:disable=too-many-arguments,redefined-builtin
+    def __init__(
+        self,
+        line_number: int,
+        transaction_date: date,
+        amount: int,
+        currency: Currency,
+        description: str = None,
+        misc: dict = None,
+        payment_method: PaymentMethod = None,
+        transaction_code: str = None,
+        last_4_digits: str = None,
+        category: str = None,
+        type: str = None,
+        authorized_purchase_on: str = None,
+    ):
+        self.line_number = line_number
+        self.transaction_date = transaction_date
+        self.amount = amount
+        self.currency = currency
+        self.description = description
+        self.payment_method = payment_method
+        self.transaction_code = transaction_code
+        self.last_4_digits = last_4_digits
+        self.category = category
+        self.type = type
+        self.authorized_purchase_on = authorized_purchase_on
+        self.extras: typing.Optional[dict] = None
+        if misc:
+            self._update_misc(misc)
+
+    # pylint:enable=too-many-arguments,redefined-builtin
+
+    @property
+    def misc(self) -> dict:
+        misc = {
+            field: getattr(self, field)
+            for field in self.MISC_FIELDS
+            if getattr(self, field) is not None
+        }
+        if self.extras:
+            misc.update(self.extras)
+        return misc
+
+    @misc.setter
+    def misc(self, misc: dict):
+        for field in self.MISC_FIELDS:
+            setattr(self, field, None)
+        self.extras = None
+        if misc:
+            self._update_misc(misc)
+
+    def _update_misc(self, misc: dict):
+        for key, value in misc.items():
+            if key in self.MISC_FIELDS:
+                setattr(self, key, value)
+            else:
+                if self.extras is None:
+                    self.extras = {}
+                self.extras[key] = value
+
+    def _astuple(self) -> tuple:
+        return tuple(getattr(self, field) for field in self.__slots__)
+
+    def __eq__(self, other):
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return self._astuple() == other._astuple()
+
+    __hash__ = None
+
+    def __repr__(self):
+        fields = ", ".join(
+            f"{field}={getattr(self, field)!r}"
+            for field in self.__slots__
+            if field not in self.MISC_FIELDS and field != "extras"
+        )
+        return f"{self.__class__.__name__}({fields}, misc={self.misc!r})"
 
 
 # TODO: Remove once astroid is upgraded past v2.4.2
@@ -0,0 +1,219 @@
+"""
+Reading of compressed files and zip archive members as plain files
+
+Compression is detected by extension (e.g. ".csv.gz") or else by magic bytes, and
+files are decompressed while they are read. The members of zip archives are
+separate logical files named "path/to/archive.zip::member.csv".
+"""
+import bz2
+import contextlib
+import enum
+import gzip
+import io
+import lzma
+import os
+import typing
+import zipfile
+
+
+ARCHIVE_MEMBER_SEPARATOR = "::"
+
+
+@enum.unique
+class Compression(enum.Enum):
+    GZIP = "gzip"
+    XZ = "xz"
+    BZIP2 = "bzip2"
+    ZIP = "zip"
+
+
+COMPRESSION_EXTENSIONS = {
+    ".gz": Compression.GZIP,
+    ".xz": Compression.XZ,
+    ".bz2": Compression.BZIP2,
+    ".zip": Compression.ZIP,
+}
+
+# extensions of plain (uncompressed) transaction files
+PLAIN_EXTENSIONS = {".csv", ".txt"}
+
+COMPRESSION_MAGIC_BYTES = {
+    b"\x1f\x8b": Compression.GZIP,
+    b"\xfd7zXZ\x00": Compression.XZ,
+    b"BZh": Compression.BZIP2,
+    b"PK\x03\x04": Compression.ZIP,
+}
+
+_MAX_MAGIC_BYTES_LENGTH = max(
+    len(magic_bytes) for magic_bytes in COMPRESSION_MAGIC_BYTES
+)
+
+# opens single compressed files (in binary mode)
+DECOMPRESSORS = {
+    Compression.GZIP: gzip.open,
+    Compression.XZ: lzma.open,
+    Compression.BZIP2: bz2.open,
+}
+
+
+def make_archive_member_name(archive_path: str, member: str) -> str:
+    return f"{archive_path}{ARCHIVE_MEMBER_SEPARATOR}{member}"
+
+
+def split_archive_member(filename: str) -> typing.Tuple[str, typing.Optional[str]]:
+    """
+    Splits the name of an archive member into the archive's path and the member
+
+    :return: (filename, None) unless the file is an archive member
+    """
+    path, separator, member = filename.partition(ARCHIVE_MEMBER_SEPARATOR)
+    if not separator:
+        return filename, None
+    return path, member
+
+
+def detect_compression(path: str) -> typing.Optional[Compression]:
+    """
+    Determines the compression of a (physical) file by its extension or else (if
+    the extension is unknown) by its first bytes
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension in COMPRESSION_EXTENSIONS:
+        return COMPRESSION_EXTENSIONS[extension]
+    if extension in PLAIN_EXTENSIONS:
+        return None
+
+    with open(path, "rb") as compressed_file:
+        header = compressed_file.read(_MAX_MAGIC_BYTES_LENGTH)
+    return next(
+        (
+            compression
+            for magic_bytes, compression in COMPRESSION_MAGIC_BYTES.items()
+            if header.startswith(magic_bytes)
+        ),
+        None,
+    )
+
+
+def inner_name(filename: str) -> str:
+    """
+    Returns the name of the plain file within a compressed file or archive
+    (e.g. "transactions.csv" for "transactions.csv.gz")
+    """
+    path, member = split_archive_member(filename)
+    if member is not None:
+        return member
+    root, extension = os.path.splitext(path)
+    if extension.lower() in COMPRESSION_EXTENSIONS:
+        return root
+    return path
+
+
+def expand_archives(filenames: typing.Iterable[str]) -> typing.List[str]:
+    """
+    Replaces zip archives with the logical files of their members (in order)
+    """
+    expanded_filenames = []
+    for filename in filenames:
+        if detect_compression(filename) != Compression.ZIP:
+            expanded_filenames.append(filename)
+            continue
+        with zipfile.ZipFile(filename) as archive:
+            expanded_filenames.extend(
+                make_archive_member_name(filename, member.filename)
+                for member in archive.infolist()
+                if not member.is_dir()
+            )
+    return expanded_filenames
+
+
+def get_archive_member_size(filename: str) -> int:
+    """
+    Returns the (uncompressed) size of an archive member
+    """
+    path, member = split_archive_member(filename)
+    with zipfile.ZipFile(path) as archive:
+        return archive.getinfo(member).file_size
+
+
+@contextlib.contextmanager
+def open_stored_file(filename: str) -> typing.Iterator[typing.BinaryIO]:
+    """
+    Opens a file (or archive member) in binary mode as it is stored, i.e. without
+    decompressing compressed files (plain files are unbuffered)
+    """
+    path, member = split_archive_member(filename)
+    if member is None:
+        with open(path, "rb", buffering=0) as stored_file:
+            yield stored_file
+        return
+
+    with zipfile.ZipFile(path) as archive, archive.open(member) as member_file:
+        yield member_file
+
+
+class _HashingReader(io.RawIOBase):
+    """
+    Updates a digest with all bytes read from a binary stream
+    """
+
+    def __init__(self, stream: typing.BinaryIO, digest):
+        super().__init__()
+        self._stream = stream
+        self._digest = digest
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer) -> int:
+        size = self._stream.readinto(buffer)
+        if size:
+            self._digest.update(memoryview(buffer)[:size])
+        return size
+
+    def consume(self):
+        """
+        Reads (and digests) the rest of the stream
+        """
+        buffer = bytearray(io.DEFAULT_BUFFER_SIZE)
+        while self.readinto(buffer):
+            pass
+
+
+@contextlib.contextmanager
+def open_text_file(
+    filename: str, buffering: int = -1, digest=None
+) -> typing.Iterator[typing.TextIO]:
+    """
+    Opens a (possibly compressed) file or archive member for reading text
+
+    :param buffering: read buffer size (of the decompressed stream)
+    :param digest: hash object (e.g. hashlib.sha256()) updated with the bytes of
+        the file as it is stored (see open_stored_file()) while it is read, and
+        with any remaining bytes once it was read without errors
+    """
+    path, member = split_archive_member(filename)
+    compression = detect_compression(path) if member is None else None
+    if compression == Compression.ZIP:
+        raise ValueError(f"Archive members must be read individually: {filename}")
+    if member is None and compression is None and digest is None:
+        with open(path, "r", buffering=buffering) as text_file:
+            yield text_file
+        return
+
+    buffer_size = buffering if buffering > 1 else io.DEFAULT_BUFFER_SIZE
+    with open_stored_file(filename) as stored_file:
+        stored_stream = (
+            _HashingReader(stored_file, digest) if digest is not None else stored_file
+        )
+        binary_file_context = (
+            DECOMPRESSORS[compression](stored_stream, "rb")
+            if compression is not None
+            else contextlib.nullcontext(stored_stream)
+        )
+        with binary_file_context as binary_file, io.TextIOWrapper(
+            io.BufferedReader(binary_file, buffer_size)
+        ) as text_file:
+            yield text_file
+            if digest is not None:
+                stored_stream.consume()
@@ -1,8 +1,78 @@
 from decimal import Decimal
+import functools
 
 
+# distinct amount strings to remember
+AMOUNT_MEMO_SIZE = 4096
+
+# longest amount parsed without Decimal (well within Decimal's precision)
+MAX_FAST_AMOUNT_LENGTH = 24
+MAX_FAST_FRACTION_DIGITS = 4
+
+# factor from an amount with 0, 1 or 2 fractional digits (without the point) to cents
+_CENT_SCALES = (100, 10, 1)
+
+
+def _is_plain_digits(digits):
+    # (empty or) ASCII digits only, without the signs, whitespace or underscores
+    # accepted by int()
+    return not digits or (digits.isascii() and digits.isdigit())
+
+
+def _parse_cents(amount_string):
+    """
+    Parses a plain decimal string (e.g. "-1234.5") into cents, rounding half to
+    even like Decimal does
+
+    :return: None unless the string is plain
+    """
+    if len(amount_string) > MAX_FAST_AMOUNT_LENGTH:
+        return None
+    integer_digits, _, fraction_digits = amount_string.partition(".")
+    is_negative = integer_digits.startswith("-")
+    if is_negative or integer_digits.startswith("+"):
+        integer_digits = integer_digits[1:]
+    digits = integer_digits + fraction_digits
+    if (
+        not digits
+        or len(fraction_digits) > MAX_FAST_FRACTION_DIGITS
+        or not _is_plain_digits(integer_digits)
+        or not _is_plain_digits(fraction_digits)
+    ):
+        return None
+
+    cents = int(digits)
+    num_fraction_digits = len(fraction_digits)
+    if num_fraction_digits < len(_CENT_SCALES):
+        cents *= _CENT_SCALES[num_fraction_digits]
+    else:
+        divisor = 10 ** (num_fraction_digits - 2)
+        cents, remainder = divmod(cents, divisor)
+        half = divisor // 2
+        if remainder > half or (remainder == half and cents % 2):
+            cents += 1
+    return -cents if is_negative else cents
+
+
+@functools.lru_cache(maxsize=AMOUNT_MEMO_SIZE)
 def parse_amount(amount_string):
-    return round(Decimal(amount_string) * 100)
+    cents = _parse_cents(amount_string) if isinstance(amount_string, str) else None
+    if cents is None:
+        # anything else (e.g. exponents or more fractional digits)
+        return round(Decimal(amount_string) * 100)
+    return cents
+
+
+def parse_accounting_amount(amount_string):
+    """
+    Parses an amount with thousands separators and parentheses for negative
+    amounts (e.g. "(1,234.50)")
+    """
+    amount_string = amount_string.replace(",", "")
+    if amount_string[0] == "(":
+        return -1 * parse_amount(amount_string[1:-1])
+
+    return parse_amount(amount_string)
 
 
 def cents_to_dollars(amount_in_cents):
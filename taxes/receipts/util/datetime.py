@@ -1,9 +1,67 @@
-from datetime import datetime
+from datetime import date, datetime
+import functools
+import typing
+
+
+# distinct (date string, format) pairs to remember
+DATE_MEMO_SIZE = 4096
 
 
 def parse_iso_datestring(date_string):
     return parse_date(date_string, "%Y-%m-%d")
 
 
+def _is_ascii_number(text: str) -> bool:
+    return text.isascii() and text.isdigit()
+
+
+def _parse_yyyymmdd(date_string: str) -> typing.Optional[date]:
+    if len(date_string) != 8 or not _is_ascii_number(date_string):
+        return None
+    return date(int(date_string[:4]), int(date_string[4:6]), int(date_string[6:]))
+
+
+def _parse_yyyy_mm_dd(date_string: str) -> typing.Optional[date]:
+    if (
+        len(date_string) != 10
+        or date_string[4] != "-"
+        or date_string[7] != "-"
+        or not _is_ascii_number(date_string.replace("-", ""))
+    ):
+        return None
+    return date(int(date_string[:4]), int(date_string[5:7]), int(date_string[8:]))
+
+
+def _parse_mm_dd_yyyy(date_string: str) -> typing.Optional[date]:
+    if (
+        len(date_string) != 10
+        or date_string[2] != "/"
+        or date_string[5] != "/"
+        or not _is_ascii_number(date_string.replace("/", ""))
+    ):
+        return None
+    return date(int(date_string[6:]), int(date_string[:2]), int(date_string[3:5]))
+
+
+# specialized parsers of the canonical form of some formats (returning None for
+# anything else)
+FAST_DATE_PARSERS = {
+    "%Y%m%d": _parse_yyyymmdd,
+    "%Y-%m-%d": _parse_yyyy_mm_dd,
+    "%m/%d/%Y": _parse_mm_dd_yyyy,
+}
+
+
+@functools.lru_cache(maxsize=DATE_MEMO_SIZE)
 def parse_date(date_string, date_format):
+    # any string which a specialized parser rejects is left to strptime() so that
+    # both the accepted strings and the errors are the same
+    fast_parser = FAST_DATE_PARSERS.get(date_format)
+    if fast_parser:
+        try:
+            parsed_date = fast_parser(date_string)
+        except (TypeError, ValueError):
+            parsed_date = None
+        if parsed_date:
+            return parsed_date
     return datetime.strptime(date_string, date_format).date()
@@ -0,0 +1,178 @@
+"""
+Flat, offset-addressed binary layout of named arrays
+
+Arrays are read in place (e.g. from a memory-mapped file) so that several
+processes can share them without copying or unpickling anything up front.
+"""
+import array
+import mmap
+import struct
+import sys
+import typing
+import zlib
+
+
+FLAT_MAGIC = b"FLAT"
+FLAT_FORMAT_VERSION = 1
+
+# magic, format version, byte order, number of arrays
+_HEADER = struct.Struct("<4sIcxxxI")
+# name, typecode, offset and number of items of every array
+_ENTRY = struct.Struct("<64scxxxxxxxQQ")
+_ALIGNMENT = 8
+
+# hash table slots without an entry
+EMPTY_SLOT = -1
+
+
+def hash_key(key: bytes) -> int:
+    # stable across processes (unlike hash())
+    return zlib.crc32(key)
+
+
+class FlatArraysBuilder:
+    """
+    Collects named arrays and writes them in the flat layout
+    """
+
+    def __init__(self):
+        self._arrays = {}
+
+    def add_array(self, name: str, typecode: str, values: typing.Iterable):
+        if name in self._arrays:
+            raise ValueError(f"Duplicate array: {name}")
+        self._arrays[name] = array.array(typecode, values)
+
+    def add_blobs(self, name: str, blobs: typing.Iterable[bytes]):
+        """
+        Adds a table of variable length byte strings (addressed by index)
+        """
+        offsets = array.array("Q", [0])
+        data = bytearray()
+        for blob in blobs:
+            data += blob
+            offsets.append(len(data))
+        self.add_array(f"{name}.offsets", "Q", offsets)
+        self.add_array(f"{name}.data", "B", data)
+
+    def add_hash_table(self, name: str, entries: typing.Dict[bytes, int]):
+        """
+        Adds an (open addressing) hash table of byte string keys to integer values
+        """
+        keys = list(entries)
+        num_slots = 1
+        while num_slots < 2 * len(keys):
+            num_slots *= 2
+
+        slots = array.array("q", [EMPTY_SLOT]) * num_slots
+        for key_index, key in enumerate(keys):
+            slot = hash_key(key) % num_slots
+            while slots[slot] != EMPTY_SLOT:
+                slot = (slot + 1) % num_slots
+            slots[slot] = key_index
+
+        self.add_array(f"{name}.slots", "q", slots)
+        self.add_blobs(f"{name}.keys", keys)
+        self.add_array(f"{name}.values", "q", (entries[key] for key in keys))
+
+    def dumps(self) -> bytes:
+        header_size = _HEADER.size + _ENTRY.size * len(self._arrays)
+        buffer = bytearray(header_size)
+        _HEADER.pack_into(
+            buffer,
+            0,
+            FLAT_MAGIC,
+            FLAT_FORMAT_VERSION,
+            sys.byteorder[0].encode(),
+            len(self._arrays),
+        )
+
+        for entry_index, (name, values) in enumerate(self._arrays.items()):
+            buffer += bytes(-len(buffer) % _ALIGNMENT)
+            _ENTRY.pack_into(
+                buffer,
+                _HEADER.size + _ENTRY.size * entry_index,
+                name.encode(),
+                values.typecode.encode(),
+                len(buffer),
+                len(values),
+            )
+            buffer += values.tobytes()
+        return bytes(buffer)
+
+    def save(self, path: str):
+        with open(path, "wb") as flat_file:
+            flat_file.write(self.dumps())
+
+
+class FlatArrays:
+    """
+    Read-only views of the arrays in a flat buffer (no data is copied)
+    """
+
+    def __init__(self, buffer):
+        self._buffer = buffer
+        view = memoryview(buffer)
+
+        magic, version, byte_order, num_arrays = _HEADER.unpack_from(view)
+        if magic != FLAT_MAGIC or version != FLAT_FORMAT_VERSION:
+            raise ValueError("Unsupported flat array format")
+        if byte_order != sys.byteorder[0].encode():
+            raise ValueError("Flat arrays were written with a different byte order")
+
+        self._arrays = {}
+        for entry_index in range(num_arrays):
+            name, typecode, offset, length = _ENTRY.unpack_from(
+                view, _HEADER.size + _ENTRY.size * entry_index
+            )
+            typecode = typecode.decode()
+            item_size = array.array(typecode).itemsize
+            end = offset + length * item_size
+            self._arrays[name.rstrip(b"\0").decode()] = view[offset:end].cast(typecode)
+
+    @classmethod
+    def open(cls, path: str) -> "FlatArrays":
+        """
+        Maps a file (read-only) so that all processes share the same pages
+        """
+        with open(path, "rb") as flat_file:
+            return cls(mmap.mmap(flat_file.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def __getitem__(self, name: str) -> memoryview:
+        return self._arrays[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._arrays
+
+    def blob(self, name: str, index: int) -> memoryview:
+        offsets = self._arrays[f"{name}.offsets"]
+        start, end = offsets[index], offsets[index + 1]
+        return self._arrays[f"{name}.data"][start:end]
+
+    def num_blobs(self, name: str) -> int:
+        return len(self._arrays[f"{name}.offsets"]) - 1
+
+    def string(self, name: str, index: int) -> str:
+        return str(self.blob(name, index), "utf-8")
+
+    def hash_lookup(self, name: str, key: bytes) -> typing.Optional[int]:
+        """
+        Returns the value of a key in a hash table (None if not found)
+        """
+        slots = self._arrays[f"{name}.slots"]
+        num_slots = len(slots)
+        slot = hash_key(key) % num_slots
+        while True:
+            key_index = slots[slot]
+            if key_index == EMPTY_SLOT:
+                return None
+            if self.blob(f"{name}.keys", key_index) == key:
+                return self._arrays[f"{name}.values"][key_index]
+            slot = (slot + 1) % num_slots
+
+    def release(self):
+        for values in self._arrays.values():
+            values.release()
+        self._arrays = {}
+        if isinstance(self._buffer, mmap.mmap):
+            self._buffer.close()
@@ -0,0 +1,436 @@
+"""
+Matching of strings against SQL LIKE patterns
+"""
+import abc
+import bisect
+import collections
+import itertools
+import re
+import typing
+
+from taxes.receipts.util.flat import FlatArrays, FlatArraysBuilder
+
+
+LIKE_ESCAPE_CHAR = "\\"
+LIKE_WILDCARDS = {"%": ".*", "_": "."}
+
+
+def tokenize_like_pattern(pattern: str) -> typing.Iterator[typing.Tuple[bool, str]]:
+    """
+    Splits a LIKE pattern into (is_wildcard, character) tokens
+    """
+    chars = iter(pattern)
+    for char in chars:
+        if char == LIKE_ESCAPE_CHAR:
+            escaped_char = next(chars, None)
+            if escaped_char is None:
+                raise ValueError(f"LIKE pattern ends with escape character: {pattern}")
+            yield False, escaped_char
+        else:
+            yield char in LIKE_WILDCARDS, char
+
+
+def like_pattern_to_regex(pattern: str) -> typing.Pattern:
+    """
+    Translates a SQL LIKE pattern into an equivalent regular expression
+
+    The returned expression must be applied with ``fullmatch()`` to reproduce
+    the semantics of ``value LIKE pattern``.
+    """
+    return re.compile(
+        "".join(
+            LIKE_WILDCARDS[char] if is_wildcard else re.escape(char)
+            for is_wildcard, char in tokenize_like_pattern(pattern)
+        ),
+        re.DOTALL,
+    )
+
+
+def like_pattern_literals(pattern: str) -> typing.List[str]:
+    """
+    Returns the literal substrings every match of a LIKE pattern must contain
+    """
+    if "_" not in pattern and LIKE_ESCAPE_CHAR not in pattern:
+        return [literal for literal in pattern.split("%") if literal]
+
+    literals = [[]]
+    for is_wildcard, char in tokenize_like_pattern(pattern):
+        if is_wildcard:
+            literals.append([])
+        else:
+            literals[-1].append(char)
+    return ["".join(literal) for literal in literals if literal]
+
+
+def _match_literal_parts(parts: typing.List[str], text: str) -> bool:
+    # parts are the literals between '%' wildcards, which may only span the gaps
+    if len(parts) == 1:
+        return text == parts[0]
+
+    first, last = parts[0], parts[-1]
+    end = len(text) - len(last)
+    if end < len(first) or not text.startswith(first) or not text.endswith(last):
+        return False
+
+    # matching the earliest occurrence of each middle part is always sufficient
+    position = len(first)
+    for part in parts[1:-1]:
+        position = text.find(part, position, end)
+        if position < 0:
+            return False
+        position += len(part)
+    return True
+
+
+class LikePattern:
+    """
+    LIKE pattern which matches values without building a regular expression if
+    possible
+
+    Patterns with no wildcards other than '%' are matched by comparing their
+    literal parts directly. Otherwise the equivalent regular expression is
+    compiled on first use, which keeps building and unpickling large indexes fast.
+    """
+
+    __slots__ = ("pattern", "_parts", "_regex")
+
+    def __init__(self, pattern: str):
+        # validate escapes up front rather than on first use
+        if LIKE_ESCAPE_CHAR in pattern:
+            for _ in tokenize_like_pattern(pattern):
+                pass
+        self.__setstate__(pattern)
+
+    def __getstate__(self):
+        return self.pattern
+
+    def __setstate__(self, state):
+        self.pattern = state
+        self._regex = None
+        if "_" in state or LIKE_ESCAPE_CHAR in state:
+            self._parts = None
+        else:
+            self._parts = state.split("%")
+
+    def fullmatch(self, text: str) -> bool:
+        if self._parts is not None:
+            return _match_literal_parts(self._parts, text)
+        if self._regex is None:
+            self._regex = like_pattern_to_regex(self.pattern)
+        return self._regex.fullmatch(text) is not None
+
+
+class BaseLikeMatcher(metaclass=abc.ABCMeta):
+    """
+    Finds all registered LIKE patterns matching a value
+
+    Each pattern is registered alongside an arbitrary value which is returned
+    on a match.
+    """
+
+    @abc.abstractmethod
+    def add(self, pattern: str, value: typing.Any):
+        pass
+
+    @abc.abstractmethod
+    def match(self, text: str) -> typing.List[typing.Any]:
+        pass
+
+    @abc.abstractmethod
+    def __len__(self):
+        pass
+
+    @abc.abstractmethod
+    def items(self) -> typing.Iterator[typing.Tuple[str, typing.Any]]:
+        """
+        Returns all registered (pattern, value) pairs
+        """
+
+    def compile(self):
+        """
+        Builds any internal structures ahead of the first match
+        """
+
+
+class RegexLikeMatcher(BaseLikeMatcher):
+    """
+    Tests every pattern in turn (cost grows linearly with the number of patterns)
+    """
+
+    def __init__(self):
+        self._patterns = []
+
+    def add(self, pattern: str, value: typing.Any):
+        self._patterns.append((LikePattern(pattern), value))
+
+    def match(self, text: str) -> typing.List[typing.Any]:
+        return [value for like, value in self._patterns if like.fullmatch(text)]
+
+    def __len__(self):
+        return len(self._patterns)
+
+    def items(self) -> typing.Iterator[typing.Tuple[str, typing.Any]]:
+        return ((like.pattern, value) for like, value in self._patterns)
+
+
+class AhoCorasickAutomaton:
+    """
+    Locates all occurrences of a set of keywords in a single pass over a text
+    """
+
+    def __init__(self, keywords: typing.Iterable[str]):
+        self._goto = [{}]
+        self._fail = [0]
+        self._outputs = [()]
+
+        for keyword_index, keyword in enumerate(keywords):
+            self._add_keyword(keyword, keyword_index)
+        self._build_failure_links()
+
+    def _add_keyword(self, keyword: str, keyword_index: int):
+        state = 0
+        for char in keyword:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._outputs.append(())
+            state = next_state
+        self._outputs[state] += (keyword_index,)
+
+    def _build_failure_links(self):
+        queue = collections.deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail_state = self._fail[state]
+                while fail_state and char not in self._goto[fail_state]:
+                    fail_state = self._fail[fail_state]
+                self._fail[next_state] = self._goto[fail_state].get(char, 0)
+                self._outputs[next_state] += self._outputs[self._fail[next_state]]
+
+    def __len__(self):
+        return len(self._goto)
+
+    def search(self, text: str) -> typing.Set[int]:
+        """
+        Returns the indices of all keywords occurring in the text
+        """
+        goto = self._goto
+        fail = self._fail
+        outputs = self._outputs
+
+        found = set()
+        state = 0
+        for char in text:
+            while True:
+                next_state = goto[state].get(char)
+                if next_state is not None:
+                    state = next_state
+                    break
+                if not state:
+                    break
+                state = fail[state]
+            if outputs[state]:
+                found.update(outputs[state])
+        return found
+
+
+class AutomatonLikeMatcher(BaseLikeMatcher):
+    """
+    Prefilters patterns with an Aho-Corasick automaton over their literal parts
+
+    Every pattern is keyed by its longest literal substring. A single scan of
+    the text yields the keys it contains, and only patterns with a present key
+    (or with no literal part at all) are matched against the whole pattern. The
+    cost per text is therefore roughly independent of the number
+    of patterns.
+    """
+
+    def __init__(self):
+        self._keys = {}
+        self._candidates_by_key = []
+        self._unkeyed_candidates = []
+        self._automaton = None
+        self._size = 0
+
+    def add(self, pattern: str, value: typing.Any):
+        candidate = (LikePattern(pattern), value)
+        self._size += 1
+
+        literals = like_pattern_literals(pattern)
+        if not literals:
+            self._unkeyed_candidates.append(candidate)
+            return
+
+        key = max(literals, key=len)
+        key_index = self._keys.setdefault(key, len(self._keys))
+        if key_index == len(self._candidates_by_key):
+            self._candidates_by_key.append([])
+        self._candidates_by_key[key_index].append(candidate)
+        self._automaton = None
+
+    @property
+    def automaton(self) -> AhoCorasickAutomaton:
+        # built lazily once all patterns have been added
+        if self._automaton is None:
+            self._automaton = AhoCorasickAutomaton(self._keys)
+        return self._automaton
+
+    def compile(self):
+        self.automaton  # pylint: disable=pointless-statement
+
+    def match(self, text: str) -> typing.List[typing.Any]:
+        matches = [
+            value for like, value in self._unkeyed_candidates if like.fullmatch(text)
+        ]
+        for key_index in self.automaton.search(text):
+            matches.extend(
+                value
+                for like, value in self._candidates_by_key[key_index]
+                if like.fullmatch(text)
+            )
+        return matches
+
+    def __len__(self):
+        return self._size
+
+    def items(self) -> typing.Iterator[typing.Tuple[str, typing.Any]]:
+        for candidates in [self._unkeyed_candidates] + self._candidates_by_key:
+            for like, value in candidates:
+                yield like.pattern, value
+
+
+def build_flat_like_matcher(
+    builder: FlatArraysBuilder,
+    name: str,
+    patterns: typing.Iterable[typing.Tuple[str, int]],
+):
+    """
+    Adds the arrays of a FlatLikeMatcher for (LIKE pattern, value index) pairs
+    """
+    matcher = AutomatonLikeMatcher()
+    for pattern, value_index in patterns:
+        matcher.add(pattern, value_index)
+    automaton = matcher.automaton
+
+    # transitions of every state are sorted by character for binary searches
+    transition_starts = [0]
+    transition_chars = []
+    transition_states = []
+    for transitions in automaton._goto:  # pylint: disable=protected-access
+        for char, next_state in sorted(transitions.items()):
+            transition_chars.append(ord(char))
+            transition_states.append(next_state)
+        transition_starts.append(len(transition_chars))
+    builder.add_array(f"{name}.transition_starts", "I", transition_starts)
+    builder.add_array(f"{name}.transition_chars", "I", transition_chars)
+    builder.add_array(f"{name}.transition_states", "I", transition_states)
+    builder.add_array(
+        f"{name}.fail", "I", automaton._fail  # pylint: disable=protected-access
+    )
+
+    output_starts = [0]
+    outputs = []
+    for state_outputs in automaton._outputs:  # pylint: disable=protected-access
+        outputs.extend(state_outputs)
+        output_starts.append(len(outputs))
+    builder.add_array(f"{name}.output_starts", "I", output_starts)
+    builder.add_array(f"{name}.outputs", "I", outputs)
+
+    # candidates without a key are kept in a final bucket
+    buckets = matcher._candidates_by_key + [  # pylint: disable=protected-access
+        matcher._unkeyed_candidates  # pylint: disable=protected-access
+    ]
+    candidates = [candidate for bucket in buckets for candidate in bucket]
+    builder.add_array(
+        f"{name}.candidate_starts",
+        "I",
+        itertools.accumulate([0] + [len(bucket) for bucket in buckets]),
+    )
+    builder.add_blobs(
+        f"{name}.candidate_patterns", (like.pattern.encode() for like, _ in candidates)
+    )
+    builder.add_array(
+        f"{name}.candidate_values", "I", (value_index for _, value_index in candidates)
+    )
+
+
+class FlatLikeMatcher:
+    """
+    Read-only AutomatonLikeMatcher addressing its automaton in flat arrays
+
+    Matches return the value indices passed to build_flat_like_matcher().
+    """
+
+    def __init__(self, arrays: FlatArrays, name: str):
+        self._arrays = arrays
+        self._name = name
+        self._transition_starts = arrays[f"{name}.transition_starts"]
+        self._transition_chars = arrays[f"{name}.transition_chars"]
+        self._transition_states = arrays[f"{name}.transition_states"]
+        self._fail = arrays[f"{name}.fail"]
+        self._output_starts = arrays[f"{name}.output_starts"]
+        self._outputs = arrays[f"{name}.outputs"]
+        self._candidate_starts = arrays[f"{name}.candidate_starts"]
+        self._candidate_values = arrays[f"{name}.candidate_values"]
+
+        # only patterns which are tested are decoded (once)
+        self._patterns = {}
+
+    def __len__(self):
+        return len(self._candidate_values)
+
+    def _goto(self, state: int, char: int) -> typing.Optional[int]:
+        chars = self._transition_chars
+        start = self._transition_starts[state]
+        end = self._transition_starts[state + 1]
+        index = bisect.bisect_left(chars, char, start, end)
+        if index < end and chars[index] == char:
+            return self._transition_states[index]
+        return None
+
+    def _search(self, text: str) -> typing.Set[int]:
+        # same as AhoCorasickAutomaton.search()
+        fail = self._fail
+        output_starts = self._output_starts
+
+        found = set()
+        state = 0
+        for char in map(ord, text):
+            while True:
+                next_state = self._goto(state, char)
+                if next_state is not None:
+                    state = next_state
+                    break
+                if not state:
+                    break
+                state = fail[state]
+            start = output_starts[state]
+            end = output_starts[state + 1]
+            if start < end:
+                found.update(self._outputs[start:end])
+        return found
+
+    def _pattern(self, candidate_index: int) -> LikePattern:
+        like = self._patterns.get(candidate_index)
+        if like is None:
+            like = LikePattern(
+                self._arrays.string(f"{self._name}.candidate_patterns", candidate_index)
+            )
+            self._patterns[candidate_index] = like
+        return like
+
+    def match(self, text: str) -> typing.List[int]:
+        unkeyed_bucket = len(self._candidate_starts) - 2
+        matches = []
+        for bucket in [unkeyed_bucket] + sorted(self._search(text)):
+            for candidate_index in range(
+                self._candidate_starts[bucket], self._candidate_starts[bucket + 1]
+            ):
+                if self._pattern(candidate_index).fullmatch(text):
+                    matches.append(self._candidate_values[candidate_index])
+        return matches
@@ -0,0 +1,198 @@
+"""
+Backends for the arithmetic and membership tests of columnar batches
+
+The NumPy backend (used if NumPy is installed, unless configured otherwise)
+computes fixed amount overrides, membership of amounts (and dated amounts) and
+HST for a whole batch at once, with the same results as the Python backend.
+"""
+import abc
+from array import array
+import enum
+import typing
+
+from django.conf import settings
+
+from taxes.receipts import types
+from taxes.receipts.tax import (
+    HST_TAX_FRACTION,
+    compute_tax_adjustment_amount,
+    compute_tax_adjustment_amounts,
+)
+
+try:
+    import numpy
+except ImportError:  # optional dependency
+    numpy = None
+
+
+# relative distance from .5 within which tax amounts computed in floating point
+# are recomputed with Decimal (far above the error of the floating point product,
+# so that large amounts are always recomputed)
+HST_ROUNDING_TOLERANCE = 1e-12
+
+IntegerColumn = typing.Sequence[int]
+
+
+@enum.unique
+class BatchBackendType(enum.Enum):
+    PYTHON = "python"
+    NUMPY = "numpy"
+
+
+class BaseBatchBackend(metaclass=abc.ABCMeta):
+    @abc.abstractmethod
+    def isin(
+        self, values: IntegerColumn, members: typing.Collection[int]
+    ) -> typing.Sequence[bool]:
+        """
+        Determines which values are members
+        """
+
+    @abc.abstractmethod
+    def pairs_isin(
+        self,
+        first_values: IntegerColumn,
+        second_values: IntegerColumn,
+        members: typing.Set[typing.Tuple[int, int]],
+    ) -> typing.Sequence[bool]:
+        """
+        Determines which (first value, second value) pairs are members
+        """
+
+    @abc.abstractmethod
+    def override_amounts(
+        self, amounts: IntegerColumn, override_amounts: IntegerColumn
+    ) -> IntegerColumn:
+        """
+        Replaces amounts with their (non-zero) override amounts
+        """
+
+    @abc.abstractmethod
+    def tax_adjustment_amounts(
+        self, total_amounts: IntegerColumn, tax_type: types.TaxType
+    ) -> IntegerColumn:
+        """
+        Computes the tax included in total amounts (in cents)
+        """
+
+
+class PythonBatchBackend(BaseBatchBackend):
+    def isin(
+        self, values: IntegerColumn, members: typing.Collection[int]
+    ) -> typing.Sequence[bool]:
+        members = set(members)
+        return [value in members for value in values]
+
+    def pairs_isin(
+        self,
+        first_values: IntegerColumn,
+        second_values: IntegerColumn,
+        members: typing.Set[typing.Tuple[int, int]],
+    ) -> typing.Sequence[bool]:
+        return [pair in members for pair in zip(first_values, second_values)]
+
+    def override_amounts(
+        self, amounts: IntegerColumn, override_amounts: IntegerColumn
+    ) -> IntegerColumn:
+        return array(
+            "q",
+            (
+                override_amount or amount
+                for amount, override_amount in zip(amounts, override_amounts)
+            ),
+        )
+
+    def tax_adjustment_amounts(
+        self, total_amounts: IntegerColumn, tax_type: types.TaxType
+    ) -> IntegerColumn:
+        return compute_tax_adjustment_amounts(total_amounts, tax_type)
+
+
+class NumpyBatchBackend(BaseBatchBackend):
+    def __init__(self):
+        if numpy is None:
+            raise RuntimeError("NumPy is not installed")
+        self.hst_tax_fraction = float(HST_TAX_FRACTION)
+
+    @staticmethod
+    def _as_array(values: IntegerColumn) -> "numpy.ndarray":
+        return numpy.asarray(values, dtype=numpy.int64)
+
+    def isin(
+        self, values: IntegerColumn, members: typing.Collection[int]
+    ) -> typing.Sequence[bool]:
+        return numpy.isin(
+            self._as_array(values), self._as_array(list(members))
+        ).tolist()
+
+    def pairs_isin(
+        self,
+        first_values: IntegerColumn,
+        second_values: IntegerColumn,
+        members: typing.Set[typing.Tuple[int, int]],
+    ) -> typing.Sequence[bool]:
+        if not members:
+            return [False] * len(first_values)
+
+        # only pairs whose values are both members are candidates
+        first_values = self._as_array(first_values)
+        second_values = self._as_array(second_values)
+        first_members, second_members = zip(*members)
+        candidates = numpy.isin(
+            first_values, self._as_array(first_members)
+        ) & numpy.isin(second_values, self._as_array(second_members))
+
+        is_member = numpy.zeros(len(first_values), dtype=bool)
+        for index in numpy.flatnonzero(candidates).tolist():
+            is_member[index] = (
+                int(first_values[index]),
+                int(second_values[index]),
+            ) in members
+        return is_member.tolist()
+
+    def override_amounts(
+        self, amounts: IntegerColumn, override_amounts: IntegerColumn
+    ) -> IntegerColumn:
+        override_amounts = self._as_array(override_amounts)
+        return numpy.where(
+            override_amounts != 0, override_amounts, self._as_array(amounts)
+        ).tolist()
+
+    def tax_adjustment_amounts(
+        self, total_amounts: IntegerColumn, tax_type: types.TaxType
+    ) -> IntegerColumn:
+        if tax_type != types.TaxType.HST:
+            raise ValueError("Unsupported tax type")
+
+        total_amounts = self._as_array(total_amounts)
+        tax_amounts = total_amounts * self.hst_tax_fraction
+        # rounded half to even like Decimal
+        rounded_amounts = numpy.rint(tax_amounts).astype(numpy.int64)
+
+        # amounts too close to .5 to round in floating point are recomputed
+        fractions = tax_amounts - numpy.floor(tax_amounts)
+        ambiguous = numpy.abs(fractions - 0.5) < HST_ROUNDING_TOLERANCE * (
+            numpy.abs(tax_amounts) + 1
+        )
+        for index in numpy.flatnonzero(ambiguous).tolist():
+            rounded_amounts[index] = compute_tax_adjustment_amount(
+                int(total_amounts[index]), tax_type
+            )
+        return rounded_amounts.tolist()
+
+
+BATCH_BACKENDS = {
+    BatchBackendType.PYTHON: PythonBatchBackend,
+    BatchBackendType.NUMPY: NumpyBatchBackend,
+}
+
+
+def default_batch_backend_type() -> BatchBackendType:
+    # NumPy if installed unless configured in the settings
+    if settings.BATCH_BACKEND:
+        return BatchBackendType(settings.BATCH_BACKEND)
+    return BatchBackendType.NUMPY if numpy is not None else BatchBackendType.PYTHON
+
+
+def make_batch_backend(backend_type: BatchBackendType = None) -> BaseBatchBackend:
+    return BATCH_BACKENDS[backend_type or default_batch_backend_type()]()
@@ -0,0 +1,321 @@
+"""
+Writers which store itemized receipts (and their tax adjustments)
+"""
+import abc
+import datetime
+import enum
+import io
+import logging
+import typing
+import uuid
+
+from django.db import connection
+
+from taxes.receipts import models
+from taxes.receipts.types import Currency, TaxType, TransactionType
+
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_BULK_BATCH_SIZE = 1000
+
+
+# TODO: Remove once astroid is upgraded past v2.4.2
+# pylint:disable=inherit-non-class
+class ReceiptRow(typing.NamedTuple):
+    """
+    Column values of a new receipt (named after the model's attributes)
+    """
+
+    id: uuid.UUID
+    vendor_id: typing.Optional[uuid.UUID]
+    asset_id: typing.Optional[uuid.UUID]
+    transaction_type: typing.Optional[TransactionType]
+    transaction_date: datetime.date
+    payment_method_id: uuid.UUID
+    total_amount: int
+    currency: Currency
+    description: str
+    fingerprint: typing.Optional[str] = None
+
+
+class TaxAdjustmentRow(typing.NamedTuple):
+    """
+    Column values of a new tax adjustment (named after the model's attributes)
+    """
+
+    id: uuid.UUID
+    receipt_id: uuid.UUID
+    tax_type: TaxType
+    amount: int
+
+
+# pylint:enable=inherit-non-class
+
+
+@enum.unique
+class TransactionWriterType(enum.Enum):
+    INSERT = "insert"
+    BULK = "bulk"
+    COPY = "copy"
+
+
+class BaseTransactionWriter(metaclass=abc.ABCMeta):
+    """
+    Stores receipts and tax adjustments in the current database transaction
+
+    Rows carry their own (UUID) primary keys, so tax adjustments can reference
+    receipts which have not been written yet. Receipts with the fingerprint of an
+    existing receipt are skipped (along with their tax adjustments).
+    """
+
+    def __init__(self):
+        self.inserted = 0
+        self.skipped = 0
+
+    @abc.abstractmethod
+    def add(
+        self, receipt: ReceiptRow, tax_adjustment: typing.Optional[TaxAdjustmentRow],
+    ):
+        pass
+
+    def flush(self):
+        """
+        Writes any pending receipts and tax adjustments
+        """
+
+    def _count_inserted(self, receipts: typing.List[ReceiptRow], inserted_ids: set):
+        self.inserted += len(inserted_ids)
+        self.skipped += len(receipts) - len(inserted_ids)
+
+
+# rows per INSERT (within PostgreSQL's limit of 65535 query parameters)
+MAX_INSERT_BATCH_SIZE = 5000
+
+INSERT_RECEIPTS_SQL = """
+    INSERT INTO {table} ({columns})
+    VALUES {values}
+    ON CONFLICT (fingerprint) DO NOTHING
+    RETURNING id
+"""
+
+
+def insert_receipts(
+    receipts: typing.List[ReceiptRow], batch_size: int = None
+) -> typing.Set[uuid.UUID]:
+    """
+    Inserts receipts unless a receipt with the same fingerprint already exists
+
+    Every batch is inserted (and its inserted IDs returned) by a single statement.
+
+    :return: IDs of the inserted receipts
+    """
+    if not receipts:
+        return set()
+
+    quote_name = connection.ops.quote_name
+    fields = [models.Transaction._meta.get_field(name) for name in ReceiptRow._fields]
+    row_placeholders = "({})".format(", ".join(["%s"] * len(fields)))
+    batch_size = min(batch_size or len(receipts), MAX_INSERT_BATCH_SIZE)
+
+    inserted_ids = set()
+    with connection.cursor() as cursor:
+        for start in range(0, len(receipts), batch_size):
+            end = start + batch_size
+            batch = receipts[start:end]
+            cursor.execute(
+                INSERT_RECEIPTS_SQL.format(
+                    table=quote_name(models.Transaction._meta.db_table),
+                    columns=", ".join(quote_name(field.column) for field in fields),
+                    values=", ".join([row_placeholders] * len(batch)),
+                ),
+                [
+                    field.get_db_prep_save(value, connection)
+                    for receipt in batch
+                    for field, value in zip(fields, receipt)
+                ],
+            )
+            inserted_ids.update(
+                uuid.UUID(str(receipt_id)) for receipt_id, in cursor.fetchall()
+            )
+    return inserted_ids
+
+
+class TransactionWriter(BaseTransactionWriter):
+    """
+    Inserts every receipt (and its tax adjustment) immediately
+    """
+
+    def add(
+        self, receipt: ReceiptRow, tax_adjustment: typing.Optional[TaxAdjustmentRow],
+    ):
+        inserted_ids = insert_receipts([receipt])
+        self._count_inserted([receipt], inserted_ids)
+        if tax_adjustment and inserted_ids:
+            models.TaxAdjustment(**tax_adjustment._asdict()).save(force_insert=True)
+
+
+class BulkTransactionWriter(BaseTransactionWriter):
+    """
+    Buffers receipts and tax adjustments, inserting them with bulk_create()
+
+    flush() must be called once all receipts have been added.
+    """
+
+    def __init__(self, batch_size: int = DEFAULT_BULK_BATCH_SIZE):
+        super().__init__()
+        if batch_size < 1:
+            raise ValueError(f"Invalid batch size: {batch_size}")
+        self.batch_size = batch_size
+        self._receipts = []
+        self._tax_adjustments = []
+
+    def add(
+        self, receipt: ReceiptRow, tax_adjustment: typing.Optional[TaxAdjustmentRow],
+    ):
+        self._receipts.append(receipt)
+        if tax_adjustment:
+            self._tax_adjustments.append(tax_adjustment)
+
+        if len(self._receipts) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        # receipts must be inserted first since tax adjustments reference them
+        if not self._receipts:
+            return
+        inserted_ids = self._insert_receipts(self._receipts)
+        self._count_inserted(self._receipts, inserted_ids)
+        tax_adjustments = [
+            tax_adjustment
+            for tax_adjustment in self._tax_adjustments
+            if tax_adjustment.receipt_id in inserted_ids
+        ]
+        self._receipts = []
+        self._tax_adjustments = []
+
+        if tax_adjustments:
+            self._insert_tax_adjustments(tax_adjustments)
+
+    def _insert_receipts(
+        self, receipts: typing.List[ReceiptRow]
+    ) -> typing.Set[uuid.UUID]:
+        return insert_receipts(receipts, batch_size=self.batch_size)
+
+    def _insert_tax_adjustments(self, tax_adjustments: typing.List[TaxAdjustmentRow]):
+        models.TaxAdjustment.objects.bulk_create(
+            [
+                models.TaxAdjustment(**tax_adjustment._asdict())
+                for tax_adjustment in tax_adjustments
+            ],
+            batch_size=self.batch_size,
+        )
+
+
+COPY_NULL = "\\N"
+COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+
+def encode_copy_value(value: typing.Any) -> str:
+    """
+    Encodes a value in the text format of PostgreSQL's COPY
+    """
+    if value is None:
+        return COPY_NULL
+    if isinstance(value, enum.Enum):
+        value = value.value
+    return str(value).translate(COPY_ESCAPES)
+
+
+def encode_copy_rows(rows: typing.Iterable[tuple]) -> io.StringIO:
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write("\t".join(encode_copy_value(value) for value in row))
+        buffer.write("\n")
+    buffer.seek(0)
+    return buffer
+
+
+# receipts are copied into a temporary table first since COPY cannot skip conflicts
+CREATE_RECEIPT_COPY_TABLE_SQL = """
+    CREATE TEMPORARY TABLE IF NOT EXISTS receipt_copy
+    (LIKE {table} INCLUDING DEFAULTS)
+"""
+TRUNCATE_RECEIPT_COPY_TABLE_SQL = "TRUNCATE receipt_copy"
+INSERT_RECEIPT_COPIES_SQL = """
+    INSERT INTO {table} ({columns})
+    SELECT {columns} FROM receipt_copy
+    ON CONFLICT (fingerprint) DO NOTHING
+    RETURNING id
+"""
+
+
+class CopyTransactionWriter(BulkTransactionWriter):
+    """
+    Buffers receipts and tax adjustments, streaming them with COPY ... FROM STDIN
+
+    Rows are encoded directly without building any model instances. Only
+    supported on PostgreSQL.
+    """
+
+    @staticmethod
+    def _copy_rows(
+        cursor, table: str, row_class: typing.Type[tuple], rows: typing.List[tuple]
+    ):
+        quote_name = connection.ops.quote_name
+        sql = "COPY {table} ({columns}) FROM STDIN".format(
+            table=table,
+            columns=", ".join(quote_name(column) for column in row_class._fields),
+        )
+        cursor.copy_expert(sql, encode_copy_rows(rows))
+
+    def _insert_receipts(
+        self, receipts: typing.List[ReceiptRow]
+    ) -> typing.Set[uuid.UUID]:
+        quote_name = connection.ops.quote_name
+        table = quote_name(models.Transaction._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(CREATE_RECEIPT_COPY_TABLE_SQL.format(table=table))
+            cursor.execute(TRUNCATE_RECEIPT_COPY_TABLE_SQL)
+            self._copy_rows(cursor, "receipt_copy", ReceiptRow, receipts)
+            cursor.execute(
+                INSERT_RECEIPT_COPIES_SQL.format(
+                    table=table,
+                    columns=", ".join(
+                        quote_name(column) for column in ReceiptRow._fields
+                    ),
+                )
+            )
+            return {uuid.UUID(str(receipt_id)) for receipt_id, in cursor.fetchall()}
+
+    def _insert_tax_adjustments(self, tax_adjustments: typing.List[TaxAdjustmentRow]):
+        table = connection.ops.quote_name(models.TaxAdjustment._meta.db_table)
+        with connection.cursor() as cursor:
+            self._copy_rows(cursor, table, TaxAdjustmentRow, tax_adjustments)
+
+
+def make_transaction_writer(
+    writer_type: TransactionWriterType, batch_size: int = DEFAULT_BULK_BATCH_SIZE
+) -> BaseTransactionWriter:
+    """
+    :param batch_size: receipts per write (bulk and copy writers), where 0 inserts
+        every receipt immediately
+    """
+    if batch_size < 0:
+        raise ValueError(f"Invalid batch size: {batch_size}")
+    if batch_size == 0:
+        writer_type = TransactionWriterType.INSERT
+
+    if writer_type == TransactionWriterType.COPY and connection.vendor != "postgresql":
+        LOGGER.info(
+            "COPY is not supported by %s, using bulk inserts", connection.vendor
+        )
+        writer_type = TransactionWriterType.BULK
+
+    if writer_type == TransactionWriterType.INSERT:
+        return TransactionWriter()
+    if writer_type == TransactionWriterType.BULK:
+        return BulkTransactionWriter(batch_size)
+    if writer_type == TransactionWriterType.COPY:
+        return CopyTransactionWriter(batch_size)
+    raise ValueError("Unsupported transaction writer type: " + writer_type.value)
@@ -32,6 +32,15 @@ DEBUG = RECEIPTS_CONFIG.get("DEBUG", False)
 
 LOGGING = RECEIPTS_CONFIG.get("LOGGING")
 EXCLUSION_FILTER_MODULES = RECEIPTS_CONFIG.get("EXCLUSION_FILTER_MODULES", [])
+ALIAS_MATCHER = RECEIPTS_CONFIG.get("ALIAS_MATCHER", "memory")
+# backend of columnar batches ("python" or "numpy", by default numpy if installed)
+BATCH_BACKEND = RECEIPTS_CONFIG.get("BATCH_BACKEND")
+
+# cached snapshot of the matching index (explicitly set to null to disable)
+MATCHING_INDEX_CACHE_PATH = RECEIPTS_CONFIG.get(
+    "MATCHING_INDEX_CACHE_PATH",
+    os.path.join(RECEIPTS_CONFIG_DIR, "cache", f"matching_index.{RECEIPTS_ENV}.pickle"),
+)
 
 # Database
 # https://docs.djangoproject.com/en/1.11/ref/settings/#databases